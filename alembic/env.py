@@ -1,3 +1,4 @@
+import re
 from logging.config import fileConfig
 
 from alembic import context
@@ -21,6 +22,15 @@ if config.config_file_name is not None:
 # Metadatos de los modelos
 target_metadata = Base.metadata
 
+# Particiones de tablas particionadas: las crea la app, no los modelos
+_PARTITION_RE = re.compile(r"^loan_status_history_(p\d{6}|default)$")
+
+
+def include_name(name, type_, parent_names):
+    if type_ == "table":
+        return not _PARTITION_RE.match(name)
+    return True
+
 
 def run_migrations_offline() -> None:
     """Ejecutar migraciones en modo 'offline'."""
@@ -30,6 +40,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         compare_type=True,
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -49,6 +60,7 @@ def run_migrations_online() -> None:
             connection=connection,
             target_metadata=target_metadata,
             compare_type=True,
+            include_name=include_name,
         )
 
         with context.begin_transaction():
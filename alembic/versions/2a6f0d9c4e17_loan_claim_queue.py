@@ -0,0 +1,34 @@
+"""loans: librarian work-queue claims (lease) and REQUESTED queue index
+
+Revision ID: 2a6f0d9c4e17
+Revises: 9e4c1a7b2f30
+Create Date: 2026-10-19 10:02:28.348453
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2a6f0d9c4e17'
+down_revision: Union[str, Sequence[str], None] = '9e4c1a7b2f30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('loans', sa.Column('claimed_by_user_id', sa.Integer(), nullable=True))
+    op.add_column('loans', sa.Column('claim_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_loans_requested_queue', 'loans', ['branch_id', 'created_at', 'id'], unique=False, postgresql_where=sa.text("status = 'REQUESTED'"))
+    op.create_foreign_key('loans_claimed_by_user_id_fkey', 'loans', 'users', ['claimed_by_user_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('loans_claimed_by_user_id_fkey', 'loans', type_='foreignkey')
+    op.drop_index('ix_loans_requested_queue', table_name='loans', postgresql_where=sa.text("status = 'REQUESTED'"))
+    op.drop_column('loans', 'claim_expires_at')
+    op.drop_column('loans', 'claimed_by_user_id')
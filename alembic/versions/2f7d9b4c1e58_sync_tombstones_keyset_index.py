@@ -0,0 +1,29 @@
+"""sync_tombstones: keyset index on (entity, deleted_at, id) for /changes
+
+Revision ID: 2f7d9b4c1e58
+Revises: 8a3c6e0f4b19
+Create Date: 2026-10-19 11:07:06.898973
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f7d9b4c1e58'
+down_revision: Union[str, Sequence[str], None] = '8a3c6e0f4b19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_sync_tombstones_entity_id', table_name='sync_tombstones')
+    op.create_index('ix_sync_tombstones_entity_deleted_at_id', 'sync_tombstones', ['entity', 'deleted_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sync_tombstones_entity_deleted_at_id', table_name='sync_tombstones')
+    op.create_index('ix_sync_tombstones_entity_id', 'sync_tombstones', ['entity', 'id'], unique=False)
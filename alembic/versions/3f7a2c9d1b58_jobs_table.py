@@ -0,0 +1,60 @@
+"""jobs: generalize job_runs into queued, cancelable background jobs
+
+Revision ID: 3f7a2c9d1b58
+Revises: e81b5c2d7f04
+Create Date: 2026-10-19 10:13:13.749898
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7a2c9d1b58'
+down_revision: Union[str, Sequence[str], None] = 'e81b5c2d7f04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Se renombra (no se recrea) para conservar el historial y los chunks
+    op.rename_table('job_runs', 'jobs')
+    op.execute('ALTER SEQUENCE job_runs_id_seq RENAME TO jobs_id_seq')
+    op.execute('ALTER INDEX job_runs_pkey RENAME TO jobs_pkey')
+
+    op.add_column('jobs', sa.Column('requested_by_user_id', sa.Integer(), nullable=True))
+    op.add_column('jobs', sa.Column('cancel_requested', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+    op.add_column('jobs', sa.Column('progress', sa.Float(), nullable=True))
+    op.add_column('jobs', sa.Column('result', sa.JSON(), nullable=True))
+    op.add_column('jobs', sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.create_foreign_key(
+        'jobs_requested_by_user_id_fkey', 'jobs', 'users',
+        ['requested_by_user_id'], ['id'], ondelete='SET NULL',
+    )
+
+    # Las ejecuciones existentes se crearon al empezar
+    op.execute('UPDATE jobs SET created_at = started_at')
+    op.alter_column('jobs', 'started_at', nullable=True, server_default=None)
+    op.drop_index('ix_job_runs_job_name_started_at', table_name='jobs')
+    op.create_index('ix_jobs_job_name_created_at', 'jobs', ['job_name', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_jobs_job_name_created_at', table_name='jobs')
+    op.execute("DELETE FROM jobs WHERE started_at IS NULL")
+    op.alter_column('jobs', 'started_at', nullable=False, server_default=sa.text('now()'))
+    op.create_index('ix_job_runs_job_name_started_at', 'jobs', ['job_name', 'started_at'], unique=False)
+    op.drop_constraint('jobs_requested_by_user_id_fkey', 'jobs', type_='foreignkey')
+    op.drop_column('jobs', 'created_at')
+    op.drop_column('jobs', 'result')
+    op.drop_column('jobs', 'progress')
+    op.drop_column('jobs', 'cancel_requested')
+    op.drop_column('jobs', 'requested_by_user_id')
+
+    op.execute('ALTER INDEX jobs_pkey RENAME TO job_runs_pkey')
+    op.execute('ALTER SEQUENCE jobs_id_seq RENAME TO job_runs_id_seq')
+    op.rename_table('jobs', 'job_runs')
@@ -0,0 +1,41 @@
+"""sync changes: updated_at keyset indexes and tombstones
+
+Revision ID: 3f9c2d7e1a40
+Revises: ab475c6a2955
+Create Date: 2026-10-19 10:05:12.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2d7e1a40'
+down_revision: Union[str, Sequence[str], None] = 'ab475c6a2955'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_books_updated_at_id', 'books', ['updated_at', 'id'], unique=False)
+    op.create_index('ix_loans_updated_at_id', 'loans', ['updated_at', 'id'], unique=False)
+    op.create_table('sync_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=50), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('member_id', sa.Integer(), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sync_tombstones_entity_id', 'sync_tombstones', ['entity', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sync_tombstones_entity_id', table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
+    op.drop_index('ix_loans_updated_at_id', table_name='loans')
+    op.drop_index('ix_books_updated_at_id', table_name='books')
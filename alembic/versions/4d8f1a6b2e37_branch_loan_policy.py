@@ -0,0 +1,30 @@
+"""library_branches.loan_days, max_active_loans: per-branch loan policy (NULL = default)
+
+Revision ID: 4d8f1a6b2e37
+Revises: 9c2e5a7d3f16
+Create Date: 2026-10-19 10:44:26.103676
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d8f1a6b2e37'
+down_revision: Union[str, Sequence[str], None] = '9c2e5a7d3f16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('library_branches', sa.Column('loan_days', sa.Integer(), nullable=True))
+    op.add_column('library_branches', sa.Column('max_active_loans', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('library_branches', 'max_active_loans')
+    op.drop_column('library_branches', 'loan_days')
@@ -0,0 +1,28 @@
+"""jobs: heartbeat_at so orphaned queued / running jobs can be reaped
+
+Revision ID: 5b8e2d7a4c13
+Revises: 2f7d9b4c1e58
+Create Date: 2026-10-19 11:23:54.685079
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e2d7a4c13'
+down_revision: Union[str, Sequence[str], None] = '2f7d9b4c1e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('jobs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('jobs', 'heartbeat_at')
@@ -0,0 +1,157 @@
+"""loan_status_history: monthly range partitions; loans_archive for old closed loans
+
+Revision ID: 5e9b3c1a7d24
+Revises: 4d8f1a6b2e37
+Create Date: 2026-10-19 12:05:31.480112
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e9b3c1a7d24'
+down_revision: Union[str, Sequence[str], None] = '4d8f1a6b2e37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+loanstatus = postgresql.ENUM(name='loanstatus', create_type=False)
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _create_month_partitions(first: date, last: date) -> None:
+    month = first.replace(day=1)
+    while month <= last:
+        following = _next_month(month)
+        op.execute(
+            f"CREATE TABLE loan_status_history_p{month:%Y%m} PARTITION OF loan_status_history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'loans_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('member_id', sa.Integer(), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('branch_id', sa.Integer(), nullable=False),
+        sa.Column('borrow_date', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('due_date', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('return_date', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('status', loanstatus, nullable=False),
+        sa.Column('late_fee_amount', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], name='loans_archive_book_id_fkey', ondelete='RESTRICT'),
+        sa.ForeignKeyConstraint(['branch_id'], ['library_branches.id'], name='loans_archive_branch_id_fkey', ondelete='RESTRICT'),
+        sa.ForeignKeyConstraint(['member_id'], ['users.id'], name='loans_archive_member_id_fkey', ondelete='RESTRICT'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_loans_archive_branch_id', 'loans_archive', ['branch_id'], unique=False)
+    op.create_index('ix_loans_archive_member_id', 'loans_archive', ['member_id'], unique=False)
+
+    # loan_status_history -> particionada por mes. Se crea al lado, se copian
+    # las filas y se reemplaza; la secuencia de ids se conserva.
+    op.execute("ALTER TABLE loan_status_history RENAME TO loan_status_history_old")
+    op.execute("ALTER INDEX loan_status_history_pkey RENAME TO loan_status_history_old_pkey")
+    op.drop_index('ix_loan_status_history_changed_at', table_name='loan_status_history_old')
+    op.drop_index('ix_loan_status_history_id', table_name='loan_status_history_old')
+
+    op.create_table(
+        'loan_status_history',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('loan_status_history_id_seq'::regclass)"), nullable=False),
+        sa.Column('loan_id', sa.Integer(), nullable=False),
+        sa.Column('old_status', loanstatus, nullable=True),
+        sa.Column('new_status', loanstatus, nullable=False),
+        sa.Column('changed_by_user_id', sa.Integer(), nullable=True),
+        sa.Column('changed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('note', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['changed_by_user_id'], ['users.id'], name='loan_status_history_changed_by_user_id_fkey', ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id', 'changed_at', name='loan_status_history_pkey'),
+        postgresql_partition_by='RANGE (changed_at)',
+    )
+    op.execute("ALTER SEQUENCE loan_status_history_id_seq OWNED BY loan_status_history.id")
+    op.execute("CREATE TABLE loan_status_history_default PARTITION OF loan_status_history DEFAULT")
+
+    first = op.get_bind().execute(sa.text("SELECT min(changed_at) FROM loan_status_history_old")).scalar()
+    today = datetime.now(timezone.utc).date()
+    last = today
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    _create_month_partitions(first.astimezone(timezone.utc).date() if first else today, last)
+
+    op.execute(
+        """
+        INSERT INTO loan_status_history (id, loan_id, old_status, new_status, changed_by_user_id, changed_at, note)
+        SELECT id, loan_id, old_status, new_status, changed_by_user_id, changed_at, note
+        FROM loan_status_history_old
+        """
+    )
+    op.drop_table('loan_status_history_old')
+    op.create_index('ix_loan_status_history_changed_at', 'loan_status_history', ['changed_at'], unique=False)
+    op.create_index('ix_loan_status_history_loan_id', 'loan_status_history', ['loan_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE loan_status_history RENAME TO loan_status_history_partitioned")
+    op.execute("ALTER INDEX loan_status_history_pkey RENAME TO loan_status_history_partitioned_pkey")
+    op.drop_index('ix_loan_status_history_changed_at', table_name='loan_status_history_partitioned')
+    op.drop_index('ix_loan_status_history_loan_id', table_name='loan_status_history_partitioned')
+
+    op.create_table(
+        'loan_status_history',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('loan_status_history_id_seq'::regclass)"), nullable=False),
+        sa.Column('loan_id', sa.Integer(), nullable=False),
+        sa.Column('old_status', loanstatus, nullable=True),
+        sa.Column('new_status', loanstatus, nullable=False),
+        sa.Column('changed_by_user_id', sa.Integer(), nullable=True),
+        sa.Column('changed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('note', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['changed_by_user_id'], ['users.id'], name='loan_status_history_changed_by_user_id_fkey', ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id', name='loan_status_history_pkey'),
+    )
+    op.execute("ALTER SEQUENCE loan_status_history_id_seq OWNED BY loan_status_history.id")
+
+    # Los préstamos archivados vuelven a loans antes de restaurar la FK
+    op.execute(
+        """
+        INSERT INTO loans (id, member_id, book_id, branch_id, borrow_date, due_date, return_date,
+                           status, late_fee_amount, notes, created_at, updated_at)
+        SELECT id, member_id, book_id, branch_id, borrow_date, due_date, return_date,
+               status, late_fee_amount, notes, created_at, updated_at
+        FROM loans_archive
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO loan_status_history (id, loan_id, old_status, new_status, changed_by_user_id, changed_at, note)
+        SELECT h.id, h.loan_id, h.old_status, h.new_status, h.changed_by_user_id, h.changed_at, h.note
+        FROM loan_status_history_partitioned h
+        WHERE EXISTS (SELECT 1 FROM loans l WHERE l.id = h.loan_id)
+        """
+    )
+    op.drop_table('loan_status_history_partitioned')
+    op.create_foreign_key(
+        'loan_status_history_loan_id_fkey', 'loan_status_history', 'loans', ['loan_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_index('ix_loan_status_history_id', 'loan_status_history', ['id'], unique=False)
+    op.create_index('ix_loan_status_history_changed_at', 'loan_status_history', ['changed_at'], unique=False)
+
+    op.drop_index('ix_loans_archive_member_id', table_name='loans_archive')
+    op.drop_index('ix_loans_archive_branch_id', table_name='loans_archive')
+    op.drop_table('loans_archive')
@@ -0,0 +1,41 @@
+"""users.active_loan_count: denormalized counter for the active loan limit
+
+Revision ID: 7b1d4e9a0c63
+Revises: 3f7a2c9d1b58
+Create Date: 2026-10-19 10:52:40.117263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1d4e9a0c63'
+down_revision: Union[str, Sequence[str], None] = '3f7a2c9d1b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('active_loan_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.execute(
+        """
+        UPDATE users u
+        SET active_loan_count = a.n
+        FROM (
+            SELECT member_id, count(*) AS n
+            FROM loans
+            WHERE status IN ('REQUESTED', 'APPROVED', 'BORROWED', 'OVERDUE')
+            GROUP BY member_id
+        ) a
+        WHERE a.member_id = u.id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'active_loan_count')
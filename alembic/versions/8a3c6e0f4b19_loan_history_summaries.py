@@ -0,0 +1,41 @@
+"""loan_history_summaries: per-loan summary of status history compacted by retention
+
+Revision ID: 8a3c6e0f4b19
+Revises: 5e9b3c1a7d24
+Create Date: 2026-10-19 10:51:46.398473
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a3c6e0f4b19'
+down_revision: Union[str, Sequence[str], None] = '5e9b3c1a7d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+loanstatus = postgresql.ENUM(name='loanstatus', create_type=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('loan_history_summaries',
+    sa.Column('loan_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('transitions', sa.Integer(), nullable=False),
+    sa.Column('first_changed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_changed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_status', loanstatus, nullable=False),
+    sa.Column('borrowed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('returned_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('compacted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('loan_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('loan_history_summaries')
@@ -0,0 +1,60 @@
+"""stats rollups: materialized counters for /admin/stats
+
+Revision ID: 8b1e4f2a9c53
+Revises: 3f9c2d7e1a40
+Create Date: 2026-10-19 12:40:31.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1e4f2a9c53'
+down_revision: Union[str, Sequence[str], None] = '3f9c2d7e1a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stats_counters',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('loan_daily_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('loans_created', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['branch_id'], ['library_branches.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('day', 'branch_id')
+    )
+
+    # Backfill desde los datos existentes (mismo cálculo que reconcile_stats)
+    op.execute("""
+        INSERT INTO stats_counters (name, value)
+        SELECT 'users.role.' || CAST(role AS TEXT), count(*) FROM users GROUP BY role
+        UNION ALL
+        SELECT 'loans.status.' || CAST(status AS TEXT), count(*) FROM loans GROUP BY status
+        UNION ALL
+        SELECT 'books.titles', count(*) FROM books
+        UNION ALL
+        SELECT 'books.total_copies', coalesce(sum(total_copies), 0) FROM books
+        UNION ALL
+        SELECT 'books.available_copies', coalesce(sum(available_copies), 0) FROM books
+    """)
+    op.execute("""
+        INSERT INTO loan_daily_stats (day, branch_id, loans_created)
+        SELECT CAST(timezone('UTC', created_at) AS DATE), branch_id, count(*)
+        FROM loans
+        GROUP BY 1, 2
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('loan_daily_stats')
+    op.drop_table('stats_counters')
@@ -0,0 +1,28 @@
+"""library_branches.late_fee_per_day: per-branch late fee rate (NULL = default)
+
+Revision ID: 9c2e5a7d3f16
+Revises: 7b1d4e9a0c63
+Create Date: 2026-10-19 10:41:10.092376
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2e5a7d3f16'
+down_revision: Union[str, Sequence[str], None] = '7b1d4e9a0c63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('library_branches', sa.Column('late_fee_per_day', sa.Numeric(precision=10, scale=2), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('library_branches', 'late_fee_per_day')
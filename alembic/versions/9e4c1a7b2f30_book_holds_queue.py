@@ -0,0 +1,50 @@
+"""book holds: FIFO reservation queue per book
+
+Revision ID: 9e4c1a7b2f30
+Revises: 5d8a0b3c7e21
+Create Date: 2026-10-19 09:56:27.052790
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4c1a7b2f30'
+down_revision: Union[str, Sequence[str], None] = '5d8a0b3c7e21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('book_holds',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('member_id', sa.Integer(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Enum('WAITING', 'FULFILLED', 'CANCELED', name='holdstatus'), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=True),
+    sa.Column('loan_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('fulfilled_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['branch_id'], ['library_branches.id'], ondelete='RESTRICT'),
+    sa.ForeignKeyConstraint(['loan_id'], ['loans.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['member_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_book_holds_book_created', 'book_holds', ['book_id', 'created_at'], unique=False)
+    op.create_index(op.f('ix_book_holds_id'), 'book_holds', ['id'], unique=False)
+    op.create_index('uq_book_holds_waiting_member_book', 'book_holds', ['member_id', 'book_id'], unique=True, postgresql_where=sa.text("status = 'WAITING'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_book_holds_waiting_member_book', table_name='book_holds', postgresql_where=sa.text("status = 'WAITING'"))
+    op.drop_index(op.f('ix_book_holds_id'), table_name='book_holds')
+    op.drop_index('ix_book_holds_book_created', table_name='book_holds')
+    op.drop_table('book_holds')
+    sa.Enum(name='holdstatus').drop(op.get_bind(), checkfirst=True)
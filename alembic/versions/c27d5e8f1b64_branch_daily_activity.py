@@ -0,0 +1,47 @@
+"""analytics: daily branch activity rollups
+
+Revision ID: c27d5e8f1b64
+Revises: 8b1e4f2a9c53
+Create Date: 2026-10-19 14:12:07.551893
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c27d5e8f1b64'
+down_revision: Union[str, Sequence[str], None] = '8b1e4f2a9c53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('branch_daily_activity',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('borrowed', sa.Integer(), nullable=False),
+    sa.Column('returned', sa.Integer(), nullable=False),
+    sa.Column('overdue', sa.Integer(), nullable=False),
+    sa.Column('duration_samples', sa.Integer(), nullable=False),
+    sa.Column('loan_seconds', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['branch_id'], ['library_branches.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('day', 'branch_id')
+    )
+    op.create_table('rollup_watermarks',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('through_day', sa.Date(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_index('ix_loan_status_history_changed_at', 'loan_status_history', ['changed_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_loan_status_history_changed_at', table_name='loan_status_history')
+    op.drop_table('rollup_watermarks')
+    op.drop_table('branch_daily_activity')
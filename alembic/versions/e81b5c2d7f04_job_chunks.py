@@ -0,0 +1,43 @@
+"""job_chunks: per-chunk checkpoints for resumable batch jobs
+
+Revision ID: e81b5c2d7f04
+Revises: 6c3e8b1f5a92
+Create Date: 2026-10-19 10:08:27.448157
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e81b5c2d7f04'
+down_revision: Union[str, Sequence[str], None] = '6c3e8b1f5a92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('job_chunks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('start_id', sa.Integer(), nullable=False),
+    sa.Column('end_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('rows_affected', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['job_runs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_job_chunks_run_id_status', 'job_chunks', ['run_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_job_chunks_run_id_status', table_name='job_chunks')
+    op.drop_table('job_chunks')
@@ -1,17 +1,41 @@
 # app/api/v1/endpoints/admin.py
 from datetime import datetime, timedelta, timezone
+from datetime import date
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
 
 
 from app.api.v1.dependencies import get_db
 from app.api.v1.dependencies_auth import (get_current_user,require_role,)
+from app.core.cache import response_cache
+from app.core.config import settings
+from app.core.jobs import job_executor, request_cancel
 from app.core.logging import get_logger, user_id_ctx
-from app.db.models import User, LibraryBranch, Book, Loan, LoanStatus, UserRole
-from app.schemas.admin import AdminStats, LoanStatusCount
-from app.schemas.stats import SystemStats
+from app.core.singleflight import singleflight_stats
+from app.db.models import User, JobChunk, JobRun, LoanStatus, UserRole
+from app.schemas.analytics import ActivityTimeseries, BranchAnalyticsReport
+from app.schemas.admin import AdminStats, CacheStats, IndexStats, JobBranchProgress, JobRunDetail, JobRunRead, LoanStatusCount, SingleFlightStats
+from app.schemas.stats import HistoryPurgeEstimate, InventoryReconcileResult, StatsReconcileResult, SystemStats
+from app.services.analytics_service import GRANULARITIES, activity_timeseries, branch_utilization
+from app.services.branch_registry import branch_registry
+from app.services.history_retention import estimate_purge
+from app.services.inventory_service import reconcile_inventory
+from app.services.related_books import related_index
+from app.services.stats_service import (
+    ACTIVE_LOAN_STATUSES,
+    BOOK_AVAILABLE_COPIES,
+    BOOK_TITLES,
+    BOOK_TOTAL_COPIES,
+    loans_created_since,
+    read_counters,
+    reconcile_stats,
+    role_counter,
+    status_counter,
+)
+from app.services.suggest_index import suggest_index
 
 import logging
 
@@ -39,54 +63,36 @@ def get_system_stats(
 ):
     """
     Endpoint de estadísticas globales del sistema (solo ADMIN).
+
+    Lee los contadores materializados (app.services.stats_service) en lugar
+    de recorrer users / books / loans: coste constante.
     """
+    counters = read_counters(db)
 
     # === Usuarios ===
-    total_users = db.query(func.count(User.id)).scalar() or 0
-    total_members = db.query(func.count(User.id)).filter(User.role == UserRole.MEMBER).scalar() or 0
-    total_librarians = db.query(func.count(User.id)).filter(User.role == UserRole.LIBRARIAN).scalar() or 0
-    total_admins = db.query(func.count(User.id)).filter(User.role == UserRole.ADMIN).scalar() or 0
+    total_members = counters.get(role_counter(UserRole.MEMBER), 0)
+    total_librarians = counters.get(role_counter(UserRole.LIBRARIAN), 0)
+    total_admins = counters.get(role_counter(UserRole.ADMIN), 0)
+    total_users = total_members + total_librarians + total_admins
 
-    # === Sucursales ===
-    total_branches = db.query(func.count(LibraryBranch.id)).scalar() or 0
-    active_branches = db.query(func.count(LibraryBranch.id)).filter(LibraryBranch.is_active == True).scalar() or 0
+    # === Sucursales (registro en memoria) ===
+    branches = branch_registry.all(db)
+    total_branches = len(branches)
+    active_branches = sum(1 for branch in branches if branch.is_active)
 
     # === Libros / Inventario ===
-    total_books = db.query(func.count(Book.id)).scalar() or 0
-    total_book_copies = db.query(func.coalesce(func.sum(Book.total_copies), 0)).scalar() or 0
-    total_available_copies = db.query(func.coalesce(func.sum(Book.available_copies), 0)).scalar() or 0
+    total_books = counters.get(BOOK_TITLES, 0)
+    total_book_copies = counters.get(BOOK_TOTAL_COPIES, 0)
+    total_available_copies = counters.get(BOOK_AVAILABLE_COPIES, 0)
 
     # === Préstamos ===
-    total_loans = db.query(func.count(Loan.id)).scalar() or 0
-
-    active_statuses = [
-        LoanStatus.REQUESTED,
-        LoanStatus.APPROVED,
-        LoanStatus.BORROWED,
-        LoanStatus.OVERDUE,
-    ]
-    active_loans = (
-        db.query(func.count(Loan.id))
-        .filter(Loan.status.in_(active_statuses))
-        .scalar()
-        or 0
-    )
-
-    overdue_loans = (
-        db.query(func.count(Loan.id))
-        .filter(Loan.status == LoanStatus.OVERDUE)
-        .scalar()
-        or 0
-    )
+    total_loans = sum(counters.get(status_counter(s), 0) for s in LoanStatus)
+    active_loans = sum(counters.get(status_counter(s), 0) for s in ACTIVE_LOAN_STATUSES)
+    overdue_loans = counters.get(status_counter(LoanStatus.OVERDUE), 0)
 
+    # Granularidad diaria: los últimos 30 días naturales (UTC)
     now = datetime.now(timezone.utc)
-    last_30_days = now - timedelta(days=30)
-    loans_last_30_days = (
-        db.query(func.count(Loan.id))
-        .filter(Loan.created_at >= last_30_days)
-        .scalar()
-        or 0
-    )
+    loans_last_30_days = loans_created_since(db, (now - timedelta(days=30)).date())
 
     stats = SystemStats(
         total_users=total_users,
@@ -116,3 +122,296 @@ def get_system_stats(
     )
 
     return stats
+
+
+@router.post(
+    "/stats/reconcile",
+    response_model=StatsReconcileResult,
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def reconcile_system_stats(
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Recalcula los contadores de /admin/stats desde las tablas base e
+    informa la deriva (equivale a `python -m app.cli reconcile-stats`).
+    """
+    result = reconcile_stats(db, apply=not dry_run)
+
+    logger.info(
+        "Admin reconciled system stats",
+        extra={
+            "operation": "admin_stats_reconcile",
+            "resource": "stats",
+            "user_id": current_user.id,
+            "drifted": len(result["drift"]),
+        },
+    )
+    return result
+
+
+@router.post(
+    "/inventory/reconcile",
+    response_model=InventoryReconcileResult,
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def reconcile_book_inventory(
+    dry_run: bool = False,
+    branch_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=0, le=10000, description="Libros con deriva incluidos en la respuesta"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Recalcula available_copies de cada libro desde sus préstamos e informa la
+    deriva; sin dry_run la corrige (equivale a `python -m app.cli
+    reconcile-inventory`). Con catálogos grandes conviene lanzarlo en segundo
+    plano: POST /admin/jobs/reconcile-inventory.
+    """
+    result = reconcile_inventory(db, apply=not dry_run, branch_id=branch_id)
+
+    logger.info(
+        "Admin reconciled book inventory",
+        extra={
+            "operation": "admin_inventory_reconcile",
+            "resource": "book",
+            "user_id": current_user.id,
+            "drifted": result["drifted"],
+        },
+    )
+    result["drift"] = result["drift"][:limit]
+    return result
+
+
+@router.get(
+    "/history/retention",
+    response_model=HistoryPurgeEstimate,
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def history_retention_estimate(
+    months: Optional[int] = Query(None, ge=0, description="Meses a conservar (por defecto HISTORY_RETENTION_MONTHS)"),
+    db: Session = Depends(get_db),
+):
+    """
+    Dry-run de la retención del historial de estados: cuánto compactaría
+    purge-history y cuánto espacio ocuparía eso. La purga en sí corre en
+    segundo plano: POST /admin/jobs/purge-history.
+    """
+    months = settings.HISTORY_RETENTION_MONTHS if months is None else months
+    return {"months": months, **estimate_purge(db, months)}
+
+
+def _analytics_range(start: Optional[date], end: Optional[date]) -> tuple[date, date]:
+    """Por defecto, los últimos 30 días (UTC) incluyendo hoy."""
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+    if (end - start).days > 366 * 5:
+        raise HTTPException(status_code=400, detail="Date range too large (max 5 years)")
+    return start, end
+
+
+@router.get(
+    "/analytics/timeseries",
+    response_model=ActivityTimeseries,
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def get_activity_timeseries(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    granularity: str = Query("day"),
+    branch_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Préstamos, devoluciones y vencidos por día o semana (y duración media),
+    desde los rollups diarios de loan_status_history.
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {GRANULARITIES}")
+    start, end = _analytics_range(start, end)
+    return ActivityTimeseries(
+        granularity=granularity,
+        start=start,
+        end=end,
+        buckets=activity_timeseries(db, start, end, granularity, branch_id),
+    )
+
+
+@router.get(
+    "/analytics/branches",
+    response_model=BranchAnalyticsReport,
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def get_branch_analytics(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Utilización actual de cada sucursal y su actividad en el periodo.
+    """
+    start, end = _analytics_range(start, end)
+    return BranchAnalyticsReport(start=start, end=end, branches=branch_utilization(db, start, end))
+
+
+@router.get(
+    "/singleflight",
+    response_model=List[SingleFlightStats],
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def get_singleflight_stats():
+    """
+    Contadores de coalescencia de lecturas (por worker).
+    """
+    return singleflight_stats()
+
+
+@router.get(
+    "/cache",
+    response_model=CacheStats,
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def get_cache_stats():
+    """
+    Aciertos / fallos de la caché de respuestas del catálogo (por worker).
+    """
+    backend = response_cache.backend
+    return CacheStats(
+        backend=backend.name,
+        size=backend.size(),
+        evictions=backend.evictions,
+        namespaces=response_cache.stats(),
+    )
+
+
+@router.get(
+    "/indexes",
+    response_model=List[IndexStats],
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def get_index_stats():
+    """
+    Memoria de los índices en memoria del catálogo (por worker).
+    """
+    return [suggest_index.stats(), related_index.stats()]
+
+
+@router.get(
+    "/jobs",
+    response_model=List[JobRunRead],
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def list_job_runs(
+    name: Optional[str] = Query(None, description="Filtrar por tarea (overdue, build-related, ...)"),
+    status_filter: Optional[str] = Query(None, alias="status", description="queued, running, failed, ..."),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """
+    Últimas ejecuciones de las tareas en segundo plano (scheduler, CLI o API).
+    """
+    query = db.query(JobRun)
+    if name is not None:
+        query = query.filter(JobRun.job_name == name)
+    if status_filter is not None:
+        query = query.filter(JobRun.status == status_filter)
+    return query.order_by(JobRun.created_at.desc(), JobRun.id.desc()).limit(limit).all()
+
+
+@router.post(
+    "/jobs/{name}",
+    response_model=JobRunRead,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def start_job(
+    name: str,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Lanza una tarea en segundo plano y responde en seguida (202). El progreso
+    se consulta en la URL de la cabecera Location.
+    """
+    run = job_executor.submit(db, name, requested_by=current_user)
+    response.headers["Location"] = f"/admin/jobs/{run.id}"
+    logger.info(
+        "job_enqueued",
+        extra={"operation": "jobs", "resource": name, "user_id": current_user.id},
+    )
+    return run
+
+
+@router.post(
+    "/jobs/{run_id}/cancel",
+    response_model=JobRunRead,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def cancel_job(
+    run_id: int,
+    db: Session = Depends(get_db),
+):
+    """
+    Cancela una tarea. En cola: no llega a ejecutarse. En marcha: se detiene
+    en su siguiente punto de control (el trabajo ya hecho se conserva).
+    """
+    run = db.get(JobRun, run_id, with_for_update=True)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Job run not found")
+    if not request_cancel(db, run):
+        raise HTTPException(status_code=409, detail=f"Job already {run.status}")
+    return run
+
+
+@router.get(
+    "/jobs/{run_id}",
+    response_model=JobRunDetail,
+    dependencies=[Depends(require_role(UserRole.ADMIN))],
+)
+def get_job_run(
+    run_id: int,
+    db: Session = Depends(get_db),
+):
+    """
+    Una ejecución con su progreso (por chunks en tareas por lotes como overdue).
+    """
+    run = db.get(JobRun, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Job run not found")
+
+    rows = db.execute(
+        select(
+            JobChunk.branch_id,
+            func.count(),
+            func.count().filter(JobChunk.status == "done"),
+            func.count().filter(JobChunk.status == "failed"),
+            func.coalesce(func.sum(JobChunk.rows_affected), 0),
+        )
+        .where(JobChunk.run_id == run_id)
+        .group_by(JobChunk.branch_id)
+        .order_by(JobChunk.branch_id)
+    ).all()
+    branches = [
+        JobBranchProgress(branch_id=b, chunks=total, done=done, failed=failed, rows_affected=affected)
+        for b, total, done, failed, affected in rows
+    ]
+    total = sum(b.chunks for b in branches)
+    done = sum(b.done for b in branches)
+    failed = sum(b.failed for b in branches)
+
+    detail = JobRunDetail.model_validate(run)
+    detail.total_chunks = total
+    detail.done_chunks = done
+    detail.failed_chunks = failed
+    detail.pending_chunks = total - done - failed
+    detail.rows_processed = sum(b.rows_affected for b in branches)
+    if total:
+        detail.progress = done / total
+    detail.branches = branches
+    return detail
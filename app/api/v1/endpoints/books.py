@@ -1,33 +1,50 @@
+import asyncio
+from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import asc, desc
+from sqlalchemy import asc, desc, func
 from sqlalchemy.exc import IntegrityError
 
 from app.api.v1.dependencies import get_db
-from app.api.v1.dependencies_auth import get_current_user, require_role
-from app.db.models import Book, LibraryBranch, User, UserRole
-from app.schemas.book import BookCreate, BookUpdate, BookRead
+from app.api.v1.dependencies_auth import get_current_user, oauth2_scheme, require_role
+from app.core.cache import response_cache
+from app.core.http_cache import is_not_modified, not_modified_response, set_validators, weak_etag
+from app.core.invalidation import publish
+from app.core.responses import FastJSONResponse
+from app.core.singleflight import SingleFlight, make_key
+from app.db.models import Book, User, UserRole
+from app.db.session import SessionLocal
+from app.schemas.book import BookCreate, BookUpdate, BookRead, BookSuggestion, PopularBook, RelatedBook
+from app.schemas.sync import BookChanges
+from app.services.availability_feed import availability_feed
+from app.services.branch_registry import branch_registry
+from app.services.catalog_cache import BOOK_LIST_NAMESPACE, BOOK_NAMESPACE, book_scope
+from app.services.popularity import WINDOWS, popularity_index
+from app.services.related_books import TOP_K, related_index
+from app.services.suggest_index import suggest_index
+from app.services.sync_service import decode_token, fetch_changes, record_tombstone
 
 router = APIRouter(
     prefix="/api/v1/books",
     tags=["books"],
 )
 
+# Lecturas idénticas concurrentes comparten una sola consulta
+book_reads = SingleFlight("books")
 
-@router.get("/", response_model=List[BookRead])
-def list_books(
-    title: Optional[str] = Query(None),
-    author: Optional[str] = Query(None),
-    isbn: Optional[str] = Query(None),
-    branch_id: Optional[int] = Query(None),
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-    order_by: str = "id",          # "title", "created_at", "publication_year", etc.
-    order_dir: str = "asc",        # "asc" o "desc"
+
+def _filtered_books_query(
+    db: Session,
+    title: Optional[str],
+    author: Optional[str],
+    isbn: Optional[str],
+    branch_id: Optional[int],
+    order_by: str,
+    order_dir: str,
 ):
     query = db.query(Book)
 
@@ -40,8 +57,6 @@ def list_books(
     if branch_id:
         query = query.filter(Book.branch_id == branch_id)
 
-    books = query.offset(skip).limit(limit).all()
-    
     # ORDENAMIENTO
     orderable_fields = {
         "id": Book.id,
@@ -53,13 +68,88 @@ def list_books(
     column = orderable_fields.get(order_by, Book.id)
 
     if order_dir.lower() == "desc":
-        query = query.order_by(desc(column))
+        query = query.order_by(desc(column), desc(Book.id))
     else:
         #default
-        query = query.order_by(asc(column))
+        query = query.order_by(asc(column), asc(Book.id))
 
-    books = query.offset(skip).limit(limit).all()
-    return books
+    return query
+
+
+@router.get("/", response_model=List[BookRead])
+def list_books(
+    request: Request,
+    title: Optional[str] = Query(None),
+    author: Optional[str] = Query(None),
+    isbn: Optional[str] = Query(None),
+    branch_id: Optional[int] = Query(None),
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    order_by: str = "id",          # "title", "created_at", "publication_year", etc.
+    order_dir: str = "asc",        # "asc" o "desc"
+):
+    query = _filtered_books_query(db, title, author, isbn, branch_id, order_by, order_dir)
+    page = query.offset(skip).limit(limit)
+
+    # title/author se filtran con ILIKE, así que la clave puede ir en minúsculas
+    params = {
+        "title": title.lower() if title else None,
+        "author": author.lower() if author else None,
+        "isbn": isbn,
+        "branch_id": branch_id,
+        "skip": skip,
+        "limit": limit,
+        "order_by": order_by,
+        "order_dir": order_dir.lower(),
+    }
+    key = make_key("books.list", params, scope=current_user.role.value)
+    # El catálogo es igual para todos los roles: la caché no separa por rol
+    cache_key = make_key("books.list", params, scope="catalog")
+
+    # GET condicional: agregado barato sobre la página (sin traer las filas)
+    def load_validators():
+        page_ids = page.with_entities(Book.id, Book.updated_at).subquery()
+        max_updated_at, row_count, id_sum = db.query(
+            func.max(page_ids.c.updated_at),
+            func.count(),
+            func.coalesce(func.sum(page_ids.c.id), 0),
+        ).one()
+        return weak_etag("books", max_updated_at, row_count, id_sum)
+
+    def load_page():
+        books = [BookRead.model_validate(book) for book in page.all()]
+        # Mismo ETag que el agregado SQL, calculado sobre las filas ya leídas
+        etag = weak_etag(
+            "books",
+            max((b.updated_at for b in books), default=None),
+            len(books),
+            sum(b.id for b in books),
+        )
+        return {"etag": etag, "items": [b.model_dump(mode="json") for b in books]}
+
+    entry, version = response_cache.lookup(BOOK_LIST_NAMESPACE, cache_key)
+    if entry is None:
+        # La versión va en la clave: tras una escritura nadie se suma a una
+        # lectura en vuelo anterior (ni guarda su resultado como vigente)
+        flight_key = key + (version,)
+        # Sin caché, un cliente con ETag solo necesita el agregado barato
+        if request.headers.get("if-none-match") is not None:
+            etag = book_reads.do(flight_key + ("etag",), load_validators)
+            if is_not_modified(request, etag):
+                return not_modified_response(etag)
+
+        entry = book_reads.do(flight_key, load_page)
+        response_cache.store(BOOK_LIST_NAMESPACE, cache_key, version, entry)
+
+    if is_not_modified(request, entry["etag"]):
+        return not_modified_response(entry["etag"])
+
+    # El cuerpo ya está en formato JSON: se evita re-validar contra response_model
+    cached_response = FastJSONResponse(entry["items"])
+    set_validators(cached_response, entry["etag"])
+    return cached_response
 
 
 @router.post(
@@ -72,9 +162,8 @@ def create_book(
     payload: BookCreate,
     db: Session = Depends(get_db),
 ):
-    # Validar que la sucursal exista
-    branch = db.query(LibraryBranch).filter(LibraryBranch.id == payload.branch_id).first()
-    if not branch:
+    # Validar que la sucursal exista (registro en memoria, sin ir a la BD)
+    if not branch_registry.exists(db, payload.branch_id):
         raise HTTPException(
             status_code=400,
             detail="Branch not found",
@@ -94,6 +183,9 @@ def create_book(
 
     db.add(book)
     try:
+        db.flush()
+        publish(db, "book", book.id)
+        publish(db, "book_text", book.id)
         db.commit()
         db.refresh(book)
         return book
@@ -111,19 +203,195 @@ def create_book(
     
     
 
+# ---- Más prestados (debe ir antes de /{book_id}) ----
+@router.get("/popular", response_model=List[PopularBook])
+def popular_books(
+    window: str = Query("7d"),
+    branch_id: Optional[int] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Libros más prestados en la ventana (1d, 7d, 30d), global o por sucursal.
+    Se sirve desde contadores en memoria (no consulta loans).
+    """
+    if window not in WINDOWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid window, use one of: {', '.join(WINDOWS)}",
+        )
+    return popularity_index.top(db, window, branch_id, limit)
+
+
+@router.get("/suggest", response_model=List[BookSuggestion])
+def suggest_books(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=20),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Autocompletado: libros con alguna palabra del título o del autor que
+    empieza por `q` (sin distinguir mayúsculas ni tildes). Índice en memoria.
+    """
+    return suggest_index.suggest(db, q, limit)
+
+
+MAX_STREAM_BOOKS = 50
+
+
+def _parse_book_ids(raw: str) -> list[int]:
+    try:
+        ids = sorted({int(part) for part in raw.split(",") if part.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="book_ids must be a comma-separated list of ids")
+    if not ids or len(ids) > MAX_STREAM_BOOKS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"book_ids must contain between 1 and {MAX_STREAM_BOOKS} ids",
+        )
+    return ids
+
+
+def _authenticated_subscribe(
+    request: Request, token: str, book_ids: list[int], loop: asyncio.AbstractEventLoop
+) -> tuple:
+    # Sesión corta: el stream no retiene una conexión del pool mientras dura
+    with SessionLocal() as db:
+        get_current_user(request, token, db)
+        return availability_feed.subscribe(db, book_ids, loop)
+
+
+def _snapshot(book_ids: list[int]) -> list[dict]:
+    with SessionLocal() as db:
+        return availability_feed.snapshot(db, book_ids)
+
+
+@router.get("/availability/stream")
+async def availability_stream(
+    request: Request,
+    book_ids: str = Query(..., description="Ids separados por coma (máx. 50)"),
+    token: str = Depends(oauth2_scheme),
+):
+    """
+    Server-Sent Events con los cambios de available_copies de los libros
+    pedidos: un evento "snapshot" inicial y luego un "availability" por cada
+    cambio ({book_id, available_copies, delta}).
+    """
+    ids = _parse_book_ids(book_ids)
+    subscription, initial = await run_in_threadpool(
+        _authenticated_subscribe, request, token, ids, asyncio.get_running_loop()
+    )
+
+    return StreamingResponse(
+        availability_feed.events(subscription, initial, lambda: run_in_threadpool(_snapshot, ids)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ---- Sincronización incremental (debe ir antes de /{book_id}) ----
+@router.get("/changes", response_model=BookChanges)
+def book_changes(
+    since: Optional[str] = Query(None, description="Token devuelto por la llamada anterior"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Libros creados / actualizados / borrados después del token `since`.
+    Sin token devuelve el catálogo completo por páginas.
+    """
+    return fetch_changes(
+        db,
+        model=Book,
+        entity="book",
+        cursor=decode_token(since),
+        limit=limit,
+    )
+
+
 @router.get("/{book_id}", response_model=BookRead)
 def get_book(
     book_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if not book:
-        raise HTTPException(
-            status_code=404,
-            detail="Book not found",
+    key = make_key("books.get", {"book_id": book_id}, scope=current_user.role.value)
+    scope = book_scope(book_id)
+
+    def load_book():
+        book = db.query(Book).filter(Book.id == book_id).first()
+        if not book:
+            raise HTTPException(
+                status_code=404,
+                detail="Book not found",
+            )
+        return {
+            "etag": weak_etag("book", book_id, book.updated_at),
+            "body": BookRead.model_validate(book).model_dump(mode="json"),
+        }
+
+    entry, version = response_cache.lookup(BOOK_NAMESPACE, book_id, scope=scope)
+    if entry is None:
+        flight_key = key + (version,)
+        # GET condicional sin caché: solo leemos updated_at para validar la copia del cliente
+        if request.headers.get("if-none-match") or request.headers.get("if-modified-since"):
+            updated_at = book_reads.do(
+                flight_key + ("etag",),
+                lambda: db.query(Book.updated_at).filter(Book.id == book_id).scalar(),
+            )
+            if updated_at is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Book not found",
+                )
+            etag = weak_etag("book", book_id, updated_at)
+            if is_not_modified(request, etag, updated_at):
+                return not_modified_response(etag, updated_at)
+
+        entry = book_reads.do(flight_key, load_book)
+        response_cache.store(BOOK_NAMESPACE, book_id, version, entry, scope=scope)
+
+    updated_at = datetime.fromisoformat(entry["body"]["updated_at"])
+    if is_not_modified(request, entry["etag"], updated_at):
+        return not_modified_response(entry["etag"], updated_at)
+
+    cached_response = FastJSONResponse(entry["body"])
+    set_validators(cached_response, entry["etag"], updated_at)
+    return cached_response
+
+
+@router.get("/{book_id}/related", response_model=List[RelatedBook])
+def related_books(
+    book_id: int,
+    limit: int = Query(10, ge=1, le=TOP_K),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    "Quienes tomaron este libro también tomaron...", desde el índice
+    precalculado en memoria (no consulta loans).
+    """
+    neighbors = related_index.lookup(db, book_id, limit)
+
+    ids = [book_id] + [related_id for related_id, _ in neighbors]
+    books = {row.id: row for row in db.query(Book.id, Book.title, Book.author).filter(Book.id.in_(ids))}
+    if book_id not in books:
+        raise HTTPException(status_code=404, detail="Book not found")
+
+    return [
+        RelatedBook(
+            book_id=related_id,
+            title=books[related_id].title,
+            author=books[related_id].author,
+            score=round(score, 4),
         )
-    return book
+        for related_id, score in neighbors
+        if related_id in books
+    ]
 
 
 @router.put(
@@ -150,6 +418,9 @@ def update_book(
     for field, value in update_data.items():
         setattr(book, field, value)
 
+    publish(db, "book", book.id)
+    if "title" in update_data or "author" in update_data:
+        publish(db, "book_text", book.id)
     db.commit()
     db.refresh(book)
     return book
@@ -171,6 +442,9 @@ def delete_book(
             detail="Book not found",
         )
 
+    record_tombstone(db, "book", book.id)
     db.delete(book)
+    publish(db, "book", book_id)
+    publish(db, "book_text", book_id)
     db.commit()
     return None
@@ -1,12 +1,15 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 
 from app.api.v1.dependencies import get_db
 from app.api.v1.dependencies_auth import get_current_user, require_role
+from app.core.http_cache import is_not_modified, not_modified_response, set_validators, weak_etag
 from app.db.models import LibraryBranch, UserRole, User
+from app.core.invalidation import publish
 from app.schemas.branch import BranchCreate, BranchUpdate, BranchRead
+from app.services.branch_registry import branch_registry
 
 import logging
 
@@ -23,10 +26,19 @@ router = APIRouter(
     response_model=List[BranchRead]
 )
 def list_branches(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return db.query(LibraryBranch).all()
+    # Se sirve desde el registro en memoria (sin consulta a la BD)
+    max_updated_at, row_count, id_sum = branch_registry.list_validators(db)
+    etag = weak_etag("branches", max_updated_at, row_count, id_sum)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    set_validators(response, etag)
+    return list(branch_registry.all(db))
 
 
 @router.post(
@@ -52,8 +64,13 @@ def create_branch(
         phone_number=payload.phone_number,
         email=payload.email,
         is_active=payload.is_active,
+        late_fee_per_day=payload.late_fee_per_day,
+        loan_days=payload.loan_days,
+        max_active_loans=payload.max_active_loans,
     )
     db.add(branch)
+    db.flush()
+    publish(db, "branch", branch.id)
     db.commit()
     db.refresh(branch)
 
@@ -79,14 +96,21 @@ def create_branch(
 )
 def get_branch(
     branch_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    branch = db.query(LibraryBranch).filter(LibraryBranch.id == branch_id).first()
+    branch = branch_registry.get(db, branch_id)
 
     if not branch:
         raise HTTPException(404, "Branch not found")
 
+    etag = weak_etag("branch", branch_id, branch.updated_at)
+    if is_not_modified(request, etag, branch.updated_at):
+        return not_modified_response(etag, branch.updated_at)
+
+    set_validators(response, etag, branch.updated_at)
     return branch
 
 
@@ -111,6 +135,7 @@ def update_branch(
     for field, value in payload.model_dump(exclude_unset=True).items():
         setattr(branch, field, value)
 
+    publish(db, "branch", branch.id)
     db.commit()
     db.refresh(branch)
     return branch
@@ -135,6 +160,7 @@ def delete_branch(
         raise HTTPException(status_code=404, detail="Branch not found")
 
     db.delete(branch)
+    publish(db, "branch", branch_id)
     db.commit()
     return None
 
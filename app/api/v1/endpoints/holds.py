@@ -0,0 +1,134 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from app.api.v1.dependencies import get_db
+from app.api.v1.dependencies_auth import get_current_user, require_role
+from app.db.models import Book, BookHold, HoldStatus, User, UserRole
+from app.schemas.hold import HoldCreate, HoldRead
+from app.services.branch_registry import branch_registry
+from app.services.hold_service import cancel_hold, enqueue_hold
+
+import logging
+
+logger = logging.getLogger("api.holds")
+
+
+router = APIRouter(
+    prefix="/api/v1/holds",
+    tags=["holds"],
+)
+
+
+# ---- Ponerse en la cola de un libro (Member) ----
+@router.post(
+    "/",
+    response_model=HoldRead,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(require_role(UserRole.MEMBER))],
+)
+def create_hold(
+    payload: HoldCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Reserva un libro sin copias disponibles. Cuando se devuelva una copia,
+    la primera reserva de la cola recibe un préstamo APPROVED automáticamente.
+    """
+    book = db.query(Book).filter(Book.id == payload.book_id).first()
+    if not book:
+        raise HTTPException(status_code=400, detail="Book not found")
+
+    if not branch_registry.exists(db, payload.branch_id):
+        raise HTTPException(status_code=400, detail="Branch not found")
+
+    hold = enqueue_hold(db, book, current_user, payload.branch_id)
+
+    logger.info(
+        "Hold created",
+        extra={
+            "operation": "hold_create",
+            "resource": "hold",
+            "hold_id": hold.id,
+            "book_id": hold.book_id,
+            "branch_id": hold.branch_id,
+            "status_code": 201,
+        },
+    )
+    return hold
+
+
+# ---- Reservas del usuario actual ---- (debe ir antes de hold_id)
+@router.get("/my", response_model=List[HoldRead])
+def my_holds(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    return (
+        db.query(BookHold)
+        .filter(BookHold.member_id == current_user.id)
+        .order_by(BookHold.created_at.desc(), BookHold.id.desc())
+        .all()
+    )
+
+
+# ---- Cola de un libro (Librarian / Admin) ----
+@router.get(
+    "/",
+    response_model=List[HoldRead],
+    dependencies=[Depends(require_role(UserRole.LIBRARIAN))],
+)
+def list_holds(
+    book_id: int = Query(...),
+    status_filter: Optional[HoldStatus] = Query(HoldStatus.WAITING, alias="status"),
+    db: Session = Depends(get_db),
+):
+    query = db.query(BookHold).filter(BookHold.book_id == book_id)
+    if status_filter is not None:
+        query = query.filter(BookHold.status == status_filter)
+    return query.order_by(BookHold.position, BookHold.created_at, BookHold.id).all()
+
+
+def _get_visible_hold(db: Session, hold_id: int, current_user: User) -> BookHold:
+    hold = db.query(BookHold).filter(BookHold.id == hold_id).first()
+    if not hold:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    if current_user.role == UserRole.MEMBER and hold.member_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return hold
+
+
+# ---- Detalle (posición en la cola) ----
+@router.get("/{hold_id}", response_model=HoldRead)
+def get_hold(
+    hold_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    return _get_visible_hold(db, hold_id, current_user)
+
+
+# ---- Cancelar (dueño o staff) ----
+@router.delete("/{hold_id}", response_model=HoldRead)
+def delete_hold(
+    hold_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    hold = _get_visible_hold(db, hold_id, current_user)
+    hold = cancel_hold(db, hold)
+
+    logger.info(
+        "Hold canceled",
+        extra={
+            "operation": "hold_cancel",
+            "resource": "hold",
+            "hold_id": hold.id,
+            "book_id": hold.book_id,
+            "status_code": 200,
+            "user_id": current_user.id,
+        },
+    )
+    return hold
@@ -1,24 +1,44 @@
 from typing import List, Optional
 from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from app.api.v1.dependencies import get_db
 from app.api.v1.dependencies_auth import get_current_user, require_role
-from app.db.models import Loan, Book, LibraryBranch, User, UserRole
+from app.core.jobs import job_executor
+from app.db.models import Loan, Book, User, UserRole
 from app.schemas.loan import (
+    LoanBulkSkipped,
+    LoanBulkStatusChange,
+    LoanBulkStatusResult,
+    LoanClaimResult,
     LoanCreate,
+    LoanFeesReport,
+    LoanIds,
     LoanRead,
     LoanWithHistoryRead,
     LoanStatusChange,
     LoanStatus,
 )
+from app.schemas.admin import JobRunRead
+from app.schemas.sync import LoanChanges
 from app.services.loan_service import (
     change_loan_status,
-    calculate_late_fee,
-    mark_overdue_loans,  # <- NUEVO IMPORT
+    reserve_active_loan_slot,
 )
+from app.services.archival import all_loans, find_loan
+from app.services.branch_registry import branch_registry
+from app.services.fees import loan_fees
+from app.services.loan_policy import ROLE_DENIED_DETAIL, loan_policies, role_may_transition
+from app.services.loan_queue import (
+    MAX_CLAIM,
+    claim_is_active,
+    claim_loans,
+    ensure_not_claimed_by_other,
+    release_claims,
+)
+from app.services.sync_service import decode_token, fetch_changes
 
 import logging
 
@@ -48,24 +68,18 @@ def create_loan_request(
     if not book:
         raise HTTPException(status_code=400, detail="Book not found")
 
-    # validar branch
-    branch = db.query(LibraryBranch).filter(LibraryBranch.id == payload.branch_id).first()
-    if not branch:
+    # validar branch (registro en memoria, sin ir a la BD)
+    if not branch_registry.exists(db, payload.branch_id):
         raise HTTPException(status_code=400, detail="Branch not found")
 
-    # Regla: no más de 5 préstamos activos
-    active_statuses = [
-        LoanStatus.REQUESTED,
-        LoanStatus.APPROVED,
-        LoanStatus.BORROWED,
-        LoanStatus.OVERDUE,
-    ]
-    active_loans_count = (
-        db.query(Loan)
-        .filter(Loan.member_id == current_user.id, Loan.status.in_(active_statuses))
-        .count()
-    )
-    if active_loans_count >= 5:
+    # Plazo y límite de préstamos activos según la política de la sucursal
+    policy = loan_policies.for_branch(db, payload.branch_id)
+
+    # Regla: no más de max_active_loans préstamos activos. El contador de
+    # users es global (todas las sucursales): la sucursal elige el tope, no
+    # qué préstamos cuentan. Si algo falla después, el rollback deshace
+    # también el incremento
+    if not reserve_active_loan_slot(db, current_user.id, policy.max_active_loans):
         raise HTTPException(
             status_code=400,
             detail="You already have the maximum number of active loans",
@@ -78,7 +92,7 @@ def create_loan_request(
 
     # Crear el préstamo en estado REQUESTED
     now = datetime.now(timezone.utc)
-    due = now + timedelta(days=14)
+    due = now + timedelta(days=policy.loan_days)
 
     loan = Loan(
         member_id=current_user.id,
@@ -119,62 +133,231 @@ def list_loans(
     branch_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
+    include_archived: bool = Query(False, description="Incluir préstamos cerrados archivados"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    query = db.query(Loan)
+    # Con include_archived se lee loans UNION ALL loans_archive
+    loans_table = all_loans() if include_archived else Loan.__table__
+    cols = loans_table.c
+    query = db.query(loans_table) if include_archived else db.query(Loan)
 
     # --- Filtro por rol ---
     if current_user.role == UserRole.MEMBER:
         # El member solo ve SUS préstamos
-        query = query.filter(Loan.member_id == current_user.id)
+        query = query.filter(cols.member_id == current_user.id)
 
     elif current_user.role == UserRole.LIBRARIAN:
         # El librarian ve TODOS los préstamos,
         # pero si se manda branch_id, filtra por sucursal
         if branch_id is not None:
-            query = query.filter(Loan.branch_id == branch_id)
+            query = query.filter(cols.branch_id == branch_id)
 
     elif current_user.role == UserRole.ADMIN:
         # Admin ve todos; puede filtrar opcionalmente
         if member_id is not None:
-            query = query.filter(Loan.member_id == member_id)
+            query = query.filter(cols.member_id == member_id)
         if branch_id is not None:
-            query = query.filter(Loan.branch_id == branch_id)
+            query = query.filter(cols.branch_id == branch_id)
 
     # --- Filtro por status (opcional) ---
     if status_filter is not None:
         from app.db.models import LoanStatus as LoanStatusDB
 
-        query = query.filter(Loan.status == LoanStatusDB(status_filter.value))
+        query = query.filter(cols.status == LoanStatusDB(status_filter.value))
 
-    loans = query.offset(skip).limit(limit).all()
+    loans = query.order_by(cols.id).offset(skip).limit(limit).all()
     return loans
 
 
 # ---- Historial del usuario actual ---- (importante debe ir antes de loan_id)
 @router.get("/my-history", response_model=List[LoanRead])
 def my_loan_history(
+    include_archived: bool = Query(False, description="Incluir préstamos cerrados archivados"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
+    loans_table = all_loans() if include_archived else Loan.__table__
+    query = db.query(loans_table) if include_archived else db.query(Loan)
     loans = (
-        db.query(Loan)
-        .filter(Loan.member_id == current_user.id)
-        .order_by(Loan.created_at.desc())
+        query
+        .filter(loans_table.c.member_id == current_user.id)
+        .order_by(loans_table.c.created_at.desc())
         .all()
     )
     return loans
 
 
+# ---- Multas por retraso (debe ir antes de loan_id) ----
+@router.get("/fees", response_model=LoanFeesReport)
+def list_loan_fees(
+    member_id: Optional[int] = None,
+    branch_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Multas de un miembro o de una sucursal, calculadas en una consulta: las
+    de préstamos abiertos a hoy, las de cerrados tal como quedaron.
+    """
+    if current_user.role == UserRole.MEMBER:
+        # El member solo ve SUS multas
+        member_id = current_user.id
+    elif member_id is None and branch_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="member_id or branch_id is required",
+        )
+
+    rows = loan_fees(db, member_id=member_id, branch_id=branch_id)
+    return {
+        "as_of": datetime.now(timezone.utc).date(),
+        "total": round(sum(float(row["late_fee"]) for row in rows), 2),
+        "loans": rows,
+    }
+
+
+# ---- Sincronización incremental (debe ir antes de loan_id) ----
+@router.get("/changes", response_model=LoanChanges)
+def loan_changes(
+    since: Optional[str] = Query(None, description="Token devuelto por la llamada anterior"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Préstamos creados / actualizados / borrados después del token `since`.
+    El member solo recibe los suyos; librarian y admin reciben todos.
+    """
+    query = db.query(Loan)
+    member_scope = None
+    if current_user.role == UserRole.MEMBER:
+        query = query.filter(Loan.member_id == current_user.id)
+        member_scope = current_user.id
+
+    return fetch_changes(
+        db,
+        model=Loan,
+        entity="loan",
+        cursor=decode_token(since),
+        limit=limit,
+        rows_query=query,
+        member_id=member_scope,
+    )
+
+
+# ---- Cola de trabajo de bibliotecarios ----
+@router.post(
+    "/queue/claim",
+    response_model=LoanClaimResult,
+    dependencies=[Depends(require_role(UserRole.LIBRARIAN))],
+)
+def claim_requested_loans(
+    branch_id: Optional[int] = Query(None),
+    n: int = Query(10, ge=1, le=MAX_CLAIM),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Reclama los siguientes `n` préstamos REQUESTED (FIFO) para este
+    bibliotecario. Otros mostradores no los reciben mientras dure el lease.
+    """
+    loans, expires_at = claim_loans(db, current_user, n, branch_id)
+
+    logger.info(
+        "Loans claimed",
+        extra={
+            "operation": "loan_queue_claim",
+            "resource": "loan",
+            "branch_id": branch_id,
+            "claimed_count": len(loans),
+            "status_code": 200,
+            "user_id": current_user.id,
+        },
+    )
+    return LoanClaimResult(claim_expires_at=expires_at, loans=loans)
+
+
+@router.post(
+    "/queue/release",
+    dependencies=[Depends(require_role(UserRole.LIBRARIAN))],
+)
+def release_claimed_loans(
+    payload: LoanIds,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Devuelve a la cola préstamos reclamados sin resolver."""
+    return {"released": release_claims(db, current_user, payload.loan_ids)}
+
+
+@router.post(
+    "/queue/transition",
+    response_model=LoanBulkStatusResult,
+    dependencies=[Depends(require_role(UserRole.LIBRARIAN))],
+)
+def transition_claimed_loans(
+    payload: LoanBulkStatusChange,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Aplica el mismo cambio de estado a préstamos reclamados por este
+    bibliotecario. Los que no se pueden cambiar (lease vencido, reclamados
+    por otro, transición inválida) se informan en `skipped`.
+    """
+    loans = {
+        loan.id: loan
+        for loan in db.query(Loan).filter(Loan.id.in_(payload.loan_ids))
+    }
+    updated, skipped = [], []
+    for loan_id in payload.loan_ids:
+        loan = loans.get(loan_id)
+        if loan is None:
+            skipped.append(LoanBulkSkipped(loan_id=loan_id, detail="Loan not found"))
+            continue
+        if not (claim_is_active(loan) and loan.claimed_by_user_id == current_user.id):
+            skipped.append(LoanBulkSkipped(loan_id=loan_id, detail="Loan is not claimed by you"))
+            continue
+        try:
+            _check_status_permission(loan, payload.new_status, current_user)
+            updated.append(
+                change_loan_status(
+                    db=db,
+                    loan=loan,
+                    new_status=payload.new_status,
+                    actor=current_user,
+                    note=payload.note,
+                )
+            )
+        except HTTPException as exc:
+            db.rollback()
+            skipped.append(LoanBulkSkipped(loan_id=loan_id, detail=str(exc.detail)))
+
+    logger.info(
+        "Claimed loans transitioned",
+        extra={
+            "operation": "loan_queue_transition",
+            "resource": "loan",
+            "new_status": payload.new_status.value,
+            "updated_count": len(updated),
+            "skipped_count": len(skipped),
+            "status_code": 200,
+            "user_id": current_user.id,
+        },
+    )
+    return LoanBulkStatusResult(updated=updated, skipped=skipped)
+
+
 # ---- Detalle de un préstamo ----
 @router.get("/{loan_id}", response_model=LoanWithHistoryRead)
 def get_loan(
     loan_id: int,
+    include_archived: bool = Query(False, description="Buscar también en loans_archive"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    loan = db.query(Loan).filter(Loan.id == loan_id).first()
+    loan = find_loan(db, loan_id, include_archived, details=True)
     if not loan:
         raise HTTPException(status_code=404, detail="Loan not found")
 
@@ -184,6 +367,26 @@ def get_loan(
     return loan
 
 
+def _check_status_permission(loan: Loan, new_status: LoanStatus, current_user: User) -> None:
+    """Valida que el rol del usuario pueda aplicar esta transición."""
+    old_status = loan.status
+
+    # El member solo actúa sobre SUS préstamos
+    if current_user.role == UserRole.MEMBER and loan.member_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    # Permisos por rol: tabla precompilada (app.services.loan_policy)
+    if not role_may_transition(current_user.role, old_status, new_status):
+        raise HTTPException(
+            status_code=403,
+            detail=ROLE_DENIED_DETAIL.get(current_user.role, "Forbidden"),
+        )
+
+    # Otro mostrador tiene el préstamo reclamado (cola de trabajo)
+    if current_user.role != UserRole.MEMBER and old_status == LoanStatus.REQUESTED:
+        ensure_not_claimed_by_other(loan, current_user)
+
+
 # ---- Cambio de estado ----
 @router.patch("/{loan_id}/status", response_model=LoanRead)
 def update_loan_status(
@@ -199,34 +402,7 @@ def update_loan_status(
     # Validar permisos según rol y transición
     new_status = payload.new_status
     old_status = loan.status
-
-    # Validar permisos según rol
-    if current_user.role == UserRole.MEMBER:
-        # Solo puede CANCELAR mientras está REQUESTED y sea suyo
-        if loan.member_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Forbidden")
-        if not (old_status == LoanStatus.REQUESTED and new_status == LoanStatus.CANCELED):
-            raise HTTPException(
-                status_code=403,
-                detail="Members can only cancel requested loans",
-            )
-
-    elif current_user.role == UserRole.LIBRARIAN:
-        # Librarian puede: APPROVED, BORROWED, RETURNED, LOST
-        if new_status not in {
-            LoanStatus.APPROVED,
-            LoanStatus.BORROWED,
-            LoanStatus.RETURNED,
-            LoanStatus.LOST,
-        }:
-            raise HTTPException(
-                status_code=403,
-                detail="Invalid status for librarian",
-            )
-
-    elif current_user.role == UserRole.ADMIN:
-        # Admin puede todo, dejamos pasar
-        pass
+    _check_status_permission(loan, new_status, current_user)
 
     # Aplicar cambio de estado (esto también afecta copias disponibles, multas, etc.)
     updated_loan = change_loan_status(
@@ -259,30 +435,32 @@ def update_loan_status(
 # ---- Job manual para marcar OVERDUE (solo ADMIN) ----
 @router.post(
     "/run-overdue-job",
-    status_code=status.HTTP_200_OK,
+    response_model=JobRunRead,
+    status_code=status.HTTP_202_ACCEPTED,
     dependencies=[Depends(require_role(UserRole.ADMIN))],
 )
 def run_overdue_job(
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """
-    Ejecuta el job que:
-    - Busca todos los préstamos BORROWED cuya due_date ya pasó.
-    - Los marca como OVERDUE.
-    - Calcula y asigna la multa correspondiente.
+    Encola el job que marca OVERDUE (con multa) los préstamos BORROWED
+    vencidos y responde 202 sin esperar a que termine. El resultado
+    (rows_affected) se consulta en la URL de la cabecera Location.
     """
-    updated_count = mark_overdue_loans(db)
+    run = job_executor.submit(db, "overdue", requested_by=current_user)
+    response.headers["Location"] = f"/admin/jobs/{run.id}"
 
     logger.info(
-        "Overdue job executed",
+        "Overdue job enqueued",
         extra={
             "operation": "loan_overdue_job",
             "resource": "loan",
-            "updated_count": updated_count,
-            "status_code": 200,
+            "job_id": run.id,
+            "status_code": 202,
             "run_by_user_id": current_user.id,
         },
     )
 
-    return {"updated_overdue_loans": updated_count}
+    return run
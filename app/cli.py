@@ -0,0 +1,142 @@
+# app/cli.py
+"""
+Comandos de mantenimiento.
+
+    python -m app.cli reconcile-stats [--dry-run]
+    python -m app.cli reconcile-inventory [--dry-run] [--branch-id N]
+    python -m app.cli rollup-analytics [--since YYYY-MM-DD]
+    python -m app.cli build-related [--full]
+    python -m app.cli purge-history [--dry-run] [--months N]
+    python -m app.cli run-job <nombre de una tarea de SCHEDULE>
+"""
+import argparse
+import sys
+from datetime import date
+
+from app.core.scheduler import record_run
+from app.db.session import SessionLocal
+from app.services.analytics_service import refresh_daily_rollups
+from app.services.history_retention import estimate_purge, purge_history
+from app.services.inventory_service import reconcile_inventory
+from app.services.related_books import build_related
+from app.services.scheduled_jobs import SCHEDULE
+from app.services.stats_service import reconcile_stats
+
+
+def _reconcile_stats(args: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        result = reconcile_stats(db, apply=not args.dry_run)
+
+    for item in result["drift"]:
+        print(f"{item['counter']}: stored={item['stored']} actual={item['actual']}")
+    action = "rebuilt" if result["applied"] else "unchanged"
+    print(f"{result['checked']} counters checked, {len(result['drift'])} drifted ({action})")
+    # Código 1 si hubo deriva: sirve para alertar desde cron
+    return 1 if result["drift"] else 0
+
+
+def _reconcile_inventory(args: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        result = reconcile_inventory(db, apply=not args.dry_run, branch_id=args.branch_id)
+
+    for item in result["drift"]:
+        print(f"book {item['book_id']}: available={item['stored']} expected={item['expected']}")
+    action = f"{result['fixed']} fixed" if result["applied"] else "unchanged"
+    print(f"{result['drifted']} books drifted ({action}) in {result['duration_ms']} ms (scan {result['scan_ms']} ms)")
+    return 1 if result["drifted"] else 0
+
+
+def _rollup_analytics(args: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        processed = refresh_daily_rollups(db, since=args.since)
+    print(f"{processed} days rolled up")
+    return 0
+
+
+def _build_related(args: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        result = build_related(db, full=args.full)
+    print(f"{result['mode']}: {result['books_updated']} books updated (through loan {result['through_loan_id']})")
+    return 0
+
+
+def _purge_history(args: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        if args.dry_run:
+            estimate = estimate_purge(db, args.months)
+            print(
+                f"{estimate['rows']} of {estimate['total_rows']} rows before {estimate['cutoff']:%Y-%m-%d} "
+                f"({estimate['loans']} loans, ~{estimate['estimated_bytes'] // 1024} KiB)"
+            )
+            return 0
+        result = purge_history(db, args.months)
+    print(f"{result['purged']} rows compacted before {result['cutoff']}, "
+          f"{len(result['partitions_dropped'])} partitions dropped")
+    return 0
+
+
+def _run_job(args: argparse.Namespace) -> int:
+    _, fn = SCHEDULE[args.name]
+    run = record_run(args.name, fn)
+    print(f"{run.job_name} #{run.id}: {run.status} in {run.duration_ms} ms ({run.rows_affected} rows)")
+    return 0 if run.status == "succeeded" else 1
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reconcile = commands.add_parser(
+        "reconcile-stats",
+        help="Recalcula los contadores de /admin/stats e informa la deriva",
+    )
+    reconcile.add_argument("--dry-run", action="store_true", help="Solo informar, sin reescribir")
+    reconcile.set_defaults(handler=_reconcile_stats)
+
+    inventory = commands.add_parser(
+        "reconcile-inventory",
+        help="Recalcula available_copies desde los préstamos e informa la deriva",
+    )
+    inventory.add_argument("--dry-run", action="store_true", help="Solo informar, sin corregir")
+    inventory.add_argument("--branch-id", type=int, help="Solo los libros de esta sucursal")
+    inventory.set_defaults(handler=_reconcile_inventory)
+
+    rollup = commands.add_parser(
+        "rollup-analytics",
+        help="Precalcula los días cerrados de /admin/analytics",
+    )
+    rollup.add_argument(
+        "--since",
+        type=date.fromisoformat,
+        help="Recalcular desde este día (por defecto, solo los días que falten)",
+    )
+    rollup.set_defaults(handler=_rollup_analytics)
+
+    related = commands.add_parser(
+        "build-related",
+        help="Recalcula el índice de libros relacionados (incremental por defecto)",
+    )
+    related.add_argument("--full", action="store_true", help="Recalcular todo desde cero")
+    related.set_defaults(handler=_build_related)
+
+    purge = commands.add_parser(
+        "purge-history",
+        help="Compacta loan_status_history fuera de la retención en un resumen por préstamo",
+    )
+    purge.add_argument("--dry-run", action="store_true", help="Solo estimar filas y espacio")
+    purge.add_argument("--months", type=int, help="Meses completos a conservar (por defecto HISTORY_RETENTION_MONTHS)")
+    purge.set_defaults(handler=_purge_history)
+
+    job = commands.add_parser(
+        "run-job",
+        help="Ejecuta ahora una tarea del scheduler (queda en jobs)",
+    )
+    job.add_argument("name", choices=sorted(SCHEDULE))
+    job.set_defaults(handler=_run_job)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
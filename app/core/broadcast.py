@@ -0,0 +1,144 @@
+# app/core/broadcast.py
+import asyncio
+import threading
+from collections import defaultdict, deque
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+
+# Mensajes pendientes por suscriptor antes de empezar a descartar
+DEFAULT_QUEUE_SIZE = 64
+
+
+class Subscription:
+    """
+    Un suscriptor del hub: su propia cola acotada en su event loop.
+
+    Si el cliente no consume a tiempo y la cola se llena, los mensajes nuevos
+    se descartan (nunca se bloquea al publicador ni a los demás) y `dropped`
+    queda > 0 para que el consumidor pida una resincronización.
+
+    Es una cola mínima (deque + un future de espera) en lugar de
+    asyncio.Queue: con miles de suscriptores ociosos por worker, el tamaño
+    por suscriptor importa.
+    """
+
+    __slots__ = ("keys", "loop", "maxsize", "dropped", "_pending", "_waiter")
+
+    def __init__(self, keys: frozenset, maxsize: int, loop: asyncio.AbstractEventLoop) -> None:
+        self.keys = keys
+        self.loop = loop
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._pending: deque = deque()
+        self._waiter: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def push(self, message: Any) -> bool:
+        """Encola sin bloquear (desde el event loop). False si se descartó."""
+        if len(self._pending) >= self.maxsize:
+            self.dropped += 1
+            return False
+        self._pending.append(message)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        return True
+
+    async def get(self) -> Any:
+        while not self._pending:
+            self._waiter = self.loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._pending.popleft()
+
+    def get_nowait(self) -> Any:
+        return self._pending.popleft()
+
+    def clear(self) -> None:
+        self._pending.clear()
+
+    def take_dropped(self) -> int:
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class BroadcastHub:
+    """
+    Fan-out de mensajes por clave hacia suscriptores asyncio.
+
+    - subscribe()/unsubscribe(): desde el event loop (p. ej. un endpoint SSE).
+    - publish(): desde cualquier hilo (handlers del bus de invalidación,
+      threadpool de FastAPI). Agrupa los suscriptores por event loop y hace
+      un solo call_soon_threadsafe por loop, así el coste por suscriptor es
+      un put_nowait().
+    """
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE) -> None:
+        self._queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Dict[Hashable, Set[Subscription]] = defaultdict(set)
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(
+        self, keys: Iterable[Hashable], loop: Optional[asyncio.AbstractEventLoop] = None
+    ) -> Subscription:
+        """Alta desde el event loop, o desde otro hilo pasando el loop que consumirá."""
+        subscription = Subscription(frozenset(keys), self._queue_size, loop or asyncio.get_running_loop())
+        with self._lock:
+            for key in subscription.keys:
+                self._subscribers[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> List[Hashable]:
+        """Da de baja al suscriptor. Devuelve las claves que quedaron sin nadie."""
+        emptied = []
+        with self._lock:
+            for key in subscription.keys:
+                subscribers = self._subscribers.get(key)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[key]
+                    emptied.append(key)
+        return emptied
+
+    def has_subscribers(self, key: Hashable) -> bool:
+        return key in self._subscribers
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._subscribers)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+    def publish(self, key: Hashable, message: Any) -> int:
+        """Encola `message` para cada suscriptor de `key`. Devuelve cuántos había."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(key, ()))
+        if not subscribers:
+            return 0
+        self.published += 1
+
+        by_loop: Dict[asyncio.AbstractEventLoop, List[Subscription]] = defaultdict(list)
+        for subscription in subscribers:
+            by_loop[subscription.loop].append(subscription)
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, group, message)
+            except RuntimeError:
+                pass  # loop cerrado: sus suscriptores ya no existen
+        return len(subscribers)
+
+    def _deliver(self, subscriptions: List[Subscription], message: Any) -> None:
+        for subscription in subscriptions:
+            if subscription.push(message):
+                self.delivered += 1
+            else:
+                self.dropped += 1
@@ -0,0 +1,241 @@
+# app/core/cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, Optional
+
+from app.core.config import settings
+from app.core.responses import dumps
+
+
+class MemoryCacheBackend:
+    """
+    Backend en memoria (por worker) con expulsión LRU + TTL.
+
+    Los valores se guardan tal cual (sin serializar): quien los lee
+    no debe mutarlos.
+    """
+
+    name = "memory"
+    shared = False
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_version(self, scope: str) -> int:
+        return self._versions.get(scope, 0)
+
+    def bump_version(self, scope: str) -> int:
+        with self._lock:
+            version = self._versions.get(scope, 0) + 1
+            self._versions[scope] = version
+            return version
+
+    def size(self) -> Optional[int]:
+        return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+
+
+class RedisCacheBackend:
+    """
+    Backend compartido entre workers (Redis).
+
+    Las versiones viven en Redis (INCR), así que una invalidación en un worker
+    la ven todos: solo la aplica el worker que escribió, no el bus. El TTL se
+    aplica con EX; la expulsión LRU depende de la política del servidor
+    (maxmemory-policy allkeys-lru).
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, client: Any = None) -> None:
+        if client is None:
+            try:
+                import redis
+            except ImportError as exc:  # pragma: no cover - depende del entorno
+                raise RuntimeError("CACHE_BACKEND=redis requiere el paquete 'redis'") from exc
+            client = redis.Redis.from_url(url)
+        self._client = client
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._client.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        self._client.set(key, dumps(value), ex=ttl)
+
+    def get_version(self, scope: str) -> int:
+        raw = self._client.get(f"lms:ver:{scope}")
+        return int(raw) if raw is not None else 0
+
+    def bump_version(self, scope: str) -> int:
+        return int(self._client.incr(f"lms:ver:{scope}"))
+
+    def size(self) -> Optional[int]:
+        return None
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter("lms:*"):
+            self._client.delete(key)
+
+
+class NullCacheBackend:
+    """Caché desactivada (CACHE_BACKEND=none): todo es miss."""
+
+    name = "none"
+    shared = False
+    evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        return None
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        return None
+
+    def get_version(self, scope: str) -> int:
+        return 0
+
+    def bump_version(self, scope: str) -> int:
+        return 0
+
+    def size(self) -> Optional[int]:
+        return 0
+
+    def clear(self) -> None:
+        return None
+
+
+class ResponseCache:
+    """
+    Caché de respuestas versionada.
+
+    Cada entrada pertenece a un `scope` con un contador de versión
+    (p. ej. "book:42" o "books_list"). Invalidar = incrementar la versión:
+    las entradas viejas quedan inalcanzables y expiran por TTL/LRU.
+
+    lookup() devuelve la versión leída; store() debe recibir esa misma versión
+    para que un resultado calculado antes de una escritura nunca se guarde
+    bajo la versión nueva.
+    """
+
+    def __init__(self, backend: Any, ttl_seconds: int) -> None:
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+        )
+
+    @staticmethod
+    def _full_key(namespace: str, scope: str, version: int, key: Hashable) -> str:
+        if not isinstance(key, (str, int)):
+            key = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest()
+        return f"lms:{namespace}:{scope}:v{version}:{key}"
+
+    def _count(self, namespace: str, counter: str) -> None:
+        with self._lock:
+            self._stats[namespace][counter] += 1
+
+    def lookup(
+        self,
+        namespace: str,
+        key: Hashable,
+        scope: Optional[str] = None,
+    ) -> tuple[Optional[Any], int]:
+        scope = scope or namespace
+        version = self.backend.get_version(scope)
+        value = self.backend.get(self._full_key(namespace, scope, version, key))
+        self._count(namespace, "hits" if value is not None else "misses")
+        return value, version
+
+    def store(
+        self,
+        namespace: str,
+        key: Hashable,
+        version: int,
+        value: Any,
+        scope: Optional[str] = None,
+    ) -> None:
+        scope = scope or namespace
+        self.backend.set(self._full_key(namespace, scope, version, key), value, self.ttl_seconds)
+        self._count(namespace, "stores")
+
+    def invalidate(self, scope: str) -> None:
+        self.backend.bump_version(scope)
+        self._count(scope.split(":", 1)[0], "invalidations")
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            snapshot = {ns: dict(counters) for ns, counters in self._stats.items()}
+
+        result = []
+        for namespace, counters in sorted(snapshot.items()):
+            lookups = counters["hits"] + counters["misses"]
+            result.append(
+                {
+                    "namespace": namespace,
+                    **counters,
+                    "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+                }
+            )
+        return result
+
+    def clear(self) -> None:
+        self.backend.clear()
+        with self._lock:
+            self._stats.clear()
+
+    def reset_local(self) -> None:
+        """
+        Descarta lo que este worker pudo perder (p. ej. avisos de invalidación
+        durante una reconexión). Solo aplica al backend en memoria: en Redis
+        las versiones ya son compartidas.
+        """
+        if not self.backend.shared:
+            self.backend.clear()
+
+
+def build_cache_backend() -> Any:
+    backend = settings.CACHE_BACKEND.lower()
+    if backend == "redis":
+        if not settings.REDIS_URL:
+            raise RuntimeError("CACHE_BACKEND=redis requiere REDIS_URL")
+        return RedisCacheBackend(settings.REDIS_URL)
+    if backend == "none":
+        return NullCacheBackend()
+    return MemoryCacheBackend(max_entries=settings.CACHE_MAX_ENTRIES)
+
+
+response_cache = ResponseCache(build_cache_backend(), ttl_seconds=settings.CACHE_TTL_SECONDS)
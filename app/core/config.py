@@ -7,6 +7,42 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = "INFO"
     SLOW_REQUEST_THRESHOLD_MS: int = 1000  # 1 segundo
 
+    # Caché de respuestas del catálogo
+    CACHE_BACKEND: str = "memory"  # "memory" (por worker), "redis" (compartida) o "none"
+    CACHE_TTL_SECONDS: int = 60
+    CACHE_MAX_ENTRIES: int = 10000
+    REDIS_URL: str | None = None
+
+    # Política de préstamos por defecto (las sucursales pueden fijar la suya)
+    LATE_FEE_PER_DAY: float = 1.0
+    LOAN_DAYS: int = 14
+    MAX_ACTIVE_LOANS: int = 5
+
+    # Préstamos cerrados más antiguos que esto pasan a loans_archive
+    LOAN_ARCHIVE_AFTER_DAYS: int = 365
+    # Meses completos de loan_status_history que se conservan (lo anterior se compacta)
+    HISTORY_RETENTION_MONTHS: int = 24
+    HISTORY_PURGE_CHUNK_SIZE: int = 5000
+    HISTORY_PURGE_PAUSE_SECONDS: float = 0.5  # entre chunks: réplicas y locks
+    # DROP de particiones vacías: lock ACCESS EXCLUSIVE sobre el padre; si no
+    # lo consigue en este tiempo, se reintenta en vez de hacer cola
+    HISTORY_DROP_LOCK_TIMEOUT_MS: int = 2000
+
+    # /changes: la marca de agua se queda este margen por detrás de la
+    # transacción en curso más antigua (lo que cae dentro se reenvía)
+    SYNC_SAFETY_LAG_SECONDS: float = 2.0
+
+    # Scheduler de tareas de mantenimiento (un líder entre workers)
+    SCHEDULER_ENABLED: bool = True
+
+    # Tareas en segundo plano lanzadas desde la API (202 + polling)
+    JOB_WORKERS: int = 2
+    JOB_MAX_PENDING: int = 20  # por worker; por encima, 503
+    # Latido de las tareas en queued / running; sin latido durante
+    # JOB_STALE_SECONDS se consideran huérfanas (worker muerto)
+    JOB_HEARTBEAT_SECONDS: float = 15.0
+    JOB_STALE_SECONDS: float = 120.0
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,184 @@
+# app/core/invalidation.py
+import select
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.logging import get_logger
+
+CHANNEL = "library_invalidate"
+WILDCARD = "*"
+
+logger = get_logger("core.invalidation")
+
+# entity -> (handler(entity_id | None), solo_local); None significa "todo lo de esa entidad"
+_handlers: Dict[str, List[Tuple[Callable[[Optional[int]], None], bool]]] = defaultdict(list)
+
+
+def register_handler(entity: str, handler: Callable[[Optional[int]], None], local_only: bool = False) -> None:
+    """
+    Registra un callback que evicta la caché local de `entity`.
+
+    Con local_only=True solo se llama en el worker que hizo la escritura
+    (tras su commit), no al llegar el NOTIFY: para estado compartido entre
+    workers (p. ej. versiones en Redis), que basta con tocar una vez.
+    """
+    _handlers[entity].append((handler, local_only))
+
+
+def dispatch(payload: str, local: bool = False) -> None:
+    """
+    Aplica una invalidación '<entity>:<id>' en este worker.
+    '*' (tras una reconexión del listener) invalida todas las entidades.
+    local=True: viene del commit de este worker, no del listener.
+    """
+    entity, _, raw_id = payload.partition(":")
+    entity_id = int(raw_id) if raw_id.isdigit() else None
+
+    if entity == WILDCARD:
+        targets = [(name, None) for name in list(_handlers)]
+    else:
+        targets = [(entity, entity_id)]
+
+    for name, target_id in targets:
+        for handler, local_only in list(_handlers.get(name, ())):
+            if local_only and not local:
+                continue
+            try:
+                handler(target_id)
+            except Exception:
+                logger.exception(
+                    "invalidation_handler_failed",
+                    extra={"operation": "cache_invalidate", "resource": name},
+                )
+
+
+def publish(db: Session, entity: str, entity_id: Optional[int] = None) -> None:
+    """
+    Publica una invalidación dentro de la transacción actual.
+
+    - En PostgreSQL emite NOTIFY library_invalidate, que el servidor solo
+      entrega si la transacción hace commit (y nunca si hace rollback).
+    - En este worker se aplica de inmediato después del commit, sin esperar
+      la vuelta del NOTIFY.
+
+    Llamar ANTES de db.commit().
+    """
+    payload = f"{entity}:{entity_id}" if entity_id is not None else entity
+    db.info.setdefault("pending_invalidations", []).append(payload)
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": CHANNEL, "payload": payload},
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_local_invalidations(session: Session) -> None:
+    pending = session.info.pop("pending_invalidations", None)
+    if pending:
+        for payload in pending:
+            dispatch(payload, local=True)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_local_invalidations(session: Session, transaction) -> None:
+    # Rollback / close sin commit: las invalidaciones pendientes se descartan
+    if transaction.parent is None:
+        session.info.pop("pending_invalidations", None)
+
+
+class InvalidationListener(threading.Thread):
+    """
+    Hilo de fondo (uno por worker) que escucha LISTEN library_invalidate y
+    aplica cada payload con `on_payload` (dispatch por defecto).
+
+    Usa una conexión dedicada, fuera del pool. Si la conexión se cae,
+    reintenta y, al reconectar, invalida todo ('*') porque pudo perder avisos.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        channel: str = CHANNEL,
+        on_payload: Callable[[str], None] = dispatch,
+        poll_interval: float = 1.0,
+    ) -> None:
+        super().__init__(name="invalidation-listener", daemon=True)
+        self._engine = engine
+        self._channel = channel
+        self._on_payload = on_payload
+        self._poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self.ready = threading.Event()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def _connect(self):
+        raw = self._engine.raw_connection()
+        conn = raw.driver_connection
+        raw.detach()  # conexión exclusiva: no vuelve al pool
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self._channel}"')
+        return conn
+
+    def _drain(self, conn) -> None:
+        if hasattr(conn, "poll"):
+            # psycopg2
+            ready, _, _ = select.select([conn], [], [], self._poll_interval)
+            if not ready:
+                return
+            conn.poll()
+            while conn.notifies:
+                self._on_payload(conn.notifies.pop(0).payload)
+        else:
+            # psycopg 3
+            for notify in conn.notifies(timeout=self._poll_interval, stop_after=100):
+                self._on_payload(notify.payload)
+
+    def run(self) -> None:
+        backoff = 0.5
+        first_connection = True
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                if not first_connection:
+                    self._on_payload(WILDCARD)
+                first_connection = False
+                backoff = 0.5
+                self.ready.set()
+                while not self._stop_event.is_set():
+                    self._drain(conn)
+            except Exception:
+                self.ready.clear()
+                logger.warning(
+                    "invalidation_listener_disconnected",
+                    extra={"operation": "cache_invalidate", "resource": self._channel},
+                    exc_info=True,
+                )
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+def start_listener(engine: Engine) -> Optional[InvalidationListener]:
+    """Arranca el listener del worker (solo PostgreSQL tiene LISTEN/NOTIFY)."""
+    if engine.dialect.name != "postgresql":
+        return None
+    listener = InvalidationListener(engine)
+    listener.start()
+    return listener
@@ -0,0 +1,349 @@
+# app/core/jobs.py
+"""
+Tareas en segundo plano persistidas en la tabla jobs.
+
+- Una tarea es una función fn(db) registrada con un nombre (register_job).
+  Devuelve las filas afectadas (int), un dict de resultado (con
+  "rows_affected" opcional) o None.
+- record_run() la ejecuta en el hilo actual (scheduler, CLI);
+  job_executor.submit() la encola en un pool acotado del worker y vuelve en
+  seguida: los endpoints responden 202 con el id y el cliente consulta
+  GET /admin/jobs/{id}.
+- Progreso y cancelación son cooperativos: la tarea llama a
+  report_progress() y check_canceled() entre lotes (usan current_run_id).
+- Mientras una tarea está en queued / running, su worker renueva
+  heartbeat_at. reap_stale_jobs() (al arrancar y en el scheduler) marca
+  interrupted las running sin latido y vuelve a encolar las queued que
+  quedaron sin dueño (worker apagado o muerto).
+"""
+import contextvars
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Union
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.models import JobRun, User
+from app.db.session import SessionLocal
+
+logger = get_logger("core.jobs")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+JobResult = Union[int, dict, None]
+JobFn = Callable[[Session], JobResult]
+
+# jobs.id de la ejecución en curso (checkpoints, progreso, cancelación)
+current_run_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("current_run_id", default=None)
+
+_registry: dict[str, JobFn] = {}
+
+
+class JobCanceled(Exception):
+    """La tarea vio cancel_requested y se detuvo (su trabajo hecho se conserva)."""
+
+
+class JobSkipped(Exception):
+    """La tarea no llegó a hacer nada (p. ej. otra ejecución tiene su lock)."""
+
+
+def register_job(name: str, fn: JobFn) -> None:
+    _registry[name] = fn
+
+
+# ======================
+# Dentro de una tarea
+# ======================
+
+def report_progress(fraction: float) -> None:
+    run_id = current_run_id.get()
+    if run_id is None:
+        return
+    with SessionLocal() as db:
+        db.execute(update(JobRun).where(JobRun.id == run_id).values(progress=min(max(fraction, 0.0), 1.0)))
+        db.commit()
+
+
+def cancel_requested() -> bool:
+    run_id = current_run_id.get()
+    if run_id is None:
+        return False
+    with SessionLocal() as db:
+        return bool(db.execute(select(JobRun.cancel_requested).where(JobRun.id == run_id)).scalar())
+
+
+def check_canceled() -> None:
+    if cancel_requested():
+        raise JobCanceled()
+
+
+# ======================
+# Latido
+# ======================
+
+class _Heartbeat:
+    """Hilo que renueva heartbeat_at de las tareas queued / running de este worker."""
+
+    def __init__(self) -> None:
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="jobs-heartbeat", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(settings.JOB_HEARTBEAT_SECONDS)
+            try:
+                with SessionLocal() as db:
+                    db.execute(
+                        update(JobRun)
+                        .where(JobRun.worker == WORKER_ID, JobRun.status.in_(("queued", "running")))
+                        .values(heartbeat_at=func.now())
+                    )
+                    db.commit()
+            except Exception:
+                logger.warning("job_heartbeat_failed", extra={"operation": "jobs"}, exc_info=True)
+
+
+_heartbeat = _Heartbeat()
+
+
+# ======================
+# Ejecución
+# ======================
+
+def _execute(run_id: int, name: str, fn: JobFn) -> JobRun:
+    _heartbeat.ensure_started()
+    started = time.perf_counter()
+    final_status, rows, result, error = "succeeded", None, None, None
+    token = current_run_id.set(run_id)
+    try:
+        with SessionLocal() as db:
+            outcome = fn(db)
+        if isinstance(outcome, dict):
+            result, rows = outcome, outcome.get("rows_affected")
+        else:
+            rows = outcome
+    except JobCanceled:
+        final_status = "canceled"
+        logger.info("job_canceled", extra={"operation": "jobs", "resource": name})
+    except JobSkipped as exc:
+        final_status, result = "skipped", {"reason": str(exc)}
+        logger.info("job_skipped", extra={"operation": "jobs", "resource": name})
+    except Exception:
+        final_status, error = "failed", traceback.format_exc(limit=5)
+        logger.exception("job_failed", extra={"operation": "jobs", "resource": name})
+    finally:
+        current_run_id.reset(token)
+
+    with SessionLocal() as db:
+        run = db.get(JobRun, run_id)
+        run.status = final_status
+        run.rows_affected = rows
+        run.result = result
+        run.error = error
+        if final_status == "succeeded":
+            run.progress = 1.0
+        run.finished_at = datetime.now(timezone.utc)
+        run.duration_ms = int((time.perf_counter() - started) * 1000)
+        db.commit()
+        db.refresh(run)
+        return run
+
+
+def record_run(name: str, fn: JobFn) -> JobRun:
+    """Ejecuta `fn` en este hilo, en su propia sesión, y la deja en jobs."""
+    with SessionLocal() as db:
+        run = JobRun(
+            job_name=name, status="running", worker=WORKER_ID, started_at=func.now(), heartbeat_at=func.now()
+        )
+        db.add(run)
+        db.commit()
+        run_id = run.id
+    return _execute(run_id, name, fn)
+
+
+def run_queued(run_id: int) -> Optional[JobRun]:
+    """Ejecuta una tarea encolada, salvo que ya no esté en queued (cancelada)."""
+    with SessionLocal() as db:
+        name = db.execute(
+            update(JobRun)
+            .where(JobRun.id == run_id, JobRun.status == "queued")
+            .values(status="running", started_at=func.now(), worker=WORKER_ID, heartbeat_at=func.now())
+            .returning(JobRun.job_name)
+        ).scalar()
+        db.commit()
+    if name is None:
+        return None
+    return _execute(run_id, name, _registry[name])
+
+
+def request_cancel(db: Session, run: JobRun) -> bool:
+    """
+    Cancela una tarea: si sigue en cola no llega a ejecutarse; si está en
+    marcha se le pide que pare en el siguiente punto de control. False si ya
+    había terminado.
+    """
+    if run.status == "queued":
+        run.status = "canceled"
+        run.finished_at = datetime.now(timezone.utc)
+    elif run.status == "running":
+        run.cancel_requested = True
+    else:
+        return False
+    db.commit()
+    db.refresh(run)
+    return True
+
+
+def reap_stale_jobs(db: Session, startup: bool = False) -> dict:
+    """
+    Cierra las tareas que ningún worker va a terminar:
+
+    - running sin latido en JOB_STALE_SECONDS: interrupted (las que van por
+      chunks, como overdue, retoman su trabajo en la siguiente ejecución).
+    - queued sin latido o sin dueño (el worker se apagó con ellas en cola):
+      este worker las adopta y las vuelve a encolar; failed si la tarea ya
+      no está registrada.
+
+    Con startup=True, además, todo lo que figure a nombre de este WORKER_ID
+    es de un proceso anterior con el mismo host:pid (contenedor reiniciado).
+    """
+    stale_before = func.now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    orphaned = func.coalesce(JobRun.heartbeat_at, JobRun.started_at, JobRun.created_at) < stale_before
+    if startup:
+        orphaned = or_(orphaned, JobRun.worker == WORKER_ID)
+
+    interrupted = db.execute(
+        update(JobRun)
+        .where(JobRun.status == "running", orphaned)
+        .values(status="interrupted", finished_at=func.now(), error="Worker stopped without finishing the job")
+        .returning(JobRun.id)
+    ).scalars().all()
+    adopted = db.execute(
+        update(JobRun)
+        .where(JobRun.status == "queued", or_(orphaned, JobRun.worker.is_(None)))
+        .values(worker=WORKER_ID, heartbeat_at=func.now())
+        .returning(JobRun.id, JobRun.job_name)
+    ).all()
+    unknown = [run_id for run_id, name in adopted if name not in _registry]
+    if unknown:
+        db.execute(
+            update(JobRun)
+            .where(JobRun.id.in_(unknown))
+            .values(status="failed", finished_at=func.now(), error="Job is no longer registered")
+        )
+    db.commit()
+
+    requeued = [run_id for run_id, name in adopted if name in _registry]
+    for run_id in requeued:
+        job_executor.enqueue(run_id)
+    if interrupted or adopted:
+        logger.warning(
+            "jobs_reaped",
+            extra={"operation": "jobs", "interrupted": interrupted, "requeued": requeued, "failed": unknown},
+        )
+    return {
+        "rows_affected": len(interrupted) + len(adopted),
+        "interrupted": interrupted,
+        "requeued": requeued,
+        "failed": unknown,
+    }
+
+
+class JobExecutor:
+    """Pool acotado (por worker) para las tareas lanzadas desde la API."""
+
+    def __init__(self, max_workers: int, max_pending: int) -> None:
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _done(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, db: Session, name: str, requested_by: Optional[User] = None) -> JobRun:
+        """Crea la fila (queued) y la encola; la tarea empieza en cuanto haya hilo libre."""
+        if name not in _registry:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown job {name!r}")
+        with self._lock:
+            if self._pending >= self._max_pending:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many pending jobs, try again later",
+                    headers={"Retry-After": "30"},
+                )
+            self._pending += 1
+
+        try:
+            run = JobRun(
+                job_name=name,
+                status="queued",
+                worker=WORKER_ID,
+                heartbeat_at=func.now(),
+                requested_by_user_id=requested_by.id if requested_by is not None else None,
+            )
+            db.add(run)
+            db.commit()
+            db.refresh(run)
+        except Exception:
+            self._done(None)
+            raise
+        self._submit(run.id)
+        return run
+
+    def enqueue(self, run_id: int) -> None:
+        """Encola una fila queued ya existente (adoptada por reap_stale_jobs), sin tope."""
+        with self._lock:
+            self._pending += 1
+        self._submit(run_id)
+
+    def _submit(self, run_id: int) -> None:
+        _heartbeat.ensure_started()
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="jobs")
+            pool = self._pool
+        pool.submit(run_queued, run_id).add_done_callback(self._done)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        pool.shutdown(wait=False, cancel_futures=True)
+        # Las que no llegaron a empezar quedan sin dueño: el siguiente
+        # reap_stale_jobs de otro worker (o de este al volver) las retoma
+        try:
+            with SessionLocal() as db:
+                db.execute(
+                    update(JobRun)
+                    .where(JobRun.worker == WORKER_ID, JobRun.status == "queued")
+                    .values(worker=None, heartbeat_at=None)
+                )
+                db.commit()
+        except Exception:
+            logger.warning("job_release_failed", extra={"operation": "jobs"}, exc_info=True)
+
+
+job_executor = JobExecutor(max_workers=settings.JOB_WORKERS, max_pending=settings.JOB_MAX_PENDING)
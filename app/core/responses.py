@@ -0,0 +1,89 @@
+# app/core/responses.py
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.engine import Row, RowMapping
+
+try:  # orjson es opcional: si no está instalado usamos el encoder stdlib
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+def _encode_decimal(value: Decimal) -> int | float:
+    # Igual que jsonable_encoder: enteros si no hay parte decimal, float si la hay
+    if value.as_tuple().exponent >= 0:
+        return int(value)
+    return float(value)
+
+
+def _default(obj: Any) -> Any:
+    """
+    Convierte los tipos que el encoder no sabe serializar por sí mismo.
+
+    Mantiene exactamente el formato que producía jsonable_encoder:
+    - Modelos Pydantic -> model_dump(mode="json") (fechas ISO con "Z", enums por valor)
+    - Filas / mappings de SQLAlchemy -> dict
+    - Decimal (late_fee_amount) -> int / float
+    """
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, RowMapping):
+        return dict(obj)
+    if isinstance(obj, Row):
+        return dict(obj._mapping)
+    if isinstance(obj, Decimal):
+        return _encode_decimal(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# Encoder stdlib construido una sola vez: json.dumps() con argumentos no
+# estándar crea un JSONEncoder nuevo en cada llamada.
+_stdlib_encoder = json.JSONEncoder(
+    ensure_ascii=False,
+    allow_nan=False,
+    indent=None,
+    separators=(",", ":"),
+    default=_default,
+)
+
+
+def _stdlib_dumps(content: Any) -> bytes:
+    return _stdlib_encoder.encode(content).encode("utf-8")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+else:  # pragma: no cover - depende del entorno
+    dumps = _stdlib_dumps
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Respuesta JSON por defecto de la API.
+
+    Usa orjson cuando está instalado y el encoder stdlib precompilado en otro
+    caso. Acepta directamente modelos Pydantic, listas de modelos y filas de
+    SQLAlchemy, así que los endpoints pueden devolverla sin pasar por
+    jsonable_encoder.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
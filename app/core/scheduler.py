@@ -0,0 +1,212 @@
+# app/core/scheduler.py
+"""
+Scheduler en proceso para tareas de mantenimiento.
+
+- Cada worker arranca un Scheduler (tarea asyncio) en el startup, pero solo
+  el líder ejecuta tareas: el que consigue pg_try_advisory_lock(LEADER_LOCK)
+  en una conexión dedicada. El lock es de sesión, así que si el líder muere
+  o pierde la conexión, otro worker lo toma en el siguiente tick.
+- Las tareas tienen horarios tipo cron (5 campos, UTC) y corren en un
+  ThreadPoolExecutor propio, nunca en el event loop ni en el threadpool de
+  las peticiones.
+- Cada ejecución queda en jobs (app.core.jobs: duración, filas, error).
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.engine import Engine
+
+from app.core.jobs import WORKER_ID, JobFn, record_run
+from app.core.logging import get_logger
+
+logger = get_logger("core.scheduler")
+
+# Clave del advisory lock de liderazgo (arbitraria, única en la app)
+LEADER_LOCK = 0x4C1B5C0E
+
+
+# ======================
+# Horarios tipo cron
+# ======================
+
+_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 6),  # 0 = domingo
+)
+
+
+def _parse_field(raw: str, low: int, high: int) -> frozenset:
+    values = set()
+    for part in raw.split(","):
+        base, _, step_raw = part.partition("/")
+        step = int(step_raw) if step_raw else 1
+        if step < 1:
+            raise ValueError(f"Invalid step in {part!r}")
+        if base == "*":
+            start, end = low, high
+        elif "-" in base:
+            start, end = (int(v) for v in base.split("-", 1))
+        else:
+            start = int(base)
+            end = high if step_raw else start
+        if not (low <= start <= end <= high):
+            raise ValueError(f"{part!r} out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """Expresión cron de 5 campos: minuto hora día mes día_semana (UTC)."""
+
+    def __init__(self, expression: str) -> None:
+        parts = expression.split()
+        if len(parts) != len(_FIELDS):
+            raise ValueError(f"Cron expression needs {len(_FIELDS)} fields: {expression!r}")
+        self.expression = expression
+        self._values = {
+            name: _parse_field(raw, low, high) for raw, (name, low, high) in zip(parts, _FIELDS)
+        }
+        # Como en cron: si día y día_semana están restringidos, basta con uno
+        self._day_restricted = parts[2] != "*"
+        self._weekday_restricted = parts[4] != "*"
+
+    def matches(self, at: datetime) -> bool:
+        v = self._values
+        if at.minute not in v["minute"] or at.hour not in v["hour"] or at.month not in v["month"]:
+            return False
+        day_ok = at.day in v["day"]
+        weekday_ok = (at.isoweekday() % 7) in v["weekday"]
+        if self._day_restricted and self._weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+
+# ======================
+# Tareas
+# ======================
+
+@dataclass
+class ScheduledJob:
+    name: str
+    schedule: CronSchedule
+    # fn(db) -> filas afectadas, dict de resultado o None
+    fn: JobFn
+    running: bool = field(default=False)
+
+
+class Scheduler:
+    def __init__(self, engine: Engine, max_workers: int = 2, tick_seconds: float = 60.0) -> None:
+        self._engine = engine
+        self._jobs: dict[str, ScheduledJob] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scheduler")
+        self._tick_seconds = tick_seconds
+        self._leader_conn = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_conn is not None
+
+    def add_job(self, name: str, cron: str, fn: JobFn) -> None:
+        self._jobs[name] = ScheduledJob(name, CronSchedule(cron), fn)
+
+    @property
+    def jobs(self) -> list[ScheduledJob]:
+        return list(self._jobs.values())
+
+    # --- liderazgo ---
+
+    def _release_leadership(self) -> None:
+        conn, self._leader_conn = self._leader_conn, None
+        if conn is not None:
+            try:
+                # Cerrar la sesión también lo libera, pero el servidor lo hace
+                # de forma asíncrona: otro worker podría no verlo libre aún
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (LEADER_LOCK,))
+            except Exception:
+                pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def try_acquire_leadership(self) -> bool:
+        """Bloqueante: usar fuera del event loop."""
+        if self._leader_conn is not None:
+            try:
+                with self._leader_conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                return True
+            except Exception:
+                logger.warning("scheduler_leader_connection_lost", extra={"operation": "scheduler"})
+                self._release_leadership()
+
+        raw = self._engine.raw_connection()
+        conn = raw.driver_connection
+        raw.detach()  # conexión exclusiva: el lock vive lo que viva ella
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (LEADER_LOCK,))
+            acquired = cursor.fetchone()[0]
+        if not acquired:
+            conn.close()
+            return False
+        self._leader_conn = conn
+        logger.info("scheduler_leader_elected", extra={"operation": "scheduler", "resource": WORKER_ID})
+        return True
+
+    # --- ejecución ---
+
+    def _run_job(self, job: ScheduledJob) -> None:
+        try:
+            record_run(job.name, job.fn)
+        finally:
+            job.running = False
+
+    def due_jobs(self, at: datetime) -> list[ScheduledJob]:
+        return [job for job in self._jobs.values() if job.schedule.matches(at) and not job.running]
+
+    def run_now(self, name: str):
+        """Encola una tarea en el executor del scheduler (sin esperar al horario)."""
+        job = self._jobs[name]
+        job.running = True
+        return self._executor.submit(self._run_job, job)
+
+    async def tick(self, at: datetime) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            leader = await loop.run_in_executor(None, self.try_acquire_leadership)
+        except Exception:
+            logger.warning("scheduler_leader_check_failed", extra={"operation": "scheduler"}, exc_info=True)
+            return
+        if not leader:
+            return
+        for job in self.due_jobs(at):
+            self.run_now(job.name)
+
+    async def run(self) -> None:
+        while True:
+            now = time.time()
+            # Despierta al inicio de cada minuto
+            await asyncio.sleep(self._tick_seconds - now % self._tick_seconds)
+            await self.tick(datetime.now(timezone.utc).replace(second=0, microsecond=0))
+
+    def start(self) -> None:
+        if self._engine.dialect.name != "postgresql":
+            return  # sin advisory locks no hay elección de líder
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._release_leadership()
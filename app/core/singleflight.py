@@ -0,0 +1,136 @@
+# app/core/singleflight.py
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Mapping, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Todos los grupos creados, para exponer sus contadores en /admin
+_groups: Dict[str, "SingleFlight"] = {}
+
+
+def make_key(route: str, params: Mapping[str, Any], scope: str) -> tuple:
+    """
+    Clave normalizada de una lectura: ruta + parámetros ordenados + alcance
+    de visibilidad del rol. Los parámetros None se descartan para que
+    `?title=` y la ausencia del parámetro coalescan juntos.
+    """
+    normalized = tuple(
+        sorted((name, value) for name, value in params.items() if value is not None)
+    )
+    return (route, normalized, scope)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce lecturas idénticas concurrentes.
+
+    La primera petición con una clave ejecuta la consulta; las que llegan
+    mientras está en vuelo esperan y reciben el mismo resultado (o la misma
+    excepción). No es una caché: en cuanto termina la llamada, la siguiente
+    petición vuelve a ejecutar.
+
+    - do(): handlers sync (threadpool de FastAPI)
+    - do_async(): handlers async (mismo event loop)
+
+    El resultado se comparte entre peticiones, así que debe ser inmutable o
+    tratarse como tal (p. ej. modelos Pydantic ya validados, no objetos ORM).
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.requests = 0
+        self.executions = 0
+        self.coalesced = 0
+        _groups[name] = self
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        with self._lock:
+            self.requests += 1
+            future = self._async_calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = asyncio.get_running_loop().create_future()
+                self._async_calls[key] = future
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            # shield: cancelar a un seguidor no debe cancelar la llamada compartida
+            return await asyncio.shield(future)
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Evita el warning "exception was never retrieved" si nadie esperaba
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._async_calls.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "requests": self.requests,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._async_calls),
+            }
+
+
+def singleflight_stats() -> list[dict]:
+    """Contadores de todos los grupos registrados."""
+    return [group.stats() for group in _groups.values()]
@@ -1,22 +1,28 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from enum import Enum
 
 from sqlalchemy import (
     Boolean,
+    BigInteger,
     Column,
+    Date,
     DateTime,
     Enum as SqlEnum,
+    Float,
     ForeignKey,
+    Index,
     Integer,
+    JSON,
     String,
     Text,
     UniqueConstraint,
     Numeric,
+    SmallInteger,
 )
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from app.db.session import Base
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 
 # ======================
@@ -29,6 +35,12 @@ class UserRole(str, Enum):
     ADMIN = "admin"
 
 
+class HoldStatus(str, Enum):
+    WAITING = "WAITING"        # en la cola del libro
+    FULFILLED = "FULFILLED"    # recibió una copia (préstamo APPROVED creado)
+    CANCELED = "CANCELED"
+
+
 class LoanStatus(str, Enum):
     REQUESTED = "REQUESTED"
     CANCELED = "CANCELED"
@@ -52,11 +64,21 @@ class User(Base):
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
     full_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
 
-    role: Mapped[UserRole] = mapped_column(SqlEnum(UserRole), nullable=False, default=UserRole.MEMBER)
+    # active_history: los contadores de stats necesitan el valor anterior al cambiar
+    role: Mapped[UserRole] = mapped_column(
+        SqlEnum(UserRole), nullable=False, default=UserRole.MEMBER, active_history=True
+    )
 
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     is_blocked: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
+    # Préstamos REQUESTED/APPROVED/BORROWED/OVERDUE del miembro: lo mantienen
+    # create_loan_request (UPDATE condicional con el límite), release_copy y
+    # change_loan_status, en la misma transacción que el préstamo
+    active_loan_count: Mapped[int] = mapped_column(
+        Integer, default=0, server_default=text("0"), nullable=False
+    )
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -69,7 +91,9 @@ class User(Base):
         nullable=False,
     )
 
-    loans: Mapped[list["Loan"]] = relationship("Loan", back_populates="member")
+    loans: Mapped[list["Loan"]] = relationship(
+        "Loan", back_populates="member", foreign_keys="Loan.member_id"
+    )
 
 
 # ======================
@@ -88,6 +112,13 @@ class LibraryBranch(Base):
 
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
 
+    # Política de préstamos propia de la sucursal (None = valor de settings)
+    late_fee_per_day: Mapped[Numeric | None] = mapped_column(Numeric(10, 2), nullable=True)
+    loan_days: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Tope de préstamos activos del miembro en todas las sucursales, aplicado
+    # a los préstamos que se piden en esta
+    max_active_loans: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -112,6 +143,8 @@ class Book(Base):
     __tablename__ = "books"
     __table_args__ = (
         UniqueConstraint("isbn", name="uq_books_isbn"),
+        # Keyset de sincronización incremental (/books/changes)
+        Index("ix_books_updated_at_id", "updated_at", "id"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
@@ -122,8 +155,8 @@ class Book(Base):
     genre: Mapped[str | None] = mapped_column(String(100), nullable=True)
     publication_year: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
-    total_copies: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
-    available_copies: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    total_copies: Mapped[int] = mapped_column(Integer, nullable=False, default=1, active_history=True)
+    available_copies: Mapped[int] = mapped_column(Integer, nullable=False, default=1, active_history=True)
 
     branch_id: Mapped[int] = mapped_column(
         Integer,
@@ -153,6 +186,18 @@ class Book(Base):
 
 class Loan(Base):
     __tablename__ = "loans"
+    __table_args__ = (
+        # Keyset de sincronización incremental (/loans/changes)
+        Index("ix_loans_updated_at_id", "updated_at", "id"),
+        # Cola de trabajo de bibliotecarios (POST /loans/queue/claim)
+        Index(
+            "ix_loans_requested_queue",
+            "branch_id",
+            "created_at",
+            "id",
+            postgresql_where=text("status = 'REQUESTED'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
 
@@ -194,6 +239,7 @@ class Loan(Base):
         SqlEnum(LoanStatus),
         nullable=False,
         default=LoanStatus.REQUESTED,
+        active_history=True,
     )
 
     late_fee_amount: Mapped[Numeric | None] = mapped_column(
@@ -204,6 +250,14 @@ class Loan(Base):
 
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+    # Reclamo de la cola de trabajo: quién lo está atendiendo y hasta cuándo
+    claimed_by_user_id: Mapped[int | None] = mapped_column(
+        Integer,
+        ForeignKey("users.id", ondelete="SET NULL"),
+        nullable=True,
+    )
+    claim_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -216,13 +270,17 @@ class Loan(Base):
         nullable=False,
     )
 
-    member: Mapped["User"] = relationship("User", back_populates="loans")
+    member: Mapped["User"] = relationship("User", back_populates="loans", foreign_keys=[member_id])
     book: Mapped["Book"] = relationship("Book", back_populates="loans")
     branch: Mapped["LibraryBranch"] = relationship("LibraryBranch", back_populates="loans")
+    # Sin FK en la BD (el historial es particionado y sobrevive al archivado
+    # del préstamo): el ORM borra el historial junto con el préstamo
     history: Mapped[list["LoanStatusHistory"]] = relationship(
         "LoanStatusHistory",
+        primaryjoin="Loan.id == foreign(LoanStatusHistory.loan_id)",
         back_populates="loan",
         cascade="all, delete-orphan",
+        order_by="LoanStatusHistory.changed_at",
     )
 
 
@@ -231,15 +289,24 @@ class Loan(Base):
 # ======================
 
 class LoanStatusHistory(Base):
+    """
+    Particionada por rango de changed_at (una partición por mes, más una
+    DEFAULT; app.services.archival crea las de los meses siguientes). La
+    clave primaria incluye changed_at, como exige PostgreSQL.
+
+    loan_id apunta a loans o a loans_archive, así que no lleva FK.
+    """
     __tablename__ = "loan_status_history"
+    __table_args__ = (
+        # Rangos de fechas de /admin/analytics y de los rollups diarios
+        Index("ix_loan_status_history_changed_at", "changed_at"),
+        Index("ix_loan_status_history_loan_id", "loan_id"),
+        {"postgresql_partition_by": "RANGE (changed_at)"},
+    )
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
-    loan_id: Mapped[int] = mapped_column(
-        Integer,
-        ForeignKey("loans.id", ondelete="CASCADE"),
-        nullable=False,
-    )
+    loan_id: Mapped[int] = mapped_column(Integer, nullable=False)
 
     old_status: Mapped[LoanStatus | None] = mapped_column(
         SqlEnum(LoanStatus),
@@ -258,10 +325,379 @@ class LoanStatusHistory(Base):
 
     changed_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
+        primary_key=True,
         server_default=func.now(),
         nullable=False,
     )
 
     note: Mapped[str | None] = mapped_column(Text, nullable=True)
 
-    loan: Mapped["Loan"] = relationship("Loan", back_populates="history")
+    loan: Mapped["Loan"] = relationship(
+        "Loan",
+        primaryjoin="Loan.id == foreign(LoanStatusHistory.loan_id)",
+        back_populates="history",
+    )
+
+
+class LoanHistorySummary(Base):
+    """
+    Resumen por préstamo de las transiciones borradas por la retención de
+    loan_status_history (app.services.history_retention). Se acumula: cada
+    purga suma sus filas al resumen existente.
+    """
+    __tablename__ = "loan_history_summaries"
+
+    loan_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    transitions: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_changed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_changed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_status: Mapped[LoanStatus] = mapped_column(SqlEnum(LoanStatus), nullable=False)
+    # Primeras / últimas transiciones que usa la analítica (duración del préstamo)
+    borrowed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    returned_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    compacted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+
+# ======================
+# LoanArchive
+# ======================
+
+class LoanArchive(Base):
+    """
+    Préstamos cerrados (RETURNED / CANCELED) más antiguos que la ventana de
+    retención, movidos fuera de loans por el job archive-loans. Conservan su
+    id: el historial sigue en loan_status_history.
+    """
+    __tablename__ = "loans_archive"
+    __table_args__ = (
+        Index("ix_loans_archive_member_id", "member_id"),
+        Index("ix_loans_archive_branch_id", "branch_id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    member_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("users.id", name="loans_archive_member_id_fkey", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    book_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("books.id", name="loans_archive_book_id_fkey", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    branch_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("library_branches.id", name="loans_archive_branch_id_fkey", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    borrow_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    due_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    return_date: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    status: Mapped[LoanStatus] = mapped_column(SqlEnum(LoanStatus), nullable=False)
+    late_fee_amount: Mapped[Numeric | None] = mapped_column(Numeric(10, 2), nullable=True)
+    notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    book: Mapped["Book"] = relationship("Book", viewonly=True)
+    branch: Mapped["LibraryBranch"] = relationship("LibraryBranch", viewonly=True)
+    history: Mapped[list["LoanStatusHistory"]] = relationship(
+        "LoanStatusHistory",
+        primaryjoin="LoanArchive.id == foreign(LoanStatusHistory.loan_id)",
+        viewonly=True,
+        order_by="LoanStatusHistory.changed_at",
+    )
+
+
+# ======================
+# BookHold (cola de reservas)
+# ======================
+
+class BookHold(Base):
+    """
+    Reserva de un libro sin copias disponibles (cola FIFO por libro).
+
+    `position` (1..n) se guarda y se mantiene densa al atender o cancelar
+    reservas, así que consultar la posición en la cola es leer una fila.
+    """
+    __tablename__ = "book_holds"
+    __table_args__ = (
+        # Orden de llegada dentro de la cola de cada libro
+        Index("ix_book_holds_book_created", "book_id", "created_at"),
+        # Una sola reserva en espera por miembro y libro
+        Index(
+            "uq_book_holds_waiting_member_book",
+            "member_id",
+            "book_id",
+            unique=True,
+            postgresql_where=text("status = 'WAITING'"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+
+    book_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("books.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    member_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    branch_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("library_branches.id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+
+    status: Mapped[HoldStatus] = mapped_column(
+        SqlEnum(HoldStatus),
+        nullable=False,
+        default=HoldStatus.WAITING,
+    )
+    # Posición en la cola (1 = la siguiente copia es suya); NULL si ya no espera
+    position: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    # Préstamo creado al recibir la copia
+    loan_id: Mapped[int | None] = mapped_column(
+        Integer,
+        ForeignKey("loans.id", ondelete="SET NULL"),
+        nullable=True,
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    fulfilled_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+# ======================
+# SyncTombstone
+# ======================
+
+class SyncTombstone(Base):
+    """
+    Marca de borrado para la sincronización incremental (/changes).
+    Un cliente que ya tenía la fila la elimina al recibir su tombstone.
+    """
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (
+        Index("ix_sync_tombstones_entity_deleted_at_id", "entity", "deleted_at", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    entity: Mapped[str] = mapped_column(String(50), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # Dueño del recurso (para loans: member_id), para filtrar por visibilidad
+    member_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    deleted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+
+# ======================
+# Stats (contadores materializados)
+# ======================
+
+class StatsCounter(Base):
+    """
+    Contador global mantenido en la misma transacción que la escritura
+    (ver app.services.stats_service). Ej.: "users.role.MEMBER", "loans.status.OVERDUE".
+    """
+    __tablename__ = "stats_counters"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class LoanDailyStat(Base):
+    """Préstamos creados por sucursal y día (UTC)."""
+    __tablename__ = "loan_daily_stats"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    branch_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("library_branches.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    loans_created: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+# ======================
+# Analytics (rollups diarios)
+# ======================
+
+class BranchDailyActivity(Base):
+    """
+    Actividad de préstamos por sucursal y día (UTC), precalculada desde
+    loan_status_history para los días ya cerrados (ver analytics_service).
+    """
+    __tablename__ = "branch_daily_activity"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    branch_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("library_branches.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    borrowed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    returned: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    overdue: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # Devoluciones con BORROWED conocido y suma de sus duraciones (para la media)
+    duration_samples: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    loan_seconds: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class RollupWatermark(Base):
+    """
+    Último día ya procesado, por nombre: días cerrados precalculados de un
+    rollup o último día del historial compactado (purga por retención).
+    """
+    __tablename__ = "rollup_watermarks"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    through_day: Mapped[date] = mapped_column(Date, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+
+# ======================
+# Libros relacionados (co-ocurrencia)
+# ======================
+
+class BookRelated(Base):
+    """
+    Top-K de libros relacionados por libro ("quienes tomaron este también
+    tomaron..."). Lo escribe el job de app.services.related_books.
+    """
+    __tablename__ = "book_related"
+
+    book_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("books.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    rank: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    related_book_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("books.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    score: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class RelatedBuild(Base):
+    """Registro de cada ejecución del job de relacionados (y su watermark)."""
+    __tablename__ = "related_builds"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    mode: Mapped[str] = mapped_column(String(20), nullable=False)   # full | incremental
+
+    # Préstamos con id <= through_loan_id ya están incluidos
+    through_loan_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    books_updated: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    started_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+# ======================
+# Scheduler
+# ======================
+
+class JobRun(Base):
+    """
+    Una ejecución de una tarea en segundo plano (app.core.jobs): lanzada por
+    el scheduler, la CLI o un endpoint de admin (202 + polling).
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_job_name_created_at", "job_name", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job_name: Mapped[str] = mapped_column(String(100), nullable=False)
+    # queued | running | succeeded | failed | canceled | skipped | interrupted
+    status: Mapped[str] = mapped_column(String(20), nullable=False)
+    worker: Mapped[str | None] = mapped_column(String(255), nullable=True)  # host:pid que la ejecuta
+    requested_by_user_id: Mapped[int | None] = mapped_column(
+        Integer,
+        ForeignKey("users.id", ondelete="SET NULL", name="jobs_requested_by_user_id_fkey"),
+        nullable=True,
+    )
+    # Cancelación cooperativa: la tarea lo consulta entre lotes
+    cancel_requested: Mapped[bool] = mapped_column(
+        Boolean, default=False, server_default=text("false"), nullable=False
+    )
+
+    progress: Mapped[float | None] = mapped_column(Float, nullable=True)  # 0..1, si la tarea lo informa
+    rows_affected: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    duration_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # El worker dueño la renueva mientras la tarea sigue en queued / running;
+    # si deja de hacerlo, reap_stale_jobs() la da por huérfana
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class JobChunk(Base):
+    """
+    Checkpoint de un trozo de una tarea por lotes (p. ej. overdue): un rango
+    de ids de una sucursal. Se marca done en la misma transacción que aplica
+    sus cambios, así una ejecución interrumpida se retoma donde quedó.
+    """
+    __tablename__ = "job_chunks"
+    __table_args__ = (
+        Index("ix_job_chunks_run_id_status", "run_id", "status"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    run_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("jobs.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    branch_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    start_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    end_id: Mapped[int] = mapped_column(Integer, nullable=False)   # inclusivo
+
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")  # pending | done | failed
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rows_affected: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
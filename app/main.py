@@ -1,4 +1,5 @@
 from fastapi import FastAPI, Depends, Request
+from fastapi.datastructures import Default
 from fastapi.responses import Response
 from fastapi.openapi.utils import get_openapi
 import time
@@ -8,12 +9,20 @@ import logging
 from sqlalchemy.orm import Session
 
 from app.api.v1.dependencies import get_db
-from app.api.v1.endpoints import auth, branches, books, loans, users
+from app.api.v1.endpoints import auth, branches, books, holds, loans, users
 from app.api.v1.endpoints import admin as admin_endpoints
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, engine
+from app.services.branch_registry import branch_registry
+from app.services.loan_policy import loan_policies
 from app.services.init_admin import ensure_builtin_admin
+from app.services.popularity import popularity_index
+from app.services.scheduled_jobs import build_scheduler
+from app.services.suggest_index import suggest_index
 from app.core.config import settings
+from app.core.invalidation import start_listener
+from app.core.jobs import job_executor, reap_stale_jobs
 from app.core.logging import configure_logging, get_logger, request_id_ctx
+from app.core.responses import FastJSONResponse
 
 
 # Configurar logging global al arrancar el módulo
@@ -23,6 +32,12 @@ request_logger = get_logger("api.request")
 app = FastAPI(
     title="Library Management API",
     version="1.0.0",
+    # FastJSONResponse (orjson / encoder precompilado) renderiza lo que
+    # devuelven las rutas sin response_model. Las rutas con response_model
+    # siguen validando y serializando con Pydantic (serialize_response) en
+    # cualquier caso; Default(...) solo evita anular el dump_json directo en
+    # las versiones de FastAPI que lo tienen.
+    default_response_class=Default(FastJSONResponse),
 )
 
 # Routers de la API 
@@ -30,6 +45,7 @@ app.include_router(auth.router)
 app.include_router(branches.router)
 app.include_router(books.router)
 app.include_router(loans.router)
+app.include_router(holds.router)
 app.include_router(users.router) 
 app.include_router(admin_endpoints.router)
 
@@ -40,9 +56,41 @@ def startup_event():
     configure_logging()
     try:
         ensure_builtin_admin(db)
+        branch_registry.load(db)
+        loan_policies.load(db)
+        popularity_index.load(db)
+        # Tareas que un proceso anterior dejó en queued / running
+        reap_stale_jobs(db, startup=True)
     finally:
         db.close()
 
+    # Índice de autocompletado: se construye en segundo plano (con catálogos
+    # grandes tarda segundos); hasta entonces /books/suggest consulta la BD.
+    suggest_index.load_async()
+
+    # Bus de invalidación entre workers (LISTEN library_invalidate)
+    app.state.invalidation_listener = start_listener(engine)
+
+
+@app.on_event("startup")
+async def start_scheduler():
+    # Tareas de mantenimiento: todos los workers lo arrancan, solo el líder
+    # (advisory lock en PostgreSQL) las ejecuta.
+    if settings.SCHEDULER_ENABLED:
+        app.state.scheduler = build_scheduler(engine)
+        app.state.scheduler.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    listener = getattr(app.state, "invalidation_listener", None)
+    if listener is not None:
+        listener.stop()
+    scheduler = getattr(app.state, "scheduler", None)
+    if scheduler is not None:
+        scheduler.stop()
+    job_executor.shutdown()
+
 
 @app.middleware("http")
 async def add_request_id_and_log(request: Request, call_next):
@@ -1,7 +1,7 @@
 # app/schemas/admin.py
 
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -27,3 +27,72 @@ class AdminStats(BaseModel):
     loans_by_status: List[LoanStatusCount]
 
     generated_at: datetime
+
+
+class SingleFlightStats(BaseModel):
+    name: str
+    requests: int      # lecturas que pasaron por el grupo
+    executions: int    # consultas realmente ejecutadas
+    coalesced: int     # lecturas que esperaron a una consulta en vuelo
+    in_flight: int
+
+
+class CacheNamespaceStats(BaseModel):
+    namespace: str
+    hits: int
+    misses: int
+    stores: int
+    invalidations: int
+    hit_ratio: float
+
+
+class CacheStats(BaseModel):
+    backend: str
+    size: Optional[int] = None   # entradas en memoria (None si no aplica)
+    evictions: int
+    namespaces: List[CacheNamespaceStats]
+
+
+class IndexStats(BaseModel):
+    name: str
+    entries: int         # libros indexados
+    memory_bytes: int    # tamaño de los buffers / arrays del índice
+
+
+class JobRunRead(BaseModel):
+    id: int
+    job_name: str
+    status: str                  # queued | running | succeeded | failed | canceled | skipped | interrupted
+    worker: Optional[str] = None
+    requested_by_user_id: Optional[int] = None
+    cancel_requested: bool = False
+    progress: Optional[float] = None
+    rows_affected: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+    duration_ms: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class JobBranchProgress(BaseModel):
+    branch_id: int
+    chunks: int
+    done: int
+    failed: int
+    rows_affected: int
+
+
+class JobRunDetail(JobRunRead):
+    total_chunks: int = 0
+    done_chunks: int = 0
+    failed_chunks: int = 0
+    pending_chunks: int = 0
+    rows_processed: int = 0      # suma de los chunks terminados (avanza durante la ejecución)
+    progress: Optional[float] = None  # done_chunks / total_chunks si la tarea va por chunks
+    branches: List[JobBranchProgress] = []
@@ -0,0 +1,39 @@
+# app/schemas/analytics.py
+
+from datetime import date
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class ActivityBucket(BaseModel):
+    period_start: date             # inicio del día / semana (UTC)
+    borrowed: int
+    returned: int
+    overdue: int
+    mean_loan_days: Optional[float] = None   # None si no hubo devoluciones
+
+
+class BranchAnalytics(BaseModel):
+    branch_id: int
+    name: str
+    total_copies: int
+    copies_on_loan: int
+    utilization: float             # copies_on_loan / total_copies (ahora mismo)
+    borrowed: int
+    returned: int
+    overdue: int
+    mean_loan_days: Optional[float] = None
+
+
+class ActivityTimeseries(BaseModel):
+    granularity: str
+    start: date
+    end: date
+    buckets: List[ActivityBucket]
+
+
+class BranchAnalyticsReport(BaseModel):
+    start: date
+    end: date
+    branches: List[BranchAnalytics]
@@ -55,3 +55,23 @@ class BookRead(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class PopularBook(BaseModel):
+    book_id: int
+    title: str
+    author: Optional[str] = None
+    borrow_count: int   # préstamos (BORROWED) dentro de la ventana
+
+
+class BookSuggestion(BaseModel):
+    book_id: int
+    title: str
+    author: Optional[str] = None
+
+
+class RelatedBook(BaseModel):
+    book_id: int
+    title: str
+    author: Optional[str] = None
+    score: float        # similitud coseno por miembros en común (0..1)
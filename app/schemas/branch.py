@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 
 class BranchBase(BaseModel):
@@ -11,6 +11,10 @@ class BranchBase(BaseModel):
     phone_number: Optional[str] = None
     email: Optional[str] = None
     is_active: bool = True
+    # Política de préstamos (None = valor general de settings)
+    late_fee_per_day: Optional[float] = Field(None, ge=0)
+    loan_days: Optional[int] = Field(None, ge=1)
+    max_active_loans: Optional[int] = Field(None, ge=0)
 
 
 class BranchCreate(BranchBase):
@@ -24,6 +28,9 @@ class BranchUpdate(BaseModel):
     phone_number: Optional[str] = None
     email: Optional[EmailStr] = None
     is_active: Optional[bool] = None
+    late_fee_per_day: Optional[float] = Field(None, ge=0)
+    loan_days: Optional[int] = Field(None, ge=1)
+    max_active_loans: Optional[int] = Field(None, ge=0)
 
 
 class BranchRead(BranchBase):
@@ -0,0 +1,31 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class HoldStatus(str, Enum):
+    WAITING = "WAITING"
+    FULFILLED = "FULFILLED"
+    CANCELED = "CANCELED"
+
+
+class HoldCreate(BaseModel):
+    book_id: int
+    branch_id: int
+
+
+class HoldRead(BaseModel):
+    id: int
+    book_id: int
+    member_id: int
+    branch_id: int
+    status: HoldStatus
+    position: Optional[int]      # 1 = recibe la próxima copia que vuelva
+    loan_id: Optional[int]       # préstamo APPROVED creado al recibir la copia
+    created_at: datetime
+    fulfilled_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
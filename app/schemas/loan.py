@@ -2,7 +2,7 @@ from datetime import datetime, date
 from typing import Optional, List
 from enum import Enum
 
-from pydantic import BaseModel
+from pydantic import AliasChoices, AliasPath, BaseModel, Field
 
 
 class LoanStatus(str, Enum):
@@ -62,4 +62,52 @@ class LoanStatusHistoryRead(BaseModel):
 
 
 class LoanWithHistoryRead(LoanRead):
-    status_history: List[LoanStatusHistoryRead] = []
+    """Detalle de un préstamo: se lee de Loan / LoanArchive con book, branch e historial ya cargados."""
+    book_title: Optional[str] = Field(None, validation_alias=AliasPath("book", "title"))
+    branch_name: Optional[str] = Field(None, validation_alias=AliasPath("branch", "name"))
+    status_history: List[LoanStatusHistoryRead] = Field(
+        [], validation_alias=AliasChoices("status_history", "history")
+    )
+
+
+class LoanClaimResult(BaseModel):
+    claim_expires_at: datetime      # el lease vence y los préstamos vuelven a la cola
+    loans: List[LoanRead]
+
+
+class LoanIds(BaseModel):
+    loan_ids: List[int]
+
+
+class LoanBulkStatusChange(BaseModel):
+    loan_ids: List[int]
+    new_status: LoanStatus
+    note: Optional[str] = None
+
+
+class LoanBulkSkipped(BaseModel):
+    loan_id: int
+    detail: str
+
+
+class LoanBulkStatusResult(BaseModel):
+    updated: List[LoanRead]
+    skipped: List[LoanBulkSkipped]
+
+
+class LoanFee(BaseModel):
+    loan_id: int
+    member_id: int
+    book_id: int
+    branch_id: int
+    status: LoanStatus
+    due_date: datetime
+    days_late: int
+    rate_per_day: float
+    late_fee: float                 # vigente si BORROWED / OVERDUE, congelada si ya se cerró
+
+
+class LoanFeesReport(BaseModel):
+    as_of: date                     # día UTC al que se calcularon las multas vigentes
+    total: float
+    loans: List[LoanFee]
@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import List
+
 from pydantic import BaseModel
 
 
@@ -25,3 +28,41 @@ class SystemStats(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class StatsDrift(BaseModel):
+    counter: str
+    stored: int   # valor que tenía la tabla de contadores
+    actual: int   # valor recalculado desde las tablas base
+
+
+class StatsReconcileResult(BaseModel):
+    checked: int
+    drift: List[StatsDrift]
+    applied: bool
+
+
+class InventoryDrift(BaseModel):
+    book_id: int
+    branch_id: int
+    total_copies: int
+    stored: int     # available_copies guardado
+    expected: int   # total_copies - copias prestadas, perdidas o apartadas
+
+
+class InventoryReconcileResult(BaseModel):
+    drifted: int
+    fixed: int
+    applied: bool
+    scan_ms: int        # la consulta agregada sobre todo el catálogo
+    duration_ms: int    # total, incluidas las correcciones
+    drift: List[InventoryDrift]   # como mucho `limit` libros
+
+
+class HistoryPurgeEstimate(BaseModel):
+    months: int                 # meses completos que se conservan
+    cutoff: datetime            # se compacta lo anterior
+    rows: int                   # filas de loan_status_history que se borrarían
+    loans: int                  # préstamos que recibirían (o ampliarían) su resumen
+    total_rows: int
+    estimated_bytes: int        # parte proporcional del tamaño en disco del historial
@@ -0,0 +1,20 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from app.schemas.book import BookRead
+from app.schemas.loan import LoanRead
+
+
+class BookChanges(BaseModel):
+    items: List[BookRead]      # filas creadas / actualizadas después del token
+    deleted: List[int]         # ids borrados (tombstones)
+    next_token: str            # se envía como ?since= en la siguiente llamada
+    has_more: bool
+
+
+class LoanChanges(BaseModel):
+    items: List[LoanRead]
+    deleted: List[int]
+    next_token: str
+    has_more: bool
@@ -0,0 +1,317 @@
+# app/services/analytics_service.py
+"""
+Analítica de préstamos por sucursal y en el tiempo (/admin/analytics).
+
+La fuente es loan_status_history (transiciones BORROWED / RETURNED / OVERDUE)
+agrupada con date_trunc por día UTC y sucursal:
+
+- Días cerrados: se precalculan una sola vez en branch_daily_activity, así que
+  un año de dashboard lee ~365 filas por sucursal en lugar del histórico.
+- Días abiertos (desde el watermark hasta hoy): se agregan en vivo sobre las
+  pocas filas recientes (índice por changed_at).
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import BigInteger, Date, and_, cast, delete, func, select, text
+from sqlalchemy.orm import Session, aliased
+
+from app.db.models import (
+    Book,
+    BranchDailyActivity,
+    LoanHistorySummary,
+    LoanStatus,
+    LoanStatusHistory,
+    RollupWatermark,
+)
+from app.services.archival import all_loans
+from app.services.branch_registry import branch_registry
+
+DAILY_ACTIVITY = "branch_daily_activity"
+# Último día del historial compactado por la retención (app.services.history_retention)
+HISTORY_PURGE = "loan_status_history_purge"
+
+# Un día se considera cerrado 5 minutos después de medianoche (UTC): changed_at
+# es la hora de inicio de la transacción y una escritura larga puede confirmar
+# un poco después del cambio de día.
+CLOSE_GRACE = timedelta(minutes=5)
+
+# Clave de pg_advisory_xact_lock para que dos workers no recalculen a la vez
+_ROLLUP_LOCK_KEY = 0x4C4D5301
+
+GRANULARITIES = ("day", "week")
+
+_METRICS = ("borrowed", "returned", "overdue", "duration_samples", "loan_seconds")
+
+
+def _start_of(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def closed_through(now: Optional[datetime] = None) -> date:
+    """Último día UTC completamente cerrado."""
+    now = now or datetime.now(timezone.utc)
+    return (now - CLOSE_GRACE).astimezone(timezone.utc).date() - timedelta(days=1)
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Inicio del periodo, igual que date_trunc (semanas ISO: lunes)."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+# ======================
+# Agregado desde el histórico
+# ======================
+
+def _history_activity(
+    db: Session,
+    start: date,
+    end: date,
+    branch_id: Optional[int] = None,
+) -> list:
+    """
+    Agrega loan_status_history en [start, end) por día UTC y sucursal.
+
+    La duración de un préstamo es el tiempo entre su transición a BORROWED y
+    la de RETURNED.
+    """
+    history = LoanStatusHistory
+    borrowed = aliased(LoanStatusHistory)
+    day = cast(func.date_trunc("day", func.timezone("UTC", history.changed_at)), Date).label("day")
+
+    # Si la transición a BORROWED ya se compactó, queda en el resumen del préstamo
+    borrowed_at = func.coalesce(
+        select(func.min(borrowed.changed_at))
+        .where(borrowed.loan_id == history.loan_id, borrowed.new_status == LoanStatus.BORROWED)
+        .correlate(history)
+        .scalar_subquery(),
+        select(LoanHistorySummary.borrowed_at)
+        .where(LoanHistorySummary.loan_id == history.loan_id)
+        .correlate(history)
+        .scalar_subquery(),
+    )
+    is_return = history.new_status == LoanStatus.RETURNED
+    loan_seconds = func.extract("epoch", history.changed_at - borrowed_at)
+
+    # Préstamos archivados incluidos: recalcular un día antiguo da lo mismo
+    loans = all_loans("id", "branch_id")
+    stmt = (
+        select(
+            day,
+            loans.c.branch_id,
+            func.count().filter(history.new_status == LoanStatus.BORROWED).label("borrowed"),
+            func.count().filter(is_return).label("returned"),
+            func.count().filter(history.new_status == LoanStatus.OVERDUE).label("overdue"),
+            func.count(loan_seconds).filter(is_return).label("duration_samples"),
+            cast(func.coalesce(func.sum(loan_seconds).filter(is_return), 0), BigInteger).label("loan_seconds"),
+        )
+        .join(loans, loans.c.id == history.loan_id)
+        .where(
+            history.changed_at >= _start_of(start),
+            history.changed_at < _start_of(end),
+            history.new_status.in_(
+                [LoanStatus.BORROWED, LoanStatus.RETURNED, LoanStatus.OVERDUE]
+            ),
+        )
+        .group_by(day, loans.c.branch_id)
+    )
+    if branch_id is not None:
+        stmt = stmt.where(loans.c.branch_id == branch_id)
+    return db.execute(stmt).all()
+
+
+# ======================
+# Rollups de días cerrados
+# ======================
+
+def _watermark(db: Session, name: str = DAILY_ACTIVITY) -> Optional[date]:
+    return db.execute(
+        select(RollupWatermark.through_day).where(RollupWatermark.name == name)
+    ).scalar()
+
+
+def refresh_daily_rollups(
+    db: Session,
+    since: Optional[date] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Precalcula los días cerrados que falten (o, con `since`, los recalcula
+    desde ese día). Devuelve el número de días procesados.
+    """
+    through = closed_through(now)
+    if since is None:
+        watermark = _watermark(db)
+        if watermark is not None and watermark >= through:
+            return 0  # camino habitual: ya está al día, sin locks
+
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _ROLLUP_LOCK_KEY})
+
+    watermark = _watermark(db)
+    if since is None:
+        if watermark is not None:
+            since = watermark + timedelta(days=1)
+        else:
+            first = db.execute(select(func.min(LoanStatusHistory.changed_at))).scalar()
+            since = first.astimezone(timezone.utc).date() if first else through + timedelta(days=1)
+
+    # Los días ya compactados no se pueden recalcular: sus rollups se conservan
+    purged_through = _watermark(db, HISTORY_PURGE)
+    if purged_through is not None and since <= purged_through:
+        since = purged_through + timedelta(days=1)
+
+    processed = 0
+    if since <= through:
+        rows = _history_activity(db, since, through + timedelta(days=1))
+        db.execute(
+            delete(BranchDailyActivity).where(
+                BranchDailyActivity.day >= since,
+                BranchDailyActivity.day <= through,
+            )
+        )
+        if rows:
+            db.execute(
+                BranchDailyActivity.__table__.insert(),
+                [row._asdict() for row in rows],
+            )
+        processed = (through - since).days + 1
+
+    if watermark is None:
+        db.add(RollupWatermark(name=DAILY_ACTIVITY, through_day=through))
+    elif watermark < through:
+        db.execute(
+            RollupWatermark.__table__.update()
+            .where(RollupWatermark.name == DAILY_ACTIVITY)
+            .values(through_day=through, updated_at=func.now())
+        )
+    db.commit()
+    return processed
+
+
+def _rollup_rows(
+    db: Session,
+    start: date,
+    end: date,
+    group_by,
+    branch_id: Optional[int] = None,
+) -> list:
+    """Suma los rollups de [start, end] agrupando por `group_by`."""
+    table = BranchDailyActivity
+    stmt = (
+        select(group_by, *(func.sum(getattr(table, m)).label(m) for m in _METRICS))
+        .where(and_(table.day >= start, table.day <= end))
+        .group_by(group_by)
+    )
+    if branch_id is not None:
+        stmt = stmt.where(table.branch_id == branch_id)
+    return db.execute(stmt).all()
+
+
+def _mean_loan_days(totals: dict) -> Optional[float]:
+    if not totals["duration_samples"]:
+        return None
+    return round(totals["loan_seconds"] / totals["duration_samples"] / 86400, 2)
+
+
+def _split(db: Session, start: date, end: date) -> tuple[Optional[date], Optional[date]]:
+    """
+    Asegura los rollups al día y devuelve (fin del tramo precalculado,
+    inicio del tramo en vivo) para el rango [start, end].
+    """
+    refresh_daily_rollups(db)
+    watermark = _watermark(db)
+    rolled_end = min(end, watermark) if watermark is not None and watermark >= start else None
+    live_start = max(start, watermark + timedelta(days=1)) if watermark is not None else start
+    return rolled_end, (live_start if live_start <= end else None)
+
+
+# ======================
+# Consultas públicas
+# ======================
+
+def activity_timeseries(
+    db: Session,
+    start: date,
+    end: date,
+    granularity: str = "day",
+    branch_id: Optional[int] = None,
+) -> list[dict]:
+    """Préstamos / devoluciones / vencidos y duración media por día o semana."""
+    buckets: dict[date, dict] = defaultdict(lambda: dict.fromkeys(_METRICS, 0))
+    rolled_end, live_start = _split(db, start, end)
+
+    if rolled_end is not None:
+        period = cast(func.date_trunc(granularity, BranchDailyActivity.day), Date).label("period")
+        for row in _rollup_rows(db, start, rolled_end, period, branch_id):
+            totals = buckets[row.period]
+            for metric in _METRICS:
+                totals[metric] += int(getattr(row, metric) or 0)
+
+    if live_start is not None:
+        for row in _history_activity(db, live_start, end + timedelta(days=1), branch_id):
+            totals = buckets[bucket_start(row.day, granularity)]
+            for metric in _METRICS:
+                totals[metric] += int(getattr(row, metric) or 0)
+
+    return [
+        {
+            "period_start": period,
+            "borrowed": totals["borrowed"],
+            "returned": totals["returned"],
+            "overdue": totals["overdue"],
+            "mean_loan_days": _mean_loan_days(totals),
+        }
+        for period, totals in sorted(buckets.items())
+    ]
+
+
+def branch_utilization(db: Session, start: date, end: date) -> list[dict]:
+    """
+    Por sucursal: copias prestadas ahora mismo sobre el total (utilización)
+    y la actividad del periodo.
+    """
+    activity: dict[int, dict] = defaultdict(lambda: dict.fromkeys(_METRICS, 0))
+    rolled_end, live_start = _split(db, start, end)
+
+    if rolled_end is not None:
+        for row in _rollup_rows(db, start, rolled_end, BranchDailyActivity.branch_id):
+            for metric in _METRICS:
+                activity[row.branch_id][metric] += int(getattr(row, metric) or 0)
+    if live_start is not None:
+        for row in _history_activity(db, live_start, end + timedelta(days=1)):
+            for metric in _METRICS:
+                activity[row.branch_id][metric] += int(getattr(row, metric) or 0)
+
+    copies = {
+        row.branch_id: (int(row.total), int(row.available))
+        for row in db.execute(
+            select(
+                Book.branch_id,
+                func.coalesce(func.sum(Book.total_copies), 0).label("total"),
+                func.coalesce(func.sum(Book.available_copies), 0).label("available"),
+            ).group_by(Book.branch_id)
+        )
+    }
+
+    result = []
+    for branch in branch_registry.all(db):
+        total, available = copies.get(branch.id, (0, 0))
+        on_loan = max(total - available, 0)
+        totals = activity.get(branch.id, dict.fromkeys(_METRICS, 0))
+        result.append(
+            {
+                "branch_id": branch.id,
+                "name": branch.name,
+                "total_copies": total,
+                "copies_on_loan": on_loan,
+                "utilization": round(on_loan / total, 4) if total else 0.0,
+                "borrowed": totals["borrowed"],
+                "returned": totals["returned"],
+                "overdue": totals["overdue"],
+                "mean_loan_days": _mean_loan_days(totals),
+            }
+        )
+    return result
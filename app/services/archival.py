@@ -0,0 +1,177 @@
+"""
+Archivado de préstamos cerrados y particiones de loan_status_history.
+
+- loan_status_history está particionada por mes (changed_at): las consultas
+  por rango de fechas (analytics, popularidad) solo leen las particiones que
+  tocan. ensure_history_partitions() crea por adelantado las de los meses
+  siguientes; lo que caiga fuera va a la partición DEFAULT.
+- archive_closed_loans() mueve los préstamos RETURNED / CANCELED sin cambios
+  desde hace más de LOAN_ARCHIVE_AFTER_DAYS de loans a loans_archive, por
+  chunks (DELETE ... RETURNING + INSERT, un commit por chunk). Los LOST se
+  quedan: siguen contando como copia fuera en el inventario.
+- El historial no se mueve (ya está en particiones viejas) y los contadores
+  de /admin/stats no cambian: el DELETE masivo no pasa por los eventos del
+  ORM y compute_counters() cuenta también loans_archive.
+- Cada préstamo archivado deja un tombstone: los clientes de /loans/changes
+  lo quitan de su copia local. Sigue visible con include_archived.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, insert, select, text, union_all
+from sqlalchemy.orm import Session, joinedload
+
+from app.core.config import settings
+from app.core.jobs import check_canceled
+from app.core.logging import get_logger
+from app.db.models import Book, LibraryBranch, Loan, LoanArchive, LoanStatus, LoanStatusHistory, SyncTombstone
+
+logger = get_logger("services.archival")
+
+CHUNK_SIZE = 1000
+MONTHS_AHEAD = 3
+
+ARCHIVABLE_STATUSES = (LoanStatus.RETURNED, LoanStatus.CANCELED)
+
+# Columnas comunes a loans y loans_archive
+LOAN_COLUMNS = tuple(c.name for c in LoanArchive.__table__.columns if c.name != "archived_at")
+
+
+def all_loans(*columns: str):
+    """loans UNION ALL loans_archive (solo `columns`, por defecto todas las comunes)."""
+    names = columns or LOAN_COLUMNS
+    return union_all(
+        select(*(Loan.__table__.c[name] for name in names)),
+        select(*(LoanArchive.__table__.c[name] for name in names)),
+    ).subquery("all_loans")
+
+
+# ======================
+# Particiones
+# ======================
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{LoanStatusHistory.__tablename__}_p{month:%Y%m}"
+
+
+def ensure_history_partitions(db: Session, months_ahead: int = MONTHS_AHEAD) -> list[str]:
+    """Crea las particiones mensuales que falten desde este mes; devuelve las creadas."""
+    parent = LoanStatusHistory.__tablename__
+    existing = set(
+        db.execute(
+            text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                 "WHERE i.inhparent = CAST(:parent AS regclass)"),
+            {"parent": parent},
+        ).scalars()
+    )
+    created = []
+    month = datetime.now(timezone.utc).date().replace(day=1)
+    for _ in range(months_ahead + 1):
+        following = _next_month(month)
+        name = partition_name(month)
+        if name not in existing:
+            # Falla si la DEFAULT ya tiene filas de ese mes: se avisa y se sigue
+            try:
+                with db.begin_nested():
+                    db.execute(text(
+                        f"CREATE TABLE {name} PARTITION OF {parent} "
+                        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+                    ))
+                created.append(name)
+            except Exception:
+                logger.warning(
+                    "history_partition_failed",
+                    extra={"operation": "archive_loans", "resource": name},
+                    exc_info=True,
+                )
+        month = following
+    db.commit()
+    return created
+
+
+# ======================
+# Archivado
+# ======================
+
+def _archive_chunk(db: Session, cutoff: datetime, after_id: int, chunk_size: int) -> tuple[int, int]:
+    """Mueve un chunk; devuelve (movidos, último id visto)."""
+    ids = db.execute(
+        select(Loan.id)
+        .where(Loan.status.in_(ARCHIVABLE_STATUSES), Loan.updated_at < cutoff, Loan.id > after_id)
+        .order_by(Loan.id)
+        .limit(chunk_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        return 0, after_id
+
+    moved = db.execute(
+        delete(Loan)
+        .where(Loan.id.in_(ids), Loan.status.in_(ARCHIVABLE_STATUSES))
+        .returning(*(Loan.__table__.c[name] for name in LOAN_COLUMNS))
+        .execution_options(synchronize_session=False)
+    ).mappings().all()
+    if moved:
+        db.execute(insert(LoanArchive), [dict(row) for row in moved])
+        db.execute(
+            insert(SyncTombstone),
+            [{"entity": "loan", "entity_id": row["id"], "member_id": row["member_id"]} for row in moved],
+        )
+    db.commit()
+    return len(moved), ids[-1]
+
+
+def archive_closed_loans(
+    db: Session,
+    older_than_days: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> dict:
+    """Crea las particiones que falten y archiva los préstamos cerrados antiguos."""
+    days = settings.LOAN_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    partitions = ensure_history_partitions(db)
+
+    archived, last_id = 0, 0
+    while True:
+        moved, last_id_seen = _archive_chunk(db, cutoff, last_id, chunk_size)
+        if last_id_seen == last_id:
+            break
+        archived += moved
+        last_id = last_id_seen
+        check_canceled()
+
+    logger.info(
+        "loans_archived",
+        extra={"operation": "archive_loans", "resource": "loan", "archived": archived},
+    )
+    return {"rows_affected": archived, "archived": archived, "cutoff": cutoff.isoformat(), "partitions_created": partitions}
+
+
+def _with_details(model):
+    """Préstamo + título del libro + nombre de la sucursal + historial en un solo SELECT."""
+    return select(model).options(
+        joinedload(model.book, innerjoin=True).load_only(Book.title),
+        joinedload(model.branch, innerjoin=True).load_only(LibraryBranch.name),
+        joinedload(model.history),
+    )
+
+
+def find_loan(db: Session, loan_id: int, include_archived: bool = False, details: bool = False):
+    """
+    Loan o, con include_archived, LoanArchive; None si no existe.
+
+    Con details, book, branch e historial vienen ya cargados (sin lazy loads
+    al serializar el detalle).
+    """
+    for model in (Loan, LoanArchive) if include_archived else (Loan,):
+        if details:
+            loan = db.execute(_with_details(model).where(model.id == loan_id)).unique().scalar_one_or_none()
+        else:
+            loan = db.get(model, loan_id)
+        if loan is not None:
+            return loan
+    return None
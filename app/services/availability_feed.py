@@ -0,0 +1,167 @@
+# app/services/availability_feed.py
+"""
+Cambios de available_copies para GET /api/v1/books/availability/stream (SSE).
+
+change_loan_status, update_book, delete_book y la cola de reservas ya
+publican "book:<id>" en el bus de invalidación. El handler de este módulo
+solo consulta la BD si en este worker hay alguien suscrito a ese libro: lee
+available_copies, lo compara con el último valor enviado y, si cambió,
+difunde el delta por el BroadcastHub. Como el mismo aviso llega dos veces
+(commit local + NOTIFY propio), la comparación con el último valor evita
+eventos duplicados.
+
+Leer, comparar y difundir va bajo un lock por libro (repartido en
+LOCK_STRIPES): cada lectura empieza después de que termine la anterior, así
+que nunca se difunde un valor más viejo que el último enviado. El alta de un
+suscriptor (alta en el hub, lectura inicial y semilla de _last) va bajo los
+mismos locks: un aviso que llegue mientras tanto espera a que _last tenga
+la semilla y se compara con ella, así que el cambio o entra en el snapshot
+o se envía después.
+"""
+import asyncio
+import json
+import threading
+from contextlib import ExitStack
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.broadcast import BroadcastHub, Subscription
+from app.core.invalidation import register_handler
+from app.db.models import Book
+from app.db.session import SessionLocal
+
+# Comentario SSE periódico: mantiene viva la conexión a través de proxies
+KEEPALIVE_SECONDS = 15.0
+LOCK_STRIPES = 64
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class AvailabilityFeed:
+    def __init__(self, hub: Optional[BroadcastHub] = None) -> None:
+        self.hub = hub or BroadcastHub()
+        self._lock = threading.Lock()
+        # book_id -> último available_copies enviado (None = libro borrado)
+        self._last: dict[int, Optional[int]] = {}
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _locked(self, book_ids: Iterable[int]) -> ExitStack:
+        """Toma los locks de esos libros (en orden fijo: sin bloqueos cruzados)."""
+        stack = ExitStack()
+        for index in sorted({book_id % LOCK_STRIPES for book_id in book_ids}):
+            stack.enter_context(self._stripes[index])
+        return stack
+
+    def _read(self, db: Session, book_ids: Iterable[int]) -> dict[int, Optional[int]]:
+        ids = list(book_ids)
+        rows = dict(db.execute(select(Book.id, Book.available_copies).where(Book.id.in_(ids))).all())
+        return {book_id: rows.get(book_id) for book_id in ids}
+
+    def _seed(self, db: Session, book_ids: list[int]) -> list[dict]:
+        values = self._read(db, book_ids)
+        with self._lock:
+            for book_id, value in values.items():
+                # Si ya había suscriptores, _last es lo que ellos tienen
+                self._last.setdefault(book_id, value)
+        return [
+            {"book_id": book_id, "available_copies": value, "delta": None}
+            for book_id, value in values.items()
+        ]
+
+    def snapshot(self, db: Session, book_ids: Iterable[int]) -> list[dict]:
+        """Estado actual de los libros (delta None), p. ej. para un resync."""
+        ids = list(book_ids)
+        with self._locked(ids):
+            return self._seed(db, ids)
+
+    def subscribe(
+        self,
+        db: Session,
+        book_ids: Iterable[int],
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> tuple[Subscription, list[dict]]:
+        """
+        Da de alta un suscriptor y devuelve su estado inicial. _last queda
+        sembrado antes de que se pueda procesar ningún aviso de sus libros.
+        """
+        ids = list(book_ids)
+        with self._locked(ids):
+            # Primero el hub: los avisos de estos libros ya no se descartan,
+            # esperan al lock y encuentran _last sembrado
+            subscription = self.hub.subscribe(ids, loop)
+            try:
+                return subscription, self._seed(db, ids)
+            except BaseException:
+                self.unsubscribe(subscription)
+                raise
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        emptied = self.hub.unsubscribe(subscription)
+        with self._lock:
+            for book_id in emptied:
+                # Un alta concurrente pudo volver a suscribirlo y sembrarlo
+                if not self.hub.has_subscribers(book_id):
+                    self._last.pop(book_id, None)
+
+    def on_book(self, book_id: Optional[int]) -> None:
+        """Handler de "book:<id>" (None = revisar todos los libros suscritos)."""
+        if book_id is None:
+            ids = self.hub.keys()
+        elif self.hub.has_subscribers(book_id):
+            ids = [book_id]
+        else:
+            return
+        if not ids:
+            return
+
+        with self._locked(ids):
+            with SessionLocal() as db:
+                values = self._read(db, ids)
+
+            for changed_id, value in values.items():
+                with self._lock:
+                    if changed_id not in self._last:
+                        continue  # nadie suscrito ya
+                    previous = self._last[changed_id]
+                    if value == previous:
+                        continue
+                    self._last[changed_id] = value
+                delta = value - previous if value is not None and previous is not None else None
+                self.hub.publish(changed_id, {"book_id": changed_id, "available_copies": value, "delta": delta})
+
+    async def events(
+        self,
+        subscription: Subscription,
+        initial: list[dict],
+        resnapshot: Callable[[], Awaitable[list[dict]]],
+        keepalive: float = KEEPALIVE_SECONDS,
+    ) -> AsyncIterator[str]:
+        """
+        Cuerpo del stream SSE de un suscriptor. Si su cola se desbordó
+        (cliente lento), manda un evento "resync" con el estado actual en
+        lugar de los deltas perdidos. Se da de baja al cerrarse el stream.
+        """
+        try:
+            yield sse_event("snapshot", initial)
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscription.take_dropped():
+                    subscription.clear()
+                    yield sse_event("resync", await resnapshot())
+                    continue
+                yield sse_event("availability", message)
+        finally:
+            self.unsubscribe(subscription)
+
+
+availability_feed = AvailabilityFeed()
+
+register_handler("book", availability_feed.on_book)
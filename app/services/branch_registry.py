@@ -0,0 +1,97 @@
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.invalidation import register_handler
+from app.db.models import LibraryBranch
+from app.schemas.branch import BranchRead
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    by_id: dict[int, BranchRead] = field(default_factory=dict)
+    ordered: tuple[BranchRead, ...] = ()
+    # Validadores del listado (mismos valores que el agregado SQL)
+    max_updated_at: Optional[datetime] = None
+    id_sum: int = 0
+
+
+class BranchRegistry:
+    """
+    Copia en memoria (por worker) de las sucursales.
+
+    Las sucursales cambian muy pocas veces, así que las validaciones de FK
+    (create_book, create_loan_request) y el listado se resuelven sin ir a la BD.
+
+    Cada escritura sobre sucursales publica "branch:<id>" en el bus de
+    invalidación, que llama a bump() en todos los workers; la siguiente lectura
+    ve que la versión cargada quedó atrás y recarga la tabla completa.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version = 0
+        self._loaded_version = -1
+        # Se reemplaza entero en cada recarga: los lectores nunca ven un estado a medias
+        self._snapshot = _Snapshot()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self) -> None:
+        """Invalida la copia local (lo llama el bus de invalidación)."""
+        with self._lock:
+            self._version += 1
+
+    def load(self, db: Session) -> None:
+        """Carga (o recarga) todas las sucursales en una sola consulta."""
+        with self._lock:
+            target_version = self._version
+
+        rows = db.query(LibraryBranch).order_by(LibraryBranch.id).all()
+        ordered = tuple(BranchRead.model_validate(row) for row in rows)
+
+        snapshot = _Snapshot(
+            by_id={b.id: b for b in ordered},
+            ordered=ordered,
+            max_updated_at=max((b.updated_at for b in ordered), default=None),
+            id_sum=sum(b.id for b in ordered),
+        )
+
+        with self._lock:
+            self._snapshot = snapshot
+            # Si hubo un bump durante la carga, la versión no coincide y se recarga otra vez
+            self._loaded_version = target_version
+
+    def _fresh(self, db: Session) -> _Snapshot:
+        if self._loaded_version != self._version:
+            self.load(db)
+        return self._snapshot
+
+    def get(self, db: Session, branch_id: int) -> Optional[BranchRead]:
+        return self._fresh(db).by_id.get(branch_id)
+
+    def exists(self, db: Session, branch_id: int) -> bool:
+        return self.get(db, branch_id) is not None
+
+    def is_active(self, db: Session, branch_id: int) -> bool:
+        branch = self.get(db, branch_id)
+        return branch is not None and branch.is_active
+
+    def all(self, db: Session) -> tuple[BranchRead, ...]:
+        return self._fresh(db).ordered
+
+    def list_validators(self, db: Session) -> tuple[Optional[datetime], int, int]:
+        """(max(updated_at), count, sum(id)) del listado, para el ETag."""
+        snapshot = self._fresh(db)
+        return snapshot.max_updated_at, len(snapshot.ordered), snapshot.id_sum
+
+
+branch_registry = BranchRegistry()
+
+# Escrituras de sucursales (en este u otro worker) llegan por el bus de invalidación
+register_handler("branch", lambda _branch_id: branch_registry.bump())
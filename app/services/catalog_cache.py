@@ -0,0 +1,42 @@
+from typing import Optional
+
+from app.core.cache import response_cache
+from app.core.invalidation import register_handler
+
+BOOK_NAMESPACE = "book"
+BOOK_LIST_NAMESPACE = "books_list"
+
+
+def book_scope(book_id: int) -> str:
+    return f"{BOOK_NAMESPACE}:{book_id}"
+
+
+def invalidate_book(book_id: int) -> None:
+    """
+    Invalida el detalle del libro y todas las páginas de list_books.
+    Las escrituras no lo llaman directamente: publican "book:<id>" con
+    app.core.invalidation.publish() y el bus lo aplica en cada worker (con
+    Redis, una sola vez en el que escribió).
+    """
+    response_cache.invalidate(book_scope(book_id))
+    response_cache.invalidate(BOOK_LIST_NAMESPACE)
+
+
+def _on_book_invalidated(book_id: Optional[int]) -> None:
+    if response_cache.backend.shared:
+        return  # versiones compartidas: ya las subió el worker que escribió
+    if book_id is None:
+        response_cache.reset_local()
+    else:
+        invalidate_book(book_id)
+
+
+def _on_book_written(book_id: Optional[int]) -> None:
+    if response_cache.backend.shared and book_id is not None:
+        invalidate_book(book_id)
+
+
+# Escrituras de libros (en este u otro worker) llegan por el bus de invalidación;
+# con backend compartido (Redis) solo el worker que escribió sube la versión
+register_handler("book", _on_book_invalidated)
+register_handler("book", _on_book_written, local_only=True)
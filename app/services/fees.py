@@ -0,0 +1,129 @@
+"""
+Multas por retraso, calculadas en SQL.
+
+    multa = GREATEST(0, hoy - due_date) * tarifa
+
+con los días en UTC y la tarifa de la sucursal del préstamo
+(library_branches.late_fee_per_day) o, si no fija una,
+settings.LATE_FEE_PER_DAY.
+
+Un préstamo BORROWED u OVERDUE acumula multa: loan_fees() la calcula al leer y
+late_fee_amount se actualiza al pasar a OVERDUE y cada noche
+(refresh_late_fees). Al cerrarse (RETURNED / LOST) queda congelada.
+"""
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import Date, Numeric, case, cast, func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.jobs import check_canceled
+from app.core.logging import get_logger
+from app.db.models import LibraryBranch, Loan, LoanStatus
+
+logger = get_logger("services.fees")
+
+CHUNK_SIZE = 5000
+
+# Préstamos con la copia fuera y sin cerrar: la multa sigue creciendo
+ACCRUING_STATUSES = (LoanStatus.BORROWED, LoanStatus.OVERDUE)
+
+
+def _utc_date(column):
+    return cast(func.timezone("UTC", column), Date)
+
+
+def rate_per_day_expr():
+    branch_rate = (
+        select(LibraryBranch.late_fee_per_day)
+        .where(LibraryBranch.id == Loan.branch_id)
+        .scalar_subquery()
+    )
+    return func.coalesce(branch_rate, Decimal(str(settings.LATE_FEE_PER_DAY)))
+
+
+def days_late_expr(until=None):
+    """Días de retraso hasta `until` (por defecto, hoy)."""
+    until = func.now() if until is None else until
+    return func.greatest(_utc_date(until) - _utc_date(Loan.due_date), 0)
+
+
+def accrued_fee_expr():
+    """Multa acumulada a hoy; asignable a Loan.late_fee_amount (se evalúa en el UPDATE)."""
+    return cast(days_late_expr() * rate_per_day_expr(), Numeric(10, 2))
+
+
+def current_fee_expr():
+    """Multa vigente: en vivo si sigue acumulando, la guardada si ya se cerró."""
+    return case(
+        (Loan.status.in_(ACCRUING_STATUSES), accrued_fee_expr()),
+        else_=func.coalesce(Loan.late_fee_amount, 0),
+    )
+
+
+def loan_fees(db: Session, member_id: Optional[int] = None, branch_id: Optional[int] = None) -> list[dict]:
+    """Préstamos con multa (vigente o congelada) de un miembro y/o sucursal, en una consulta."""
+    fee = current_fee_expr().label("late_fee")
+    # Cerrados: el retraso se cuenta hasta la devolución (o la pérdida)
+    until = case(
+        (Loan.status.in_(ACCRUING_STATUSES), func.now()),
+        else_=func.coalesce(Loan.return_date, Loan.updated_at),
+    )
+    query = (
+        select(
+            Loan.id,
+            Loan.member_id,
+            Loan.book_id,
+            Loan.branch_id,
+            Loan.status,
+            Loan.due_date,
+            days_late_expr(until).label("days_late"),
+            rate_per_day_expr().label("rate_per_day"),
+            fee,
+        )
+        .where(fee > 0)
+        .order_by(Loan.due_date, Loan.id)
+    )
+    if member_id is not None:
+        query = query.where(Loan.member_id == member_id)
+    if branch_id is not None:
+        query = query.where(Loan.branch_id == branch_id)
+    return [dict(row._mapping, loan_id=row.id) for row in db.execute(query)]
+
+
+def refresh_late_fees(db: Session, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Pone al día late_fee_amount de los préstamos que acumulan, por rangos de
+    id (un UPDATE y un commit por chunk). Devuelve las filas actualizadas.
+    """
+    updated, last_id = 0, 0
+    while True:
+        ids = db.execute(
+            select(Loan.id)
+            .where(Loan.status.in_(ACCRUING_STATUSES), Loan.id > last_id)
+            .order_by(Loan.id)
+            .limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            break
+        last_id = ids[-1]
+        fee = accrued_fee_expr()
+        updated += db.execute(
+            update(Loan)
+            .where(
+                Loan.id.between(ids[0], ids[-1]),
+                Loan.status.in_(ACCRUING_STATUSES),
+                Loan.late_fee_amount.is_distinct_from(fee),
+            )
+            .values(late_fee_amount=fee)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        check_canceled()
+
+    logger.info(
+        "late_fees_refreshed",
+        extra={"operation": "refresh_late_fees", "resource": "loan", "updated": updated},
+    )
+    return updated
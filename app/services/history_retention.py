@@ -0,0 +1,239 @@
+"""
+Retención de loan_status_history.
+
+Se conservan el mes en curso y los HISTORY_RETENTION_MONTHS meses completos
+anteriores. Lo más antiguo se compacta: cada chunk es una sola sentencia
+
+    WITH doomed AS (SELECT ... ORDER BY changed_at LIMIT n FOR UPDATE SKIP LOCKED),
+         deleted AS (DELETE ... USING doomed RETURNING ...)
+    INSERT INTO loan_history_summaries ... ON CONFLICT (loan_id) DO UPDATE ...
+
+así que el borrado y el resumen por préstamo (transiciones, primera y última
+fecha, último estado, BORROWED / RETURNED) confirman juntos. Entre chunks hay
+una pausa para no acumular lag de replicación ni retener locks.
+
+Nunca se borra un día que la analítica no tenga ya en sus rollups; el día
+hasta el que se compactó queda en rollup_watermarks (HISTORY_PURGE) y
+refresh_daily_rollups no recalcula antes de él.
+
+El DELETE deja espacio libre para reutilizar, no lo devuelve al sistema:
+las particiones mensuales que quedan vacías se eliminan al final, una por
+transacción. DROP toma ACCESS EXCLUSIVE sobre loan_status_history y, mientras
+espera, bloquea detrás de él a todas las lecturas y escrituras: se hace con
+lock_timeout y reintentos (DETACH ... CONCURRENTLY no sirve: la tabla tiene
+partición DEFAULT).
+"""
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import case, func, select, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg, insert as pg_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.jobs import check_canceled
+from app.core.logging import get_logger
+from app.db.models import LoanHistorySummary, LoanStatus, LoanStatusHistory, RollupWatermark
+from app.services.analytics_service import DAILY_ACTIVITY, HISTORY_PURGE
+from app.services.archival import partition_name
+
+logger = get_logger("services.history_retention")
+
+DROP_ATTEMPTS = 3
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def _months_back(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _watermark(db: Session, name: str) -> Optional[date]:
+    return db.execute(select(RollupWatermark.through_day).where(RollupWatermark.name == name)).scalar()
+
+
+def retention_cutoff(db: Session, months: Optional[int] = None) -> datetime:
+    """Inicio (UTC) del primer día que se conserva."""
+    months = settings.HISTORY_RETENTION_MONTHS if months is None else months
+    cutoff = _months_back(datetime.now(timezone.utc).date(), months)
+    # Sin rollups precalculados no se borra nada que la analítica aún necesite
+    rolled = _watermark(db, DAILY_ACTIVITY)
+    rolled_until = rolled + timedelta(days=1) if rolled is not None else date.min
+    return datetime.combine(min(cutoff, rolled_until), datetime.min.time(), tzinfo=timezone.utc)
+
+
+def _purge_chunk(db: Session, cutoff: datetime, chunk_size: int) -> int:
+    history = LoanStatusHistory
+    doomed = (
+        select(history.id, history.changed_at)
+        .where(history.changed_at < cutoff)
+        .order_by(history.changed_at)
+        .limit(chunk_size)
+        .with_for_update(skip_locked=True)
+        .cte("doomed")
+    )
+    deleted = (
+        history.__table__.delete()
+        .where(history.id == doomed.c.id, history.changed_at == doomed.c.changed_at)
+        .returning(history.loan_id, history.new_status, history.changed_at)
+        .cte("deleted")
+    )
+    per_loan = (
+        select(
+            deleted.c.loan_id,
+            func.count().label("transitions"),
+            func.min(deleted.c.changed_at).label("first_changed_at"),
+            func.max(deleted.c.changed_at).label("last_changed_at"),
+            array_agg(aggregate_order_by(deleted.c.new_status, deleted.c.changed_at.desc()))[1].label("last_status"),
+            func.min(deleted.c.changed_at).filter(deleted.c.new_status == LoanStatus.BORROWED).label("borrowed_at"),
+            func.max(deleted.c.changed_at).filter(deleted.c.new_status == LoanStatus.RETURNED).label("returned_at"),
+        )
+        .group_by(deleted.c.loan_id)
+    )
+    summary = LoanHistorySummary.__table__
+    columns = ["loan_id", "transitions", "first_changed_at", "last_changed_at", "last_status", "borrowed_at", "returned_at"]
+    insert = pg_insert(summary).from_select(columns, per_loan)
+    newer = insert.excluded.last_changed_at >= summary.c.last_changed_at
+    upsert = insert.on_conflict_do_update(
+        index_elements=[summary.c.loan_id],
+        set_={
+            "transitions": summary.c.transitions + insert.excluded.transitions,
+            "first_changed_at": func.least(summary.c.first_changed_at, insert.excluded.first_changed_at),
+            "last_changed_at": func.greatest(summary.c.last_changed_at, insert.excluded.last_changed_at),
+            "last_status": case((newer, insert.excluded.last_status), else_=summary.c.last_status),
+            "borrowed_at": func.least(summary.c.borrowed_at, insert.excluded.borrowed_at),
+            "returned_at": func.greatest(summary.c.returned_at, insert.excluded.returned_at),
+            "compacted_at": func.now(),
+        },
+    ).cte("upsert")
+    # Los CTE que modifican datos se ejecutan aunque nadie los lea
+    purged = db.execute(select(func.count()).select_from(deleted).add_cte(upsert)).scalar()
+    db.commit()
+    return purged
+
+
+def _drop_partition(db: Session, name: str, pause_seconds: float) -> bool:
+    """DROP de una partición si sigue vacía; False si no lo está o no consiguió el lock."""
+    for attempt in range(1, DROP_ATTEMPTS + 1):
+        try:
+            db.execute(
+                text("SELECT set_config('lock_timeout', :timeout, true)"),
+                {"timeout": f"{settings.HISTORY_DROP_LOCK_TIMEOUT_MS}ms"},
+            )
+            if not db.execute(text(f"SELECT NOT EXISTS (SELECT 1 FROM {name})")).scalar():
+                db.rollback()
+                return False
+            db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+            return True
+        except OperationalError as exc:
+            db.rollback()
+            # pgcode en psycopg2, sqlstate en psycopg 3
+            sqlstate = getattr(exc.orig, "pgcode", None) or getattr(exc.orig, "sqlstate", None)
+            if sqlstate != LOCK_NOT_AVAILABLE:
+                raise
+            logger.warning(
+                "history_partition_busy",
+                extra={"operation": "purge_history", "resource": name, "attempt": attempt},
+            )
+            if attempt < DROP_ATTEMPTS:
+                time.sleep(pause_seconds * attempt)
+    return False
+
+
+def _drop_empty_partitions(db: Session, cutoff: datetime, pause_seconds: float = 0) -> list[str]:
+    """
+    Elimina las particiones mensuales enteras anteriores al corte que ya estén
+    vacías. La que no consigue el lock se queda para la siguiente ejecución.
+    """
+    dropped = []
+    first = db.execute(
+        text("SELECT min(c.relname) FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+             "WHERE i.inhparent = CAST(:parent AS regclass) AND c.relname ~ '_p[0-9]{6}$'"),
+        {"parent": LoanStatusHistory.__tablename__},
+    ).scalar()
+    db.rollback()
+    if first is None:
+        return dropped
+    month = date(int(first[-6:-2]), int(first[-2:]), 1)
+    while _months_back(month, -1) <= cutoff.date():
+        name = partition_name(month)
+        exists = db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+        db.rollback()
+        if exists and _drop_partition(db, name, pause_seconds):
+            dropped.append(name)
+        month = _months_back(month, -1)
+    return dropped
+
+
+def estimate_purge(db: Session, months: Optional[int] = None) -> dict:
+    """Filas, préstamos y bytes aproximados que liberaría purge_history (sin tocar nada)."""
+    cutoff = retention_cutoff(db, months)
+    history = LoanStatusHistory
+    rows, loans = db.execute(
+        select(func.count(), func.count(func.distinct(history.loan_id))).where(history.changed_at < cutoff)
+    ).one()
+    # Tamaño de las particiones (datos + índices + TOAST) repartido por fila;
+    # el número de filas sale de las estadísticas si ya hay ANALYZE
+    total_bytes, total_rows = db.execute(
+        text("SELECT coalesce(sum(pg_total_relation_size(c.oid)), 0), coalesce(sum(greatest(c.reltuples, 0)), 0) "
+             "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+             "WHERE i.inhparent = CAST(:parent AS regclass)"),
+        {"parent": history.__tablename__},
+    ).one()
+    if not total_rows:
+        total_rows = db.execute(select(func.count()).select_from(history)).scalar()
+    db.rollback()
+    return {
+        "cutoff": cutoff,
+        "rows": rows,
+        "loans": loans,
+        "total_rows": int(total_rows),
+        "estimated_bytes": int(int(total_bytes) * min(rows / total_rows, 1)) if total_rows else 0,
+    }
+
+
+def purge_history(
+    db: Session,
+    months: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    pause_seconds: Optional[float] = None,
+) -> dict:
+    """Compacta el historial anterior al corte, chunk a chunk; devuelve lo hecho."""
+    chunk_size = chunk_size or settings.HISTORY_PURGE_CHUNK_SIZE
+    pause_seconds = settings.HISTORY_PURGE_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+    estimate = estimate_purge(db, months)
+    cutoff = estimate["cutoff"]
+
+    purged = 0
+    while True:
+        deleted = _purge_chunk(db, cutoff, chunk_size)
+        purged += deleted
+        if deleted < chunk_size:
+            break
+        check_canceled()
+        time.sleep(pause_seconds)
+
+    if purged:
+        through = (cutoff - timedelta(days=1)).date()
+        stmt = pg_insert(RollupWatermark).values(name=HISTORY_PURGE, through_day=through)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[RollupWatermark.name],
+            set_={"through_day": func.greatest(RollupWatermark.through_day, through), "updated_at": func.now()},
+        ))
+        db.commit()
+    dropped = _drop_empty_partitions(db, cutoff, pause_seconds)
+
+    logger.info(
+        "history_purged",
+        extra={"operation": "purge_history", "resource": "loan_status_history", "purged": purged},
+    )
+    return {
+        "rows_affected": purged,
+        "purged": purged,
+        "cutoff": cutoff.isoformat(),
+        "estimated_bytes": estimate["estimated_bytes"],
+        "partitions_dropped": dropped,
+    }
@@ -0,0 +1,163 @@
+"""
+Cola de reservas por libro (book_holds).
+
+- Un miembro se pone en la cola cuando el libro no tiene copias disponibles.
+- Cuando una copia vuelve (RETURNED, o se cancela el préstamo que la tenía
+  reservada), release_copy() se la asigna a la primera reserva en espera
+  creando un préstamo APPROVED para ese miembro, en la misma transacción.
+  Las reservas de miembros que están en su límite de préstamos activos se
+  saltan (siguen en la cola). Si no queda nadie, la copia vuelve a
+  available_copies.
+
+Todas las operaciones sobre la cola de un libro bloquean antes la fila del
+libro (SELECT ... FOR UPDATE): así se serializan por libro y las posiciones
+se mantienen densas (1..n) sin huecos ni duplicados.
+"""
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.invalidation import publish
+from app.db.models import Book, BookHold, HoldStatus, Loan, LoanStatus, User
+from app.services.loan_policy import loan_policies
+
+
+def _lock_book(db: Session, book: Book) -> None:
+    """Bloquea la fila del libro y recarga sus copias."""
+    db.refresh(book, with_for_update=True)
+
+
+def _close_gap(db: Session, book_id: int, position: int) -> None:
+    """Las reservas detrás de `position` avanzan un lugar."""
+    db.execute(
+        update(BookHold)
+        .where(
+            BookHold.book_id == book_id,
+            BookHold.status == HoldStatus.WAITING,
+            BookHold.position > position,
+        )
+        .values(position=BookHold.position - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def enqueue_hold(db: Session, book: Book, member: User, branch_id: int) -> BookHold:
+    _lock_book(db, book)
+    if book.available_copies > 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Book has available copies, request a loan instead",
+        )
+
+    # Mismo límite que al pedir un préstamo: la reserva acabará siéndolo.
+    # Aquí solo se comprueba; el hueco se ocupa cuando llega la copia.
+    active = db.execute(select(User.active_loan_count).where(User.id == member.id)).scalar()
+    if active >= loan_policies.for_branch(db, branch_id).max_active_loans:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You already have the maximum number of active loans",
+        )
+
+    waiting = db.execute(
+        select(func.count())
+        .select_from(BookHold)
+        .where(BookHold.book_id == book.id, BookHold.status == HoldStatus.WAITING)
+    ).scalar()
+    hold = BookHold(
+        book_id=book.id,
+        member_id=member.id,
+        branch_id=branch_id,
+        status=HoldStatus.WAITING,
+        position=waiting + 1,
+    )
+    db.add(hold)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="You already have a hold on this book",
+        )
+    db.commit()
+    db.refresh(hold)
+    return hold
+
+
+def cancel_hold(db: Session, hold: BookHold) -> BookHold:
+    if hold.status != HoldStatus.WAITING:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Hold is already {hold.status.value}",
+        )
+    book = db.get(Book, hold.book_id)
+    _lock_book(db, book)
+    db.refresh(hold)
+    position = hold.position
+    hold.status = HoldStatus.CANCELED
+    hold.position = None
+    db.flush()
+    _close_gap(db, hold.book_id, position)
+    db.commit()
+    db.refresh(hold)
+    return hold
+
+
+def holds_reserved_copy(db: Session, loan: Loan) -> bool:
+    """True si el préstamo nació de una reserva y aún tiene la copia apartada."""
+    if loan.status != LoanStatus.APPROVED:
+        return False
+    return db.execute(select(BookHold.id).where(BookHold.loan_id == loan.id)).first() is not None
+
+
+def release_copy(db: Session, book: Book, actor: User | None) -> Loan | None:
+    """
+    Una copia vuelve a la biblioteca: pasa a la primera reserva en espera
+    cuyo miembro tenga hueco (devuelve el préstamo creado) o, si no hay
+    ninguna, queda disponible.
+    No hace commit: forma parte de la transacción del cambio de estado.
+    """
+    from app.services.loan_service import add_status_history, reserve_active_loan_slot
+
+    _lock_book(db, book)
+    waiting = db.execute(
+        select(BookHold)
+        .where(BookHold.book_id == book.id, BookHold.status == HoldStatus.WAITING)
+        .order_by(BookHold.position)
+    ).scalars().all()
+    # La copia pasa al primero que tenga hueco: quien llegó al límite de
+    # préstamos activos conserva su lugar y espera a la siguiente copia
+    for hold in waiting:
+        limit = loan_policies.for_branch(db, hold.branch_id).max_active_loans
+        if reserve_active_loan_slot(db, hold.member_id, limit):
+            break
+    else:
+        book.available_copies += 1
+        return None
+
+    now = datetime.now(timezone.utc)
+    loan = Loan(
+        member_id=hold.member_id,
+        book_id=book.id,
+        branch_id=hold.branch_id,
+        borrow_date=now,
+        due_date=now + timedelta(days=loan_policies.for_branch(db, hold.branch_id).loan_days),
+        status=LoanStatus.APPROVED,
+        late_fee_amount=0,
+    )
+    db.add(loan)
+    db.flush()
+    add_status_history(db, loan, None, LoanStatus.APPROVED, actor, f"Copy assigned from hold {hold.id}")
+
+    position = hold.position
+    hold.status = HoldStatus.FULFILLED
+    hold.position = None
+    hold.loan_id = loan.id
+    hold.fulfilled_at = now
+    db.flush()
+    _close_gap(db, book.id, position)
+    publish(db, "loan", loan.id)
+    return loan
@@ -0,0 +1,138 @@
+"""
+Reconciliación de books.available_copies.
+
+available_copies se mantiene con lecturas-modificaciones-escrituras en
+change_loan_status y además se puede sobrescribir con PUT /books/{id}, así que
+puede derivar. El valor esperado es:
+
+    total_copies - copias fuera de la biblioteca
+
+donde "fuera" son los préstamos BORROWED, OVERDUE y LOST (una copia perdida no
+vuelve: change_loan_status no la repone) más los APPROVED con copia apartada
+por la cola de reservas (hold_service.release_copy).
+
+find_inventory_drift() lo calcula para todo el catálogo con una sola consulta
+agregada; reconcile_inventory() además corrige por chunks, cada uno en su
+transacción con los libros bloqueados, de modo que un préstamo que cambia de
+estado mientras tanto no se pisa.
+"""
+import time
+from typing import Optional
+
+from sqlalchemy import exists, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.invalidation import publish
+from app.core.logging import get_logger
+from app.db.models import Book, BookHold, Loan, LoanStatus
+from app.services.stats_service import BOOK_AVAILABLE_COPIES, apply_deltas
+
+logger = get_logger("services.inventory")
+
+CHUNK_SIZE = 1000
+# Por encima, una sola invalidación general en vez de una por libro
+PUBLISH_PER_BOOK = 100
+
+# Préstamos que tienen la copia fuera del estante
+OUT_STATUSES = (LoanStatus.BORROWED, LoanStatus.OVERDUE, LoanStatus.LOST)
+
+
+def _expected_query(branch_id: Optional[int] = None, book_ids: Optional[list[int]] = None):
+    reserved = exists().where(BookHold.loan_id == Loan.id)
+    out = (
+        select(Loan.book_id, func.count().label("out"))
+        .where(or_(Loan.status.in_(OUT_STATUSES), (Loan.status == LoanStatus.APPROVED) & reserved))
+        .group_by(Loan.book_id)
+    )
+    if book_ids is not None:
+        # Rango y no IN: sobre un seq scan de loans, comparar con una lista
+        # de 1000 ids por fila cuesta segundos
+        out = out.where(Loan.book_id.between(min(book_ids), max(book_ids)))
+    out = out.subquery()
+
+    expected = func.greatest(Book.total_copies - func.coalesce(out.c.out, 0), 0).label("expected")
+    query = (
+        select(Book.id, Book.branch_id, Book.total_copies, Book.available_copies, expected)
+        .outerjoin(out, out.c.book_id == Book.id)
+        .where(Book.available_copies != expected)
+        .order_by(Book.id)
+    )
+    if branch_id is not None:
+        query = query.where(Book.branch_id == branch_id)
+    if book_ids is not None:
+        query = query.where(Book.id.in_(book_ids))
+    return query
+
+
+def find_inventory_drift(db: Session, branch_id: Optional[int] = None) -> list[dict]:
+    """Libros cuyo available_copies no cuadra con sus préstamos (una consulta)."""
+    return [
+        {
+            "book_id": book_id,
+            "branch_id": book_branch_id,
+            "total_copies": total,
+            "stored": stored,
+            "expected": expected,
+        }
+        for book_id, book_branch_id, total, stored, expected in db.execute(_expected_query(branch_id))
+    ]
+
+
+def _fix_chunk(db: Session, book_ids: list[int]) -> int:
+    # Primero los locks (en orden de id); después se recalcula, así el
+    # cálculo ve cualquier cambio de estado confirmado mientras tanto.
+    db.execute(select(Book.id).where(Book.id.in_(book_ids)).order_by(Book.id).with_for_update())
+    drift = _expected_query(book_ids=book_ids).subquery()
+    fixed = db.execute(
+        update(Book)
+        .where(Book.id == drift.c.id)
+        .values(available_copies=drift.c.expected)
+        .returning(Book.id, drift.c.expected - drift.c.available_copies)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if fixed:
+        # UPDATE masivo: el contador de /admin/stats se ajusta a mano
+        apply_deltas(db.connection(), {BOOK_AVAILABLE_COPIES: sum(delta for _, delta in fixed)}, {})
+        if len(fixed) <= PUBLISH_PER_BOOK:
+            for book_id, _ in fixed:
+                publish(db, "book", book_id)
+        else:
+            publish(db, "book")  # muchos libros: que cada worker recargue todo
+    db.commit()
+    return len(fixed)
+
+
+def reconcile_inventory(
+    db: Session,
+    apply: bool = False,
+    branch_id: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> dict:
+    """
+    Informa la deriva de available_copies y, con apply=True, la corrige en
+    chunks de `chunk_size` libros. Devuelve el informe con los tiempos.
+    """
+    started = time.perf_counter()
+    drift = find_inventory_drift(db, branch_id)
+    db.rollback()  # sin transacción abierta mientras se corrige
+    scan_ms = int((time.perf_counter() - started) * 1000)
+
+    fixed = 0
+    if apply and drift:
+        ids = [item["book_id"] for item in drift]
+        for start in range(0, len(ids), chunk_size):
+            fixed += _fix_chunk(db, ids[start:start + chunk_size])
+
+    result = {
+        "drifted": len(drift),
+        "fixed": fixed,
+        "applied": apply,
+        "scan_ms": scan_ms,
+        "duration_ms": int((time.perf_counter() - started) * 1000),
+        "drift": drift,
+    }
+    logger.info(
+        "inventory_reconciled",
+        extra={"operation": "inventory_reconcile", "resource": "book", "drifted": len(drift), "fixed": fixed},
+    )
+    return result
@@ -0,0 +1,155 @@
+"""
+Política de préstamos: flujo de estados, permisos por rol y reglas por sucursal.
+
+- El flujo de estados y lo que puede hacer cada rol se declaran abajo
+  (TRANSITIONS, ROLE_RULES) y se compilan una vez, al importar, a máscaras de
+  bits por estado: comprobar una transición es un AND.
+- Plazo y límite de préstamos activos salen de library_branches (loan_days,
+  max_active_loans; NULL = settings). El límite es por miembro y global:
+  se compara con users.active_loan_count, que cuenta sus préstamos activos
+  en todas las sucursales; la sucursal del préstamo solo decide qué tope
+  aplica. Cada worker los compila en una tabla
+  inmutable sucursal -> LoanPolicy que se recarga entera cuando el bus de
+  invalidación avisa de un cambio en sucursales (como branch_registry).
+- La tarifa de multas se aplica en SQL (app.services.fees), con la misma
+  columna por sucursal.
+"""
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.invalidation import register_handler
+from app.db.models import LibraryBranch, LoanStatus, UserRole
+
+# ======================
+# Flujo de estados
+# ======================
+
+# origen -> destinos permitidos
+TRANSITIONS: dict[LoanStatus, tuple[LoanStatus, ...]] = {
+    LoanStatus.REQUESTED: (LoanStatus.CANCELED, LoanStatus.APPROVED),
+    LoanStatus.APPROVED: (LoanStatus.BORROWED, LoanStatus.CANCELED),
+    LoanStatus.BORROWED: (LoanStatus.RETURNED, LoanStatus.LOST, LoanStatus.OVERDUE),
+    LoanStatus.OVERDUE: (LoanStatus.RETURNED, LoanStatus.LOST),
+    LoanStatus.RETURNED: (),
+    LoanStatus.LOST: (),
+    LoanStatus.CANCELED: (),
+}
+
+# rol -> (orígenes, destinos) que puede aplicar; None = cualquiera.
+# El member además solo sobre sus propios préstamos (lo comprueba el endpoint).
+ROLE_RULES: dict[UserRole, tuple[tuple[LoanStatus, ...] | None, tuple[LoanStatus, ...] | None]] = {
+    UserRole.MEMBER: ((LoanStatus.REQUESTED,), (LoanStatus.CANCELED,)),
+    UserRole.LIBRARIAN: (None, (LoanStatus.APPROVED, LoanStatus.BORROWED, LoanStatus.RETURNED, LoanStatus.LOST)),
+    UserRole.ADMIN: (None, None),
+}
+
+# Mensaje del 403 cuando el rol no puede aplicar la transición
+ROLE_DENIED_DETAIL: dict[UserRole, str] = {
+    UserRole.MEMBER: "Members can only cancel requested loans",
+    UserRole.LIBRARIAN: "Invalid status for librarian",
+}
+
+_BIT: Mapping[LoanStatus, int] = MappingProxyType({s: 1 << i for i, s in enumerate(LoanStatus)})
+_ALL = (1 << len(LoanStatus)) - 1
+
+
+def _mask(statuses: tuple[LoanStatus, ...] | None) -> int:
+    if statuses is None:
+        return _ALL
+    mask = 0
+    for s in statuses:
+        mask |= _BIT[s]
+    return mask
+
+
+def _compile_roles() -> Mapping[tuple[UserRole, LoanStatus], int]:
+    table = {}
+    for role, (sources, targets) in ROLE_RULES.items():
+        source_mask, target_mask = _mask(sources), _mask(targets)
+        for old in LoanStatus:
+            table[(role, old)] = target_mask if source_mask & _BIT[old] else 0
+    return MappingProxyType(table)
+
+
+_TRANSITION_MASK: Mapping[LoanStatus, int] = MappingProxyType(
+    {old: _mask(targets) for old, targets in TRANSITIONS.items()}
+)
+_ROLE_MASK = _compile_roles()
+
+
+def transition_allowed(old_status: LoanStatus, new_status: LoanStatus) -> bool:
+    return bool(_TRANSITION_MASK[old_status] & _BIT[new_status])
+
+
+def role_may_transition(role: UserRole, old_status: LoanStatus, new_status: LoanStatus) -> bool:
+    return bool(_ROLE_MASK.get((role, old_status), 0) & _BIT[new_status])
+
+
+# ======================
+# Reglas por sucursal
+# ======================
+
+@dataclass(frozen=True)
+class LoanPolicy:
+    loan_days: int
+    max_active_loans: int
+
+
+def default_policy() -> LoanPolicy:
+    return LoanPolicy(loan_days=settings.LOAN_DAYS, max_active_loans=settings.MAX_ACTIVE_LOANS)
+
+
+class PolicyRegistry:
+    """Tabla sucursal -> LoanPolicy por worker, versionada como branch_registry."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version = 0
+        self._loaded_version = -1
+        # (default, sucursal -> política); se reemplaza entero en cada recarga
+        self._snapshot: tuple[LoanPolicy, Mapping[int, LoanPolicy]] = (default_policy(), MappingProxyType({}))
+
+    def bump(self) -> None:
+        with self._lock:
+            self._version += 1
+
+    def load(self, db: Session) -> None:
+        with self._lock:
+            target_version = self._version
+
+        default = default_policy()
+        rows = db.execute(
+            select(LibraryBranch.id, LibraryBranch.loan_days, LibraryBranch.max_active_loans).where(
+                (LibraryBranch.loan_days.is_not(None)) | (LibraryBranch.max_active_loans.is_not(None))
+            )
+        ).all()
+        # Solo las sucursales que se apartan del default; el resto cae en él
+        by_branch = MappingProxyType({
+            branch_id: LoanPolicy(
+                loan_days=loan_days if loan_days is not None else default.loan_days,
+                max_active_loans=max_active if max_active is not None else default.max_active_loans,
+            )
+            for branch_id, loan_days, max_active in rows
+        })
+
+        with self._lock:
+            self._snapshot = (default, by_branch)
+            self._loaded_version = target_version
+
+    def for_branch(self, db: Session, branch_id: int) -> LoanPolicy:
+        if self._loaded_version != self._version:
+            self.load(db)
+        default, by_branch = self._snapshot
+        return by_branch.get(branch_id, default)
+
+
+loan_policies = PolicyRegistry()
+
+# Las reglas viven en library_branches: cualquier escritura de sucursal recarga
+register_handler("branch", lambda _branch_id: loan_policies.bump())
@@ -0,0 +1,105 @@
+"""
+Cola de trabajo de bibliotecarios sobre los préstamos REQUESTED.
+
+claim_loans() reclama atómicamente los siguientes N préstamos pendientes
+(FIFO por created_at) con SELECT ... FOR UPDATE SKIP LOCKED: dos mostradores
+que reclaman a la vez nunca reciben el mismo préstamo ni se esperan entre sí.
+Cada reclamo es un lease: si el bibliotecario no lo resuelve antes de
+claim_expires_at, el préstamo vuelve solo a la cola (no hay job de limpieza:
+la condición de expiración forma parte de la consulta).
+
+Un préstamo reclamado por otro (lease vigente) no puede cambiar de estado
+desde otro mostrador; change_loan_status libera el reclamo al salir de
+REQUESTED.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from app.db.models import Loan, LoanStatus, User
+
+CLAIM_LEASE = timedelta(minutes=5)
+MAX_CLAIM = 50
+
+
+def claim_is_active(loan: Loan, now: Optional[datetime] = None) -> bool:
+    now = now or datetime.now(timezone.utc)
+    return loan.claimed_by_user_id is not None and loan.claim_expires_at is not None and loan.claim_expires_at > now
+
+
+def ensure_not_claimed_by_other(loan: Loan, user: User) -> None:
+    if claim_is_active(loan) and loan.claimed_by_user_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Loan is claimed by another librarian",
+        )
+
+
+def claim_loans(
+    db: Session,
+    user: User,
+    n: int,
+    branch_id: Optional[int] = None,
+    lease: timedelta = CLAIM_LEASE,
+) -> tuple[list[Loan], datetime]:
+    """
+    Reclama hasta `n` préstamos REQUESTED libres (o con lease vencido, o ya
+    reclamados por `user`, que renueva su lease). Devuelve los préstamos y el
+    vencimiento del lease.
+    """
+    now = datetime.now(timezone.utc)
+    expires_at = now + lease
+
+    candidates = select(Loan.id).where(
+        Loan.status == LoanStatus.REQUESTED,
+        or_(
+            Loan.claim_expires_at.is_(None),
+            Loan.claim_expires_at <= now,
+            Loan.claimed_by_user_id == user.id,
+        ),
+    )
+    if branch_id is not None:
+        candidates = candidates.where(Loan.branch_id == branch_id)
+    candidates = (
+        candidates.order_by(Loan.created_at, Loan.id)
+        .limit(n)
+        .with_for_update(skip_locked=True)
+        .cte("next_requested")
+    )
+
+    claimed_ids = db.execute(
+        update(Loan)
+        .where(Loan.id.in_(select(candidates.c.id)))
+        # El reclamo es coordinación entre mostradores, no un cambio del
+        # préstamo: updated_at (y /loans/changes) no se tocan.
+        .values(claimed_by_user_id=user.id, claim_expires_at=expires_at, updated_at=Loan.updated_at)
+        .returning(Loan.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+
+    if not claimed_ids:
+        return [], expires_at
+    loans = (
+        db.query(Loan)
+        .filter(Loan.id.in_(claimed_ids))
+        .order_by(Loan.created_at, Loan.id)
+        .populate_existing()
+        .all()
+    )
+    return loans, expires_at
+
+
+def release_claims(db: Session, user: User, loan_ids: list[int]) -> int:
+    """Devuelve a la cola los préstamos que `user` tiene reclamados."""
+    result = db.execute(
+        update(Loan)
+        .where(Loan.id.in_(loan_ids), Loan.claimed_by_user_id == user.id)
+        .values(claimed_by_user_id=None, claim_expires_at=None, updated_at=Loan.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
@@ -1,31 +1,39 @@
-from datetime import datetime, timedelta, timezone, date
+from datetime import datetime, timezone
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 from app.db.models import Loan, LoanStatus, LoanStatusHistory, Book, User
+from app.core.invalidation import publish
+from app.services.fees import ACCRUING_STATUSES, accrued_fee_expr
+from app.services.hold_service import holds_reserved_copy, release_copy
+from app.services.loan_policy import transition_allowed
+from app.services.stats_service import ACTIVE_LOAN_STATUSES
 
-LATE_FEE_PER_DAY = 1.0  # Multa por retraso,
 
-
-def calculate_late_fee(loan: Loan) -> float:
-    """Calcula la multa basada en días de atraso."""
-    if not loan.due_date:
-        return 0.0
-
-    # Normalizamos a tipo date
-    if isinstance(loan.due_date, datetime):
-        due_date = loan.due_date.date()
-    elif isinstance(loan.due_date, date):
-        due_date = loan.due_date
-    else:
-        return 0.0
-
-    today = datetime.now(timezone.utc).date()
-
-    if today <= due_date:
-        return 0.0
-
-    days_overdue = (today - due_date).days
-    return float(days_overdue * LATE_FEE_PER_DAY)
+def reserve_active_loan_slot(db: Session, member_id: int, limit: int) -> bool:
+    """
+    Suma un préstamo activo al miembro solo si no llegó al límite, en un único
+    UPDATE condicional. El lock de la fila de users dura hasta el commit: dos
+    solicitudes simultáneas del mismo miembro no pueden pasar ambas el límite.
+    """
+    reserved = db.execute(
+        update(User)
+        .where(User.id == member_id, User.active_loan_count < limit)
+        # Contador interno: no es un cambio del usuario (updated_at intacto)
+        .values(active_loan_count=User.active_loan_count + 1, updated_at=User.updated_at)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    return reserved is not None
+
+
+def adjust_active_loan_count(db: Session, member_id: int, delta: int) -> None:
+    db.execute(
+        update(User)
+        .where(User.id == member_id)
+        .values(active_loan_count=User.active_loan_count + delta, updated_at=User.updated_at)
+        .execution_options(synchronize_session=False)
+    )
 
 
 def add_status_history(
@@ -52,21 +60,17 @@ def change_loan_status(
     new_status: LoanStatus,
     actor: User | None,
     note: str | None = None,
+    commit: bool = True,
 ):
+    """
+    Aplica una transición de estado con sus efectos (copias, multas,
+    historial, avisos). Con commit=False solo hace flush: el llamador agrupa
+    varias transiciones en su propia transacción (jobs por lotes).
+    """
     old_status = loan.status
 
-    # Reglas del flujo de estados (simplificadas)
-    allowed_transitions: dict[LoanStatus, set[LoanStatus]] = {
-        LoanStatus.REQUESTED: {LoanStatus.CANCELED, LoanStatus.APPROVED},
-        LoanStatus.APPROVED: {LoanStatus.BORROWED, LoanStatus.CANCELED},
-        LoanStatus.BORROWED: {LoanStatus.RETURNED, LoanStatus.LOST, LoanStatus.OVERDUE},
-        LoanStatus.OVERDUE: {LoanStatus.RETURNED, LoanStatus.LOST},
-        LoanStatus.RETURNED: set(),
-        LoanStatus.LOST: set(),
-        LoanStatus.CANCELED: set(),
-    }
-
-    if new_status not in allowed_transitions[old_status]:
+    # Flujo de estados: tabla precompilada (app.services.loan_policy)
+    if not transition_allowed(old_status, new_status):
         from fastapi import HTTPException, status
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -76,8 +80,11 @@ def change_loan_status(
     # Efectos secundarios sobre copias
     book: Book = loan.book
 
+    # Préstamo creado desde la cola de reservas: ya tiene su copia apartada
+    reserved = holds_reserved_copy(db, loan)
+
     # BORROWED: restar una copia disponible
-    if old_status in {LoanStatus.APPROVED, LoanStatus.REQUESTED} and new_status == LoanStatus.BORROWED:
+    if old_status in {LoanStatus.APPROVED, LoanStatus.REQUESTED} and new_status == LoanStatus.BORROWED and not reserved:
         if book.available_copies <= 0:
             from fastapi import HTTPException, status
             raise HTTPException(
@@ -86,50 +93,45 @@ def change_loan_status(
             )
         book.available_copies -= 1
 
-    # RETURNED: sumar una copia disponible
+    # RETURNED: la copia pasa a la siguiente reserva o vuelve a estar disponible
     if new_status == LoanStatus.RETURNED and old_status in {LoanStatus.BORROWED, LoanStatus.OVERDUE}:
-        book.available_copies += 1
+        release_copy(db, book, actor)
         loan.return_date = datetime.now(timezone.utc)
 
-    # OVERDUE: calcular multa
-    if new_status == LoanStatus.OVERDUE:
-        loan.late_fee_amount = calculate_late_fee(loan)
+    # Se cancela un préstamo con copia apartada: la copia sigue la cola
+    if new_status == LoanStatus.CANCELED and reserved:
+        release_copy(db, book, actor)
+
+    # OVERDUE: multa a hoy; RETURNED / LOST: se congela la acumulada.
+    # Se calcula en el propio UPDATE (tarifa de la sucursal, días en UTC).
+    if new_status == LoanStatus.OVERDUE or (
+        new_status in {LoanStatus.RETURNED, LoanStatus.LOST} and old_status in ACCRUING_STATUSES
+    ):
+        loan.late_fee_amount = accrued_fee_expr()
+
+    # Sale de REQUESTED: el reclamo de la cola de trabajo ya no aplica
+    if old_status == LoanStatus.REQUESTED:
+        loan.claimed_by_user_id = None
+        loan.claim_expires_at = None
+
+    # Entra o sale de los estados activos: contador del límite por miembro
+    if (old_status in ACTIVE_LOAN_STATUSES) != (new_status in ACTIVE_LOAN_STATUSES):
+        adjust_active_loan_count(db, loan.member_id, 1 if new_status in ACTIVE_LOAN_STATUSES else -1)
 
     loan.notes = note
     loan.status = new_status
     add_status_history(db, loan, old_status, new_status, actor, note)
+    # available_copies pudo cambiar: el detalle y los listados cacheados quedan viejos
+    publish(db, "book", book.id)
+    publish(db, "loan", loan.id)
+    if new_status == LoanStatus.BORROWED:
+        # Alimenta el ranking de populares (app.services.popularity) en todos los workers
+        publish(db, "loan_borrowed", loan.id)
+    if not commit:
+        db.flush()
+        return loan
     db.commit()
     db.refresh(loan)
     db.refresh(book)
     return loan
 
-
-def mark_overdue_loans(db: Session) -> int:
-    """
-    Marca automáticamente como OVERDUE todos los préstamos BORROWED cuya due_date ya pasó.
-    Devuelve el número de préstamos actualizados.
-    Esta función está pensada para ser llamada por un job del sistema (cron, scheduler, endpoint admin, etc.).
-    """
-    today = datetime.now(timezone.utc).date()
-
-    # Préstamos que deberían estar overdue
-    loans_q = (
-        db.query(Loan)
-        .filter(Loan.status == LoanStatus.BORROWED)
-        .filter(Loan.due_date < today)
-    )
-
-    updated_count = 0
-
-    for loan in loans_q:
-        # Calcula multa al momento de cambiar estado
-        change_loan_status(
-            db=db,
-            loan=loan,
-            new_status=LoanStatus.OVERDUE,
-            actor=None,  # actor=None => cambio automático del sistema
-            note="Automatic overdue job",
-        )
-        updated_count += 1
-
-    return updated_count
@@ -0,0 +1,200 @@
+"""
+Job de préstamos vencidos (BORROWED con due_date pasada -> OVERDUE) por lotes.
+
+1. Plan: los préstamos vencidos se parten por sucursal y en rangos de ids
+   de CHUNK_SIZE filas; cada rango es una fila de job_chunks ligada a la
+   ejecución (jobs).
+2. Ejecución: los chunks se procesan en paralelo en un pool acotado; cada
+   uno en su propia transacción corta, que aplica las transiciones y marca
+   el chunk como done a la vez (checkpoint). Los contadores de /admin/stats
+   se suman en un solo upsert justo antes del commit (deferred_counters):
+   el chunk no retiene sus filas mientras transiciona.
+3. Reanudación: si una ejecución anterior quedó a medias (falló o murió su
+   worker), la siguiente adopta sus chunks pendientes y solo planifica los
+   vencidos que estos no cubren. Lo mismo si se cancela: los chunks sin
+   empezar quedan pending.
+
+El progreso se consulta en GET /admin/jobs/{run_id}.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.logging import get_logger
+from app.core.jobs import JobCanceled, JobSkipped, cancel_requested, current_run_id, report_progress
+from app.db.models import JobChunk, JobRun, Loan, LoanStatus
+from app.db.session import SessionLocal
+from app.services.loan_service import change_loan_status
+from app.services.stats_service import deferred_counters
+
+logger = get_logger("services.overdue_job")
+
+JOB_NAME = "overdue"
+CHUNK_SIZE = 500
+MAX_WORKERS = 4
+
+# Una sola ejecución a la vez (scheduler, CLI o endpoint)
+OVERDUE_LOCK = 0x0D0E0001
+
+
+def _overdue_filter(today):
+    return and_(Loan.status == LoanStatus.BORROWED, Loan.due_date < today)
+
+
+def plan_chunks(db: Session, run_id: int, today, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Crea los chunks (sucursal, rango de ids) de la ejecución. Devuelve cuántos.
+    Los préstamos que ya cubre un chunk adoptado no se vuelven a planificar.
+    """
+    adopted = select(JobChunk.id).where(
+        JobChunk.run_id == run_id,
+        JobChunk.branch_id == Loan.branch_id,
+        Loan.id.between(JobChunk.start_id, JobChunk.end_id),
+    )
+    bucket = ((func.row_number().over(partition_by=Loan.branch_id, order_by=Loan.id) - 1) // chunk_size).label("bucket")
+    numbered = (
+        select(Loan.id, Loan.branch_id, bucket)
+        .where(_overdue_filter(today), ~adopted.exists())
+        .subquery()
+    )
+    ranges = db.execute(
+        select(numbered.c.branch_id, func.min(numbered.c.id), func.max(numbered.c.id))
+        .group_by(numbered.c.branch_id, numbered.c.bucket)
+        .order_by(numbered.c.branch_id, func.min(numbered.c.id))
+    ).all()
+    db.add_all(
+        JobChunk(run_id=run_id, branch_id=branch_id, start_id=start_id, end_id=end_id, status="pending")
+        for branch_id, start_id, end_id in ranges
+    )
+    return len(ranges)
+
+
+def adopt_unfinished_chunks(db: Session, run_id: int) -> int:
+    """Pasa a esta ejecución los chunks sin terminar de ejecuciones anteriores."""
+    previous = select(JobRun.id).where(JobRun.job_name == JOB_NAME, JobRun.id != run_id)
+    # Con el lock tomado, cualquier otra ejecución "running" murió a medias
+    db.execute(
+        update(JobRun)
+        .where(JobRun.id.in_(previous), JobRun.status == "running")
+        .values(status="interrupted", finished_at=func.now())
+    )
+    return db.execute(
+        update(JobChunk)
+        .where(JobChunk.run_id.in_(previous), JobChunk.status.in_(("pending", "failed")))
+        .values(run_id=run_id, status="pending")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _transition_chunk(db: Session, chunk: JobChunk, today) -> int:
+    loans = db.execute(
+        select(Loan)
+        .where(
+            _overdue_filter(today),
+            Loan.branch_id == chunk.branch_id,
+            Loan.id.between(chunk.start_id, chunk.end_id),
+        )
+        .order_by(Loan.id)
+        # Un préstamo que alguien está tocando ahora se recoge en la próxima ejecución
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    for loan in loans:
+        change_loan_status(
+            db=db,
+            loan=loan,
+            new_status=LoanStatus.OVERDUE,
+            actor=None,  # actor=None => cambio automático del sistema
+            note="Automatic overdue job",
+            commit=False,
+        )
+    return len(loans)
+
+
+def process_chunk(chunk_id: int, today) -> int:
+    """Procesa un chunk en su propia transacción (cambios + checkpoint juntos)."""
+    with SessionLocal() as db:
+        chunk = db.get(JobChunk, chunk_id)
+        try:
+            with deferred_counters(db):
+                rows = _transition_chunk(db, chunk, today)
+            chunk.status = "done"
+            chunk.rows_affected = rows
+            chunk.attempts += 1
+            chunk.error = None
+            chunk.finished_at = datetime.now(timezone.utc)
+            db.commit()
+            return rows
+        except Exception as exc:
+            db.rollback()
+            logger.exception("overdue_chunk_failed", extra={"operation": JOB_NAME, "resource": str(chunk_id)})
+            db.execute(
+                update(JobChunk)
+                .where(JobChunk.id == chunk_id)
+                .values(status="failed", attempts=JobChunk.attempts + 1, error=repr(exc)[:500])
+            )
+            db.commit()
+            return 0
+
+
+def process_overdue(
+    db: Session,
+    run_id: Optional[int] = None,
+    workers: int = MAX_WORKERS,
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """
+    Tarea "overdue". Devuelve los préstamos marcados; lanza RuntimeError si
+    quedó algún chunk fallido (se reintenta en la siguiente ejecución) y
+    JobSkipped si otra ejecución tiene el lock (la ejecución queda skipped).
+    """
+    run_id = run_id or current_run_id.get()
+    if run_id is None:
+        raise RuntimeError("process_overdue needs a job run (record_run or job_executor)")
+
+    # En autocommit: el lock es de sesión y la conexión no queda "idle in
+    # transaction" toda la ejecución (frenaría vacuum y el horizonte de /sync)
+    with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        if not lock_conn.execute(select(func.pg_try_advisory_lock(OVERDUE_LOCK))).scalar():
+            logger.info("overdue_job_already_running", extra={"operation": JOB_NAME})
+            raise JobSkipped("Another overdue run holds the lock")
+        try:
+            today = datetime.now(timezone.utc).date()
+            # Lo nuevo desde la ejecución a medias se planifica además de lo adoptado;
+            # un rango nuevo que solape con uno adoptado no repite trabajo, porque
+            # cada chunk vuelve a filtrar BORROWED vencidos con las filas bloqueadas
+            adopt_unfinished_chunks(db, run_id)
+            plan_chunks(db, run_id, today, chunk_size)
+            db.commit()
+
+            chunk_ids = db.execute(
+                select(JobChunk.id)
+                .where(JobChunk.run_id == run_id, JobChunk.status == "pending")
+                .order_by(JobChunk.branch_id, JobChunk.start_id)
+            ).scalars().all()
+            updated, canceled = 0, False
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="overdue") as pool:
+                futures = [pool.submit(process_chunk, chunk_id, today) for chunk_id in chunk_ids]
+                for finished, future in enumerate(as_completed(futures), 1):
+                    updated += future.result()
+                    report_progress(finished / len(futures))
+                    if finished < len(futures) and cancel_requested():
+                        canceled = True
+                        for pending in futures:
+                            pending.cancel()
+                        break
+            if canceled:
+                raise JobCanceled(f"{updated} loans updated before cancel")
+
+            failed = db.execute(
+                select(func.count())
+                .select_from(JobChunk)
+                .where(JobChunk.run_id == run_id, JobChunk.status == "failed")
+            ).scalar()
+            if failed:
+                raise RuntimeError(f"{failed} overdue chunks failed ({updated} loans updated)")
+            return updated
+        finally:
+            lock_conn.execute(select(func.pg_advisory_unlock(OVERDUE_LOCK)))
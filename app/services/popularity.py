@@ -0,0 +1,259 @@
+# app/services/popularity.py
+"""
+Ranking de libros más prestados (GET /api/v1/books/popular).
+
+Todo vive en memoria (por worker): un anillo de buckets horarios con los
+préstamos (BORROWED) por sucursal y libro, más los totales acumulados de cada
+ventana. Responder el top-N no toca la BD: se devuelve una lista ya ordenada
+que solo se recalcula cuando cambian los contadores.
+
+- Arranque: load() reconstruye el anillo con un solo agregado sobre
+  loan_status_history.
+- Cada BORROWED de change_loan_status publica "loan_borrowed:<loan_id>" en el
+  bus de invalidación; cada worker lo suma una vez (deduplicado por préstamo,
+  también contra los préstamos que ya trajo load()).
+- Los avisos que llegan mientras load() reconstruye se reaplican sobre el
+  contador nuevo antes de publicarlo.
+"""
+import heapq
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.invalidation import register_handler
+from app.db.models import Book, Loan, LoanStatus, LoanStatusHistory
+from app.db.session import SessionLocal
+
+BUCKET_SECONDS = 3600
+WINDOWS = {"1d": 86400, "7d": 7 * 86400, "30d": 30 * 86400}
+MAX_TOP = 100
+
+
+class SlidingWindowCounter:
+    """
+    Contadores por ventana deslizante sobre un anillo de buckets.
+
+    add() suma en el bucket de su instante y en los totales de las ventanas
+    que lo cubren; cuando un bucket sale de una ventana, sus cuentas se restan
+    de esa ventana. top() es O(1) mientras nada cambie (resultado cacheado
+    por versión).
+    """
+
+    def __init__(
+        self,
+        windows: dict[str, int] = WINDOWS,
+        bucket_seconds: int = BUCKET_SECONDS,
+        max_top: int = MAX_TOP,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._bucket_seconds = bucket_seconds
+        self._sizes = {name: max(seconds // bucket_seconds, 1) for name, seconds in windows.items()}
+        self._span = max(self._sizes.values())
+        self._max_top = max_top
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        # índice de bucket -> Counter[(branch_id, book_id)]
+        self._buckets: dict[int, Counter] = {}
+        # índice de bucket -> préstamos ya contados (deduplicación)
+        self._bucket_loans: dict[int, set[int]] = defaultdict(set)
+        self._seen_loans: set[int] = set()
+        # ventana -> branch_id (None = todas) -> Counter[book_id]
+        self._totals: dict[str, dict[Optional[int], Counter]] = {
+            name: defaultdict(Counter) for name in self._sizes
+        }
+
+        self._current = self._index(clock())
+        # Último bucket ya descontado de cada ventana
+        self._expired = {name: self._current - size for name, size in self._sizes.items()}
+        self._version = 0
+        self._top_cache: dict[tuple[str, Optional[int]], tuple[int, list[tuple[int, int]]]] = {}
+
+    @property
+    def windows(self) -> tuple[str, ...]:
+        return tuple(self._sizes)
+
+    @property
+    def span_seconds(self) -> int:
+        return self._span * self._bucket_seconds
+
+    def has_loan(self, loan_id: int) -> bool:
+        return loan_id in self._seen_loans
+
+    def _index(self, at: float) -> int:
+        return int(at // self._bucket_seconds)
+
+    def _bump(self, name: str, branch_id: int, book_id: int, count: int) -> None:
+        for key in (None, branch_id):
+            counter = self._totals[name][key]
+            counter[book_id] += count
+            if counter[book_id] <= 0:
+                del counter[book_id]
+
+    def _advance(self, now_index: int) -> None:
+        if now_index <= self._current:
+            return
+        for name, size in self._sizes.items():
+            cutoff = now_index - size
+            for index in sorted(self._buckets):
+                if self._expired[name] < index <= cutoff:
+                    for (branch_id, book_id), count in self._buckets[index].items():
+                        self._bump(name, branch_id, book_id, -count)
+            self._expired[name] = max(self._expired[name], cutoff)
+
+        oldest = now_index - self._span
+        for index in [i for i in self._buckets if i <= oldest]:
+            del self._buckets[index]
+            self._seen_loans.difference_update(self._bucket_loans.pop(index, ()))
+        self._current = now_index
+        self._version += 1
+
+    def add(
+        self,
+        book_id: int,
+        branch_id: int,
+        at: Optional[float] = None,
+        count: int = 1,
+        loan_id: Optional[int] = None,
+        loan_ids: Iterable[int] = (),
+    ) -> bool:
+        """
+        Suma `count` préstamos. Devuelve False si se descartó (viejo o repetido).
+
+        loan_ids: préstamos ya incluidos en `count` (carga inicial), para que
+        un aviso posterior de cualquiera de ellos no se cuente dos veces.
+        """
+        now = self._clock()
+        index = self._index(now if at is None else at)
+        with self._lock:
+            self._advance(self._index(now))
+            if index <= self._current - self._span or index > self._current:
+                return False
+            if loan_id is not None:
+                if loan_id in self._seen_loans:
+                    return False
+                self._seen_loans.add(loan_id)
+                self._bucket_loans[index].add(loan_id)
+            if loan_ids:
+                self._seen_loans.update(loan_ids)
+                self._bucket_loans[index].update(loan_ids)
+
+            self._buckets.setdefault(index, Counter())[(branch_id, book_id)] += count
+            for name in self._sizes:
+                if index > self._expired[name]:
+                    self._bump(name, branch_id, book_id, count)
+            self._version += 1
+            return True
+
+    def top(self, window: str, branch_id: Optional[int] = None, limit: int = 10) -> list[tuple[int, int]]:
+        """[(book_id, préstamos)] de mayor a menor (empate: id menor primero)."""
+        with self._lock:
+            self._advance(self._index(self._clock()))
+            key = (window, branch_id)
+            cached = self._top_cache.get(key)
+            if cached is None or cached[0] != self._version:
+                counts = self._totals[window].get(branch_id) or {}
+                ranking = heapq.nsmallest(self._max_top, counts.items(), key=lambda kv: (-kv[1], kv[0]))
+                cached = (self._version, ranking)
+                self._top_cache[key] = cached
+            return cached[1][:limit]
+
+
+class PopularityIndex:
+    """Ranking por worker: SlidingWindowCounter + título/autor de los libros del top."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counter = SlidingWindowCounter()
+        self._books: dict[int, tuple[str, Optional[str]]] = {}
+        self._stale = True
+        # Una lista por load() en curso: avisos recibidos durante la reconstrucción
+        self._replays: list[list[tuple[int, int, int, float]]] = []
+
+    def load(self, db: Session) -> None:
+        """Reconstruye los contadores desde loan_status_history (un solo agregado)."""
+        counter = SlidingWindowCounter()
+        since = time.time() - counter.span_seconds
+        bucket = func.floor(func.extract("epoch", LoanStatusHistory.changed_at) / BUCKET_SECONDS).label("bucket")
+        replay: list[tuple[int, int, int, float]] = []
+        with self._lock:
+            self._replays.append(replay)
+        try:
+            rows = db.execute(
+                select(bucket, Loan.branch_id, Loan.book_id, func.count(), func.array_agg(Loan.id))
+                .join(Loan, Loan.id == LoanStatusHistory.loan_id)
+                .where(
+                    LoanStatusHistory.new_status == LoanStatus.BORROWED,
+                    LoanStatusHistory.changed_at >= func.to_timestamp(since),
+                )
+                .group_by(bucket, Loan.branch_id, Loan.book_id)
+            )
+            for bucket_index, branch_id, book_id, count, loan_ids in rows:
+                counter.add(book_id, branch_id, at=int(bucket_index) * BUCKET_SECONDS, count=count, loan_ids=loan_ids)
+        except BaseException:
+            with self._lock:
+                self._replays.remove(replay)
+            raise
+
+        with self._lock:
+            self._replays.remove(replay)
+            # Lo que llegó después de la consulta; lo ya incluido se descarta por loan_id
+            for loan_id, book_id, branch_id, at in replay:
+                counter.add(book_id, branch_id, at=at, loan_id=loan_id)
+            self.counter = counter
+            self._stale = False
+
+    def record_borrow(self, loan_id: Optional[int]) -> None:
+        """Handler de "loan_borrowed:<id>" (None = reconexión del bus: recargar)."""
+        if loan_id is None:
+            self._stale = True
+            return
+        if self.counter.has_loan(loan_id):
+            return  # ya aplicado (commit local + NOTIFY propio)
+        with SessionLocal() as db:
+            row = db.execute(select(Loan.book_id, Loan.branch_id).where(Loan.id == loan_id)).first()
+        if row is None:
+            return
+        at = time.time()
+        with self._lock:
+            self.counter.add(row.book_id, row.branch_id, at=at, loan_id=loan_id)
+            for replay in self._replays:
+                replay.append((loan_id, row.book_id, row.branch_id, at))
+
+    def forget_book(self, book_id: Optional[int]) -> None:
+        """Handler de "book:<id>": el título/autor cacheado puede haber cambiado."""
+        with self._lock:
+            if book_id is None:
+                self._books.clear()
+            else:
+                self._books.pop(book_id, None)
+
+    def top(self, db: Session, window: str, branch_id: Optional[int] = None, limit: int = 10) -> list[dict]:
+        if self._stale:
+            self.load(db)
+        ranking = self.counter.top(window, branch_id, limit)
+
+        missing = [book_id for book_id, _ in ranking if book_id not in self._books]
+        if missing:
+            rows = db.execute(select(Book.id, Book.title, Book.author).where(Book.id.in_(missing)))
+            with self._lock:
+                for book_id, title, author in rows:
+                    self._books[book_id] = (title, author)
+
+        result = []
+        for book_id, count in ranking:
+            meta = self._books.get(book_id)
+            if meta is None:
+                continue  # libro borrado
+            result.append({"book_id": book_id, "title": meta[0], "author": meta[1], "borrow_count": count})
+        return result
+
+
+popularity_index = PopularityIndex()
+
+register_handler("loan_borrowed", popularity_index.record_borrow)
+register_handler("book", popularity_index.forget_book)
@@ -0,0 +1,256 @@
+# app/services/related_books.py
+"""
+"Quienes tomaron este libro también tomaron..." (GET /api/v1/books/{id}/related).
+
+Batch (build_related):
+    Co-ocurrencias miembro × libro desde `loans` y `loans_archive` calculadas
+    con NumPy en lote.
+    La similitud es coseno: miembros en común / sqrt(miembros_a * miembros_b).
+    El top-K por libro se guarda en book_related. Las ejecuciones incrementales
+    solo recalculan los libros de los miembros con préstamos nuevos desde el
+    último watermark (related_builds).
+
+Online (related_index):
+    Cada worker carga book_related en arrays (estilo CSR) y responde sin tocar
+    `loans`. El job publica "related_books" en el bus de invalidación y los
+    workers recargan en la siguiente lectura.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.core.invalidation import publish, register_handler
+from app.db.models import BookRelated, Loan, RelatedBuild
+from app.services.archival import all_loans
+
+TOP_K = 20
+
+# Un préstamo solo cuenta para el watermark si se creó hace más de esto:
+# una transacción más lenta con un id menor todavía podría no ser visible.
+SETTLE_WINDOW = timedelta(minutes=1)
+
+_INSERT_CHUNK = 10_000
+
+
+# ======================
+# Cálculo (NumPy)
+# ======================
+
+def compute_top_k(
+    pairs: np.ndarray,
+    support_ids: np.ndarray,
+    support_counts: np.ndarray,
+    only_books: Optional[Iterable[int]] = None,
+    top_k: int = TOP_K,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Top-K de vecinos por libro a partir de pares (member_id, book_id) distintos.
+
+    - support_ids / support_counts: miembros distintos por libro (ids ordenados),
+      cubriendo todos los libros que aparecen en `pairs`.
+    - only_books: si se indica, solo se calculan esas filas.
+
+    Devuelve arrays paralelos (book_id, rank, related_book_id, score).
+    """
+    empty = (
+        np.empty(0, np.int64),
+        np.empty(0, np.int64),
+        np.empty(0, np.int64),
+        np.empty(0, np.float32),
+    )
+    if len(pairs) == 0:
+        return empty
+
+    book_ids, book_idx = np.unique(pairs[:, 1], return_inverse=True)
+    n = len(book_ids)
+    order = np.argsort(pairs[:, 0], kind="stable")
+    members, books = pairs[order, 0], book_idx[order]
+    groups = np.split(books, np.flatnonzero(np.diff(members)) + 1)
+
+    row_mask = None
+    if only_books is not None:
+        row_mask = np.isin(book_ids, np.fromiter(only_books, dtype=np.int64))
+
+    # Cada miembro aporta todos los pares (i, j) de sus libros, codificados i*n+j
+    chunks = []
+    for group in groups:
+        if len(group) < 2:
+            continue
+        left = group if row_mask is None else group[row_mask[group]]
+        if len(left) == 0:
+            continue
+        i = np.repeat(left, len(group))
+        j = np.tile(group, len(left))
+        keep = i != j
+        chunks.append(i[keep] * n + j[keep])
+    if not chunks:
+        return empty
+
+    codes, together = np.unique(np.concatenate(chunks), return_counts=True)
+    rows, cols = np.divmod(codes, n)
+
+    support = support_counts[np.searchsorted(support_ids, book_ids)].astype(np.float64)
+    scores = together / np.sqrt(support[rows] * support[cols])
+
+    # Por fila: score descendente y, a igualdad, id de libro ascendente
+    order = np.lexsort((book_ids[cols], -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side="left")
+    keep = rank < top_k
+    return (
+        book_ids[rows[keep]],
+        rank[keep],
+        book_ids[cols[keep]],
+        scores[keep].astype(np.float32),
+    )
+
+
+def _pairs(db: Session, stmt) -> np.ndarray:
+    return np.array(db.execute(stmt).all(), dtype=np.int64).reshape(-1, 2)
+
+
+# ======================
+# Job batch
+# ======================
+
+def _settled_loan_id(db: Session) -> int:
+    cutoff = datetime.now(timezone.utc) - SETTLE_WINDOW
+    return db.execute(select(func.coalesce(func.max(Loan.id), 0)).where(Loan.created_at < cutoff)).scalar()
+
+
+def build_related(db: Session, full: bool = False) -> dict:
+    """
+    Recalcula book_related. Incremental por defecto (completo si se pide o si
+    nunca se ejecutó). Devuelve un resumen de la ejecución.
+    """
+    last = db.execute(select(RelatedBuild).order_by(RelatedBuild.id.desc()).limit(1)).scalar()
+    if last is None:
+        full = True
+    through = _settled_loan_id(db)
+
+    # Los archivados siguen contando (archivar no es borrar)
+    loans = all_loans("id", "member_id", "book_id")
+    if full:
+        pairs = _pairs(db, select(loans.c.member_id, loans.c.book_id).distinct())
+        support_ids, support_counts = np.unique(pairs[:, 1], return_counts=True)
+        only = None
+    else:
+        new_members = select(loans.c.member_id).where(loans.c.id > last.through_loan_id).distinct()
+        affected = set(
+            db.execute(select(loans.c.book_id).where(loans.c.member_id.in_(new_members)).distinct()).scalars()
+        )
+        if not affected:
+            return {"mode": "incremental", "books_updated": 0, "through_loan_id": last.through_loan_id}
+
+        # Todos los miembros que comparten algún libro con los afectados
+        related_members = select(loans.c.member_id).where(loans.c.book_id.in_(affected)).distinct()
+        pairs = _pairs(
+            db,
+            select(loans.c.member_id, loans.c.book_id).where(loans.c.member_id.in_(related_members)).distinct(),
+        )
+        candidate_books = np.unique(pairs[:, 1]).tolist()
+        support_rows = db.execute(
+            select(loans.c.book_id, func.count(func.distinct(loans.c.member_id)))
+            .where(loans.c.book_id.in_(candidate_books))
+            .group_by(loans.c.book_id)
+            .order_by(loans.c.book_id)
+        ).all()
+        support_ids = np.array([r[0] for r in support_rows], dtype=np.int64)
+        support_counts = np.array([r[1] for r in support_rows], dtype=np.int64)
+        only = affected
+
+    book_col, rank_col, related_col, score_col = compute_top_k(pairs, support_ids, support_counts, only)
+
+    build = RelatedBuild(mode="full" if full else "incremental", through_loan_id=through)
+    db.add(build)
+
+    if full:
+        db.execute(delete(BookRelated))
+        updated = len(support_ids)
+    else:
+        db.execute(delete(BookRelated).where(BookRelated.book_id.in_(only)))
+        updated = len(only)
+
+    rows = [
+        {"book_id": int(b), "rank": int(r), "related_book_id": int(o), "score": float(s)}
+        for b, r, o, s in zip(book_col, rank_col, related_col, score_col)
+    ]
+    for start in range(0, len(rows), _INSERT_CHUNK):
+        db.execute(BookRelated.__table__.insert(), rows[start:start + _INSERT_CHUNK])
+
+    build.books_updated = updated
+    build.finished_at = datetime.now(timezone.utc)
+    publish(db, "related_books")
+    db.commit()
+    return {"mode": build.mode, "books_updated": updated, "through_loan_id": through}
+
+
+# ======================
+# Índice online
+# ======================
+
+class RelatedIndex:
+    """
+    book_related en arrays compactos (por worker):
+
+        book_ids[k]                       libro de la fila k (ordenado)
+        neighbors[indptr[k]:indptr[k+1]]  sus vecinos por rank
+        scores[...]                       similitud de cada vecino
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stale = True
+        self._arrays = (
+            np.empty(0, np.int32),
+            np.zeros(1, np.int64),
+            np.empty(0, np.int32),
+            np.empty(0, np.float32),
+        )
+
+    def invalidate(self, _entity_id: Optional[int] = None) -> None:
+        self._stale = True
+
+    def load(self, db: Session) -> None:
+        self._stale = False
+        rows = np.array(
+            db.execute(
+                select(BookRelated.book_id, BookRelated.related_book_id, BookRelated.score)
+                .order_by(BookRelated.book_id, BookRelated.rank)
+            ).all(),
+            dtype=np.float64,
+        ).reshape(-1, 3)
+        book_ids, counts = np.unique(rows[:, 0].astype(np.int32), return_counts=True)
+        arrays = (
+            book_ids,
+            np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+            rows[:, 1].astype(np.int32),
+            rows[:, 2].astype(np.float32),
+        )
+        with self._lock:
+            self._arrays = arrays
+
+    def lookup(self, db: Session, book_id: int, limit: int = 10) -> list[tuple[int, float]]:
+        if self._stale:
+            self.load(db)
+        book_ids, indptr, neighbors, scores = self._arrays
+        k = int(np.searchsorted(book_ids, book_id))
+        if k >= len(book_ids) or book_ids[k] != book_id:
+            return []
+        start, end = indptr[k], min(indptr[k + 1], indptr[k] + limit)
+        return [(int(n), float(s)) for n, s in zip(neighbors[start:end], scores[start:end])]
+
+    def memory_bytes(self) -> int:
+        return sum(array.nbytes for array in self._arrays)
+
+    def stats(self) -> dict:
+        return {"name": "related", "entries": len(self._arrays[0]), "memory_bytes": self.memory_bytes()}
+
+
+related_index = RelatedIndex()
+
+register_handler("related_books", related_index.invalidate)
@@ -0,0 +1,69 @@
+"""
+Tareas de mantenimiento y sus horarios. Quedan registradas en app.core.jobs,
+así que también se pueden lanzar a mano (POST /admin/jobs/{name}, CLI).
+
+Todas son idempotentes: si una ejecución falla o se salta (cambio de
+líder), la siguiente recupera el trabajo pendiente.
+"""
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.jobs import reap_stale_jobs, register_job
+from app.core.scheduler import Scheduler
+from app.services.analytics_service import refresh_daily_rollups
+from app.services.archival import archive_closed_loans
+from app.services.fees import refresh_late_fees
+from app.services.history_retention import purge_history
+from app.services.inventory_service import reconcile_inventory
+from app.services.overdue_job import process_overdue
+from app.services.related_books import build_related
+from app.services.stats_service import reconcile_stats
+
+
+def _build_related(db: Session) -> dict:
+    result = build_related(db)
+    return {"rows_affected": result["books_updated"], **result}
+
+
+def _reconcile_stats(db: Session) -> dict:
+    result = reconcile_stats(db)
+    return {"rows_affected": len(result["drift"]), **result}
+
+
+def _reconcile_inventory(db: Session) -> dict:
+    result = reconcile_inventory(db, apply=True)
+    # El detalle completo puede ser enorme tras un incidente: basta una muestra
+    return {"rows_affected": result["fixed"], **result, "drift": result["drift"][:100]}
+
+
+# nombre -> (cron UTC, tarea)
+SCHEDULE = {
+    # Préstamos BORROWED vencidos -> OVERDUE (con multa), por chunks reanudables
+    "overdue": ("*/15 * * * *", process_overdue),
+    # late_fee_amount de los préstamos abiertos al día que empieza (filas = préstamos)
+    "refresh-late-fees": ("5 0 * * *", refresh_late_fees),
+    # Días cerrados de /admin/analytics (solo los que falten)
+    "rollup-analytics": ("10 * * * *", refresh_daily_rollups),
+    # Libros relacionados, incremental
+    "build-related": ("30 3 * * *", _build_related),
+    # Deriva de los contadores de /admin/stats (filas = contadores corregidos)
+    "reconcile-stats": ("0 4 * * *", _reconcile_stats),
+    # Deriva de books.available_copies respecto a los préstamos (filas = libros corregidos)
+    "reconcile-inventory": ("30 4 * * *", _reconcile_inventory),
+    # Particiones de loan_status_history y préstamos cerrados antiguos -> loans_archive
+    "archive-loans": ("0 5 * * *", archive_closed_loans),
+    # loan_status_history fuera de la retención -> resumen por préstamo (filas = transiciones borradas)
+    "purge-history": ("30 5 * * *", purge_history),
+    # Tareas sin latido de su worker: running -> interrupted, queued -> se vuelven a encolar
+    "reap-jobs": ("*/5 * * * *", reap_stale_jobs),
+}
+
+for _name, (_, _fn) in SCHEDULE.items():
+    register_job(_name, _fn)
+
+
+def build_scheduler(engine: Engine) -> Scheduler:
+    scheduler = Scheduler(engine)
+    for name, (cron, fn) in SCHEDULE.items():
+        scheduler.add_job(name, cron, fn)
+    return scheduler
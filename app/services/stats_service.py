@@ -0,0 +1,326 @@
+# app/services/stats_service.py
+"""
+Contadores materializados para /admin/stats.
+
+Cada flush que inserta, modifica o borra User / Book / Loan acumula deltas
+(usuarios por rol, préstamos por estado, copias, préstamos creados por
+sucursal y día) y los aplica con un upsert al final del mismo flush, dentro
+de la misma transacción: si la escritura hace rollback, los contadores también.
+
+Las actualizaciones masivas (query.update / query.delete) no pasan por estos
+eventos; quien las use debe ajustar los contadores o ejecutar reconcile_stats().
+
+Los jobs por lotes envuelven la transacción en deferred_counters(): el upsert
+bloquea las filas de contadores hasta el commit, y con un upsert por flush
+las tendrían tomadas todo el lote, frenando a las transiciones de la API.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import Date, cast, delete, event, func, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, attributes, object_session
+
+from app.db.models import Book, Loan, LoanDailyStat, LoanStatus, StatsCounter, User, UserRole
+from app.services.archival import all_loans
+
+BOOK_TITLES = "books.titles"
+BOOK_TOTAL_COPIES = "books.total_copies"
+BOOK_AVAILABLE_COPIES = "books.available_copies"
+
+ACTIVE_LOAN_STATUSES = (
+    LoanStatus.REQUESTED,
+    LoanStatus.APPROVED,
+    LoanStatus.BORROWED,
+    LoanStatus.OVERDUE,
+)
+
+
+def role_counter(role: Any) -> str:
+    return f"users.role.{UserRole(role).name}"
+
+
+def status_counter(status: Any) -> str:
+    return f"loans.status.{LoanStatus(status).name}"
+
+
+def _utc_day(value: Optional[datetime]) -> date:
+    if value is None:
+        return datetime.now(timezone.utc).date()
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+# ======================
+# Mantenimiento incremental
+# ======================
+
+def _pending(session: Session) -> tuple[dict, dict]:
+    deltas = session.info.get("stats_deltas")
+    if deltas is None:
+        deltas = session.info["stats_deltas"] = (defaultdict(int), defaultdict(int))
+    return deltas
+
+
+def _change(target: Any, attr: str) -> Optional[tuple[Any, Any]]:
+    """(anterior, nuevo) si `attr` cambió en este flush."""
+    history = attributes.get_history(target, attr)
+    if not history.added:
+        return None
+    old = history.deleted[0] if history.deleted else None
+    return old, history.added[0]
+
+
+def _count_row(session: Session, target: Any, sign: int) -> None:
+    counters, daily = _pending(session)
+    if isinstance(target, User):
+        counters[role_counter(target.role)] += sign
+    elif isinstance(target, Book):
+        counters[BOOK_TITLES] += sign
+        counters[BOOK_TOTAL_COPIES] += sign * (target.total_copies or 0)
+        counters[BOOK_AVAILABLE_COPIES] += sign * (target.available_copies or 0)
+    elif isinstance(target, Loan):
+        counters[status_counter(target.status)] += sign
+        daily[(_utc_day(target.created_at), target.branch_id)] += sign
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_deletes(session: Session, flush_context, instances) -> None:
+    # Deltas de un flush anterior que falló: su transacción ya no es válida
+    session.info.pop("stats_deltas", None)
+    # Los borrados se leen antes del DELETE, mientras la fila aún existe
+    for obj in session.deleted:
+        _count_row(session, obj, -1)
+
+
+def _on_insert(mapper, connection, target) -> None:
+    _count_row(object_session(target), target, +1)
+
+
+def _on_update(mapper, connection, target) -> None:
+    counters, _ = _pending(object_session(target))
+    if isinstance(target, User):
+        change = _change(target, "role")
+        if change and change[0] is not None:
+            counters[role_counter(change[0])] -= 1
+            counters[role_counter(change[1])] += 1
+    elif isinstance(target, Book):
+        for attr, name in (
+            ("total_copies", BOOK_TOTAL_COPIES),
+            ("available_copies", BOOK_AVAILABLE_COPIES),
+        ):
+            change = _change(target, attr)
+            if change:
+                counters[name] += (change[1] or 0) - (change[0] or 0)
+    elif isinstance(target, Loan):
+        change = _change(target, "status")
+        if change and change[0] is not None:
+            counters[status_counter(change[0])] -= 1
+            counters[status_counter(change[1])] += 1
+
+
+for _model in (User, Book, Loan):
+    event.listen(_model, "after_insert", _on_insert)
+    event.listen(_model, "after_update", _on_update)
+
+
+def _upsert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:  # pragma: no cover - solo se despliega sobre PostgreSQL
+        raise NotImplementedError(f"stats upsert not supported on {dialect_name}")
+    return insert
+
+
+def apply_deltas(connection: Connection, counters: dict, daily: dict) -> None:
+    """
+    Suma los deltas con INSERT ... ON CONFLICT DO UPDATE.
+
+    Las filas se envían ordenadas por clave: dos transacciones que tocan los
+    mismos contadores toman los locks en el mismo orden y no se bloquean en cruz.
+    """
+    insert = _upsert(connection.dialect.name)
+
+    rows = [{"name": name, "value": delta} for name, delta in sorted(counters.items()) if delta]
+    if rows:
+        table = StatsCounter.__table__
+        stmt = insert(table).values(rows)
+        connection.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={"value": table.c.value + stmt.excluded.value},
+            )
+        )
+
+    rows = [
+        {"day": day, "branch_id": branch_id, "loans_created": delta}
+        for (day, branch_id), delta in sorted(daily.items())
+        if delta
+    ]
+    if rows:
+        table = LoanDailyStat.__table__
+        stmt = insert(table).values(rows)
+        connection.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.day, table.c.branch_id],
+                set_={"loans_created": table.c.loans_created + stmt.excluded.loans_created},
+            )
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_pending(session: Session, flush_context) -> None:
+    deltas = session.info.pop("stats_deltas", None)
+    if not deltas:
+        return
+    deferred = session.info.get("stats_deferred")
+    if deferred is None:
+        apply_deltas(session.connection(), *deltas)
+        return
+    for pending, new in zip(deferred, deltas):
+        for key, delta in new.items():
+            pending[key] += delta
+
+
+@contextmanager
+def deferred_counters(session: Session) -> Iterator[None]:
+    """
+    Acumula los deltas de todos los flush del bloque y los aplica en un solo
+    upsert al salir. Quien lo usa hace commit enseguida: los locks de
+    stats_counters duran solo ese tramo final. Si el bloque falla, los deltas
+    se descartan (la transacción hará rollback).
+    """
+    deferred = session.info["stats_deferred"] = (defaultdict(int), defaultdict(int))
+    try:
+        yield
+        session.flush()
+        apply_deltas(session.connection(), *deferred)
+    finally:
+        session.info.pop("stats_deferred", None)
+
+
+# ======================
+# Lectura
+# ======================
+
+def read_counters(db: Session) -> dict[str, int]:
+    """Todos los contadores globales (una consulta sobre una tabla pequeña)."""
+    return {name: int(value) for name, value in db.execute(select(StatsCounter.name, StatsCounter.value))}
+
+
+def loans_created_since(db: Session, since: date) -> int:
+    total = db.execute(
+        select(func.coalesce(func.sum(LoanDailyStat.loans_created), 0)).where(LoanDailyStat.day >= since)
+    ).scalar()
+    return int(total or 0)
+
+
+# ======================
+# Reconciliación
+# ======================
+
+def _loan_day_expr(dialect_name: str, created_at=Loan.created_at):
+    if dialect_name == "postgresql":
+        return cast(func.timezone("UTC", created_at), Date)
+    return func.date(created_at)
+
+
+def compute_counters(db: Session) -> tuple[dict[str, int], dict[tuple[date, int], int]]:
+    """Recalcula todos los contadores desde las tablas base (scan completo)."""
+    counters: dict[str, int] = {role_counter(role): 0 for role in UserRole}
+    counters.update({status_counter(s): 0 for s in LoanStatus})
+
+    for role, count in db.execute(select(User.role, func.count()).group_by(User.role)):
+        counters[role_counter(role)] = count
+    # Los archivados siguen contando (archivar no es borrar)
+    loans = all_loans("status", "branch_id", "created_at")
+    for loan_status, count in db.execute(select(loans.c.status, func.count()).group_by(loans.c.status)):
+        counters[status_counter(loan_status)] = count
+
+    titles, total_copies, available_copies = db.execute(
+        select(
+            func.count(Book.id),
+            func.coalesce(func.sum(Book.total_copies), 0),
+            func.coalesce(func.sum(Book.available_copies), 0),
+        )
+    ).one()
+    counters[BOOK_TITLES] = int(titles)
+    counters[BOOK_TOTAL_COPIES] = int(total_copies)
+    counters[BOOK_AVAILABLE_COPIES] = int(available_copies)
+
+    day = _loan_day_expr(db.get_bind().dialect.name, loans.c.created_at).label("day")
+    daily_rows = db.execute(
+        select(day, loans.c.branch_id, func.count()).group_by(day, loans.c.branch_id)
+    )
+    daily = {(_as_date(row_day), branch_id): count for row_day, branch_id, count in daily_rows}
+    return counters, daily
+
+
+def _as_date(value: Any) -> date:
+    # SQLite devuelve func.date() como texto
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _daily_name(day: date, branch_id: int) -> str:
+    return f"loans.daily.{branch_id}.{day.isoformat()}"
+
+
+def reconcile_stats(db: Session, apply: bool = True) -> dict:
+    """
+    Reconstruye los contadores desde cero e informa la deriva encontrada.
+
+    En PostgreSQL bloquea las tablas de contadores (EXCLUSIVE) antes de contar:
+    las escrituras concurrentes esperan en su upsert, así que el recálculo y
+    los deltas que lleguen después nunca se pisan.
+
+    Con apply=False solo informa (no modifica nada).
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        db.execute(text("LOCK TABLE stats_counters, loan_daily_stats IN EXCLUSIVE MODE"))
+
+    expected, expected_daily = compute_counters(db)
+    stored = read_counters(db)
+    stored_daily = {
+        (row.day, row.branch_id): row.loans_created
+        for row in db.execute(select(LoanDailyStat.day, LoanDailyStat.branch_id, LoanDailyStat.loans_created))
+    }
+
+    drift = [
+        {"counter": name, "stored": stored.get(name, 0), "actual": expected.get(name, 0)}
+        for name in sorted(set(expected) | set(stored))
+        if stored.get(name, 0) != expected.get(name, 0)
+    ]
+    drift += [
+        {"counter": _daily_name(*key), "stored": stored_daily.get(key, 0), "actual": expected_daily.get(key, 0)}
+        for key in sorted(set(expected_daily) | set(stored_daily))
+        if stored_daily.get(key, 0) != expected_daily.get(key, 0)
+    ]
+
+    if apply and drift:
+        db.execute(delete(StatsCounter))
+        db.execute(delete(LoanDailyStat))
+        db.execute(
+            StatsCounter.__table__.insert(),
+            [{"name": name, "value": value} for name, value in sorted(expected.items())],
+        )
+        if expected_daily:
+            db.execute(
+                LoanDailyStat.__table__.insert(),
+                [
+                    {"day": day, "branch_id": branch_id, "loans_created": count}
+                    for (day, branch_id), count in sorted(expected_daily.items())
+                ],
+            )
+    db.commit()
+
+    return {
+        "checked": len(set(expected) | set(stored)) + len(set(expected_daily) | set(stored_daily)),
+        "drift": drift,
+        "applied": bool(apply and drift),
+    }
@@ -0,0 +1,400 @@
+# app/services/suggest_index.py
+"""
+Autocompletado de títulos y autores (GET /api/v1/books/suggest?q=).
+
+Índice de prefijos en memoria (por worker), compacto:
+
+- Todos los títulos y autores normalizados (minúsculas, sin tildes ni
+  signos) van en un único buffer de bytes, separados por \\0.
+- `positions[tier]` guarda, ordenadas por el texto que empieza en ellas, las
+  posiciones de inicio de cada palabra de ese tier de relevancia: buscar un
+  prefijo es un bisect por tier (estilo suffix array, solo en inicios de
+  palabra) y cada tier se recorre solo hasta juntar `limit` libros.
+- Títulos / autores originales para mostrar van en otro buffer.
+
+Los cambios (create/update/delete) no reconstruyen el índice: van a un
+overlay pequeño, ya normalizado y ordenado por tier como la base, que se
+consulta junto con ella y se compacta en segundo plano cuando crece. Las
+escrituras publican "book_text:<id>" en el bus de invalidación para que
+todos los workers apliquen el cambio.
+"""
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.invalidation import register_handler
+from app.core.logging import get_logger
+from app.db.models import Book
+from app.db.session import SessionLocal
+
+logger = get_logger("services.suggest_index")
+
+MAX_WORDS_PER_FIELD = 16
+# Tamaño del overlay a partir del cual se reconstruye la base
+COMPACT_THRESHOLD = 2_000
+
+TITLE, AUTHOR = 0, 1
+TIERS = 4
+_SEP = b"\0"
+_DISPLAY_SEP = "\x1f"
+
+
+# Camino rápido para texto ASCII (la mayoría): signos -> espacio con translate()
+_ASCII_PUNCTUATION = str.maketrans({chr(c): " " for c in range(128) if not chr(c).isalnum()})
+
+
+def normalize(text: Optional[str]) -> str:
+    """Minúsculas, sin tildes y con cualquier signo convertido en espacio."""
+    if not text:
+        return ""
+    if text.isascii():
+        text = text.translate(_ASCII_PUNCTUATION)
+    else:
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(
+            ch if ch.isalnum() else " "
+            for ch in decomposed
+            if not unicodedata.combining(ch)
+        )
+    return " ".join(text.casefold().split())
+
+
+def _word_offsets(normalized: str) -> list[int]:
+    """Offsets (en bytes UTF-8) de las primeras palabras de un texto normalizado."""
+    offsets, position = [], 0
+    for word in normalized.split(" ")[:MAX_WORDS_PER_FIELD]:
+        offsets.append(position)
+        position += len(word.encode("utf-8")) + 1
+    return offsets
+
+
+def _tier(field: int, at_start: bool) -> int:
+    # título desde el inicio > palabra del título > autor desde el inicio > palabra del autor
+    return field * 2 + (0 if at_start else 1)
+
+
+def _word_entries(fields: tuple[str, Optional[str]]) -> Iterable[tuple[int, bytes]]:
+    """(tier, texto normalizado desde cada palabra) de un título y su autor."""
+    for field, value in zip((TITLE, AUTHOR), fields):
+        normalized = normalize(value)
+        if not normalized:
+            continue
+        encoded = normalized.encode("utf-8")
+        for offset in _word_offsets(normalized):
+            yield _tier(field, offset == 0), encoded[offset:]
+
+
+class PrefixIndex:
+    """Índice inmutable: se construye de una vez a partir de (id, título, autor)."""
+
+    def __init__(self, books: Iterable[tuple[int, str, Optional[str]]]) -> None:
+        text = bytearray()
+        display = bytearray()
+        self.book_ids = array("i")
+        self.display_starts = array("I")
+        self.record_starts = array("I")   # inicio de cada título / autor en `text`
+        self.record_books = array("I")    # índice del libro de cada registro
+        self.record_fields = array("B")   # TITLE / AUTHOR
+        entries = []                      # (texto desde la palabra, posición, registro, tier)
+
+        for book_id, title, author in books:
+            k = len(self.book_ids)
+            self.book_ids.append(book_id)
+            self.display_starts.append(len(display))
+            display += f"{title}{_DISPLAY_SEP}{author or ''}".encode("utf-8")
+
+            for field, value in ((TITLE, title), (AUTHOR, author)):
+                normalized = normalize(value)
+                if not normalized:
+                    continue
+                encoded = normalized.encode("utf-8")
+                start = len(text)
+                record = len(self.record_starts)
+                self.record_starts.append(start)
+                self.record_books.append(k)
+                self.record_fields.append(field)
+                entries.extend(
+                    (encoded[offset:], start + offset, record, _tier(field, offset == 0))
+                    for offset in _word_offsets(normalized)
+                )
+                text += encoded + _SEP
+
+        self.display_starts.append(len(display))
+        self.text = bytes(text)
+        self.display = bytes(display)
+
+        entries.sort()
+        self.positions = tuple(array("I") for _ in range(TIERS))
+        self.position_records = tuple(array("I") for _ in range(TIERS))
+        for _, position, record, tier in entries:
+            self.positions[tier].append(position)
+            self.position_records[tier].append(record)
+
+    def __len__(self) -> int:
+        return len(self.book_ids)
+
+    def book_text(self, k: int) -> tuple[str, Optional[str]]:
+        raw = self.display[self.display_starts[k]:self.display_starts[k + 1]].decode("utf-8")
+        title, _, author = raw.partition(_DISPLAY_SEP)
+        return title, author or None
+
+    def books(self) -> Iterable[tuple[int, str, Optional[str]]]:
+        for k, book_id in enumerate(self.book_ids):
+            yield (book_id, *self.book_text(k))
+
+    def search(self, prefix: bytes, skip, limit: int) -> list[tuple[int, bytes, int, int]]:
+        """
+        Los `limit` mejores libros (tier, texto, book_id, k) con alguna palabra
+        que empieza por `prefix`, sin los de `skip`: cada libro una vez, en su
+        mejor tier, y dentro del tier en orden alfabético.
+        """
+        size = len(prefix)
+        buffer = self.text
+        found, seen = [], set()
+        for tier in range(TIERS):
+            positions, records = self.positions[tier], self.position_records[tier]
+            index = bisect_left(positions, prefix, key=lambda p: buffer[p:p + size])
+            while index < len(positions) and len(found) < limit:
+                p = positions[index]
+                if buffer[p:p + size] != prefix:
+                    break
+                k = self.record_books[records[index]]
+                index += 1
+                book_id = self.book_ids[k]
+                if book_id in skip or book_id in seen:
+                    continue
+                seen.add(book_id)
+                found.append((tier, buffer[p:buffer.index(_SEP, p)], book_id, k))
+            if len(found) >= limit:
+                break
+        return found
+
+    def memory_bytes(self) -> int:
+        arrays = (
+            self.book_ids,
+            self.display_starts,
+            self.record_starts,
+            self.record_books,
+            self.record_fields,
+            *self.positions,
+            *self.position_records,
+        )
+        return len(self.text) + len(self.display) + sum(a.itemsize * len(a) for a in arrays)
+
+
+Fields = tuple[str, Optional[str]]
+
+
+class Overlay:
+    """
+    Cambios posteriores a la base, inmutable: cada cambio crea uno nuevo
+    (las escrituras son pocas; las consultas no copian nada).
+
+    changes[book_id] = (seq, (título, autor)) si el libro se creó/modificó
+    después de construir la base, o (seq, None) si se borró. `entries[tier]`
+    tiene (texto normalizado, book_id) ordenado, igual que la base.
+    """
+
+    def __init__(
+        self,
+        changes: Optional[dict[int, tuple[int, Optional[Fields]]]] = None,
+        entries: Optional[tuple[list[tuple[bytes, int]], ...]] = None,
+    ) -> None:
+        self.changes = changes or {}
+        if entries is None:
+            entries = tuple([] for _ in range(TIERS))
+            for book_id, (_, fields) in self.changes.items():
+                for tier, text in _word_entries(fields) if fields else ():
+                    entries[tier].append((text, book_id))
+            for tier_entries in entries:
+                tier_entries.sort()
+        self.entries = entries
+
+    def __len__(self) -> int:
+        return len(self.changes)
+
+    def with_change(self, book_id: int, seq: int, fields: Optional[Fields]) -> "Overlay":
+        changes = dict(self.changes)
+        previous = changes.get(book_id)
+        changes[book_id] = (seq, fields)
+        entries = tuple(
+            [e for e in tier_entries if e[1] != book_id] if previous and previous[1] else list(tier_entries)
+            for tier_entries in self.entries
+        )
+        for tier, text in _word_entries(fields) if fields else ():
+            insort(entries[tier], (text, book_id))
+        return Overlay(changes, entries)
+
+    def since(self, upto_seq: int) -> "Overlay":
+        """Solo los cambios posteriores a `upto_seq` (tras reconstruir la base)."""
+        return Overlay({k: v for k, v in self.changes.items() if v[0] > upto_seq})
+
+    def search(self, prefix: bytes, limit: int) -> list[tuple[int, bytes, int, Fields]]:
+        """Como PrefixIndex.search, sobre los libros creados / modificados."""
+        found, seen = [], set()
+        for tier, tier_entries in enumerate(self.entries):
+            index = bisect_left(tier_entries, (prefix,))
+            while index < len(tier_entries) and len(found) < limit:
+                text, book_id = tier_entries[index]
+                if not text.startswith(prefix):
+                    break
+                index += 1
+                if book_id in seen:
+                    continue
+                seen.add(book_id)
+                found.append((tier, text, book_id, self.changes[book_id][1]))
+            if len(found) >= limit:
+                break
+        return found
+
+
+class SuggestIndex:
+    """
+    PrefixIndex base + Overlay de cambios recientes.
+
+    Las reconstrucciones (carga inicial desde books y compactación del
+    overlay) corren en un hilo aparte y se publican con un swap atómico;
+    mientras tanto se sigue respondiendo con la base anterior. Hasta la
+    primera carga, suggest() cae a una consulta de prefijo en la BD.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._base = PrefixIndex(())
+        self._overlay = Overlay()
+        self._seq = 0
+        self._building = False
+        self.ready = threading.Event()
+
+    # --- construcción ---
+
+    def _swap(self, base: PrefixIndex, upto_seq: int) -> None:
+        with self._lock:
+            self._base = base
+            # Se conservan los cambios que llegaron mientras se construía
+            self._overlay = self._overlay.since(upto_seq)
+        self.ready.set()
+
+    def load(self, db: Session) -> None:
+        """Construye el índice completo desde books (bloqueante)."""
+        with self._lock:
+            upto_seq = self._seq
+        rows = db.execute(select(Book.id, Book.title, Book.author).order_by(Book.id)).all()
+        self._swap(PrefixIndex(rows), upto_seq)
+
+    def _rebuild_async(self, from_db: bool) -> None:
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            upto_seq = self._seq
+            base, overlay = self._base, self._overlay.changes
+
+        def run() -> None:
+            try:
+                if from_db:
+                    with SessionLocal() as db:
+                        self.load(db)
+                    return
+                merged = [b for b in base.books() if b[0] not in overlay]
+                merged += [(book_id, *fields) for book_id, (_, fields) in overlay.items() if fields]
+                merged.sort()
+                self._swap(PrefixIndex(merged), upto_seq)
+            except Exception:
+                logger.exception("suggest_index_build_failed", extra={"operation": "suggest_index"})
+            finally:
+                self._building = False
+
+        threading.Thread(target=run, name="suggest-index-build", daemon=True).start()
+
+    def load_async(self) -> None:
+        """Carga inicial en segundo plano (arranque del worker)."""
+        self._rebuild_async(from_db=True)
+
+    # --- cambios ---
+
+    def _set(self, book_id: int, fields: Optional[Fields]) -> None:
+        with self._lock:
+            self._seq += 1
+            self._overlay = self._overlay.with_change(book_id, self._seq, fields)
+            compact = len(self._overlay) >= COMPACT_THRESHOLD
+        if compact:
+            self._rebuild_async(from_db=False)
+
+    def put(self, book_id: int, title: str, author: Optional[str]) -> None:
+        self._set(book_id, (title, author))
+
+    def remove(self, book_id: int) -> None:
+        self._set(book_id, None)
+
+    def refresh_book(self, book_id: Optional[int]) -> None:
+        """Handler de "book_text:<id>": relee el libro (None = recargar todo)."""
+        if book_id is None:
+            self._rebuild_async(from_db=True)
+            return
+        with SessionLocal() as db:
+            row = db.execute(select(Book.title, Book.author).where(Book.id == book_id)).first()
+        if row is None:
+            self.remove(book_id)
+        else:
+            self.put(book_id, row.title, row.author)
+
+    # --- consultas ---
+
+    def _fallback(self, db: Session, q: str, limit: int) -> list[dict]:
+        pattern = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        rows = db.execute(
+            select(Book.id, Book.title, Book.author)
+            .where(Book.title.ilike(pattern, escape="\\") | Book.author.ilike(pattern, escape="\\"))
+            .order_by(Book.title, Book.id)
+            .limit(limit)
+        )
+        return [{"book_id": r.id, "title": r.title, "author": r.author} for r in rows]
+
+    def suggest(self, db: Session, q: str, limit: int = 10) -> list[dict]:
+        query = normalize(q)
+        if not query:
+            return []
+        if not self.ready.is_set():
+            return self._fallback(db, q.strip(), limit)
+        prefix = query.encode("utf-8")
+
+        with self._lock:
+            base, overlay = self._base, self._overlay
+
+        candidates = [
+            (tier, text, book_id, base.book_text(k))
+            for tier, text, book_id, k in base.search(prefix, overlay.changes, limit)
+        ]
+        candidates += overlay.search(prefix, limit)
+
+        candidates.sort(key=lambda c: (c[0], c[1], c[2]))
+        result, seen = [], set()
+        for _, _, book_id, (title, author) in candidates:
+            if book_id in seen:
+                continue
+            seen.add(book_id)
+            result.append({"book_id": book_id, "title": title, "author": author})
+            if len(result) >= limit:
+                break
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            base, overlay_size = self._base, len(self._overlay)
+        return {
+            "name": "suggest",
+            "entries": len(base) + overlay_size,
+            "memory_bytes": base.memory_bytes(),
+        }
+
+
+suggest_index = SuggestIndex()
+
+# create_book / update_book (título o autor) / delete_book
+register_handler("book_text", suggest_index.refresh_book)
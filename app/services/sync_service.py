@@ -0,0 +1,173 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import text, tuple_
+from sqlalchemy.orm import Query, Session
+
+from app.core.config import settings
+from app.db.models import SyncTombstone
+
+# Posición keyset: (updated_at / deleted_at, id)
+Position = tuple[datetime, int]
+
+
+@dataclass(frozen=True)
+class SyncCursor:
+    """
+    Marca de agua de la sincronización incremental.
+
+    - rows / tombstones: hasta dónde está todo entregado, en orden
+      (updated_at, id) y (deleted_at, id). Nunca pasa de sync_horizon():
+      lo posterior se vuelve a enviar en la siguiente sincronización.
+    - page_rows / page_tombstones: solo mientras has_more; posición de la
+      última fila entregada, para pedir la página siguiente.
+    """
+    rows: Optional[Position] = None
+    tombstones: Optional[Position] = None
+    page_rows: Optional[Position] = None
+    page_tombstones: Optional[Position] = None
+
+
+def _dump_position(position: Optional[Position]) -> Optional[list]:
+    return [position[0].isoformat(), position[1]] if position else None
+
+
+def _load_position(raw: Any) -> Optional[Position]:
+    if raw is None:
+        return None
+    moment, row_id = raw
+    return datetime.fromisoformat(moment), int(row_id)
+
+
+def encode_token(cursor: SyncCursor) -> str:
+    data = {"r": _dump_position(cursor.rows), "d": _dump_position(cursor.tombstones)}
+    if cursor.page_rows or cursor.page_tombstones:
+        data["p"] = [_dump_position(cursor.page_rows), _dump_position(cursor.page_tombstones)]
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_token(token: Optional[str]) -> SyncCursor:
+    """Decodifica el token opaco ?since=. Sin token => sincronización completa."""
+    if not token:
+        return SyncCursor()
+
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        page_rows, page_tombstones = data.get("p") or (None, None)
+        return SyncCursor(
+            rows=_load_position(data["r"]),
+            tombstones=_load_position(data.get("d")),
+            page_rows=_load_position(page_rows),
+            page_tombstones=_load_position(page_tombstones),
+        )
+    except (ValueError, KeyError, TypeError, binascii.Error, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync token",
+        )
+
+
+def record_tombstone(
+    db: Session,
+    entity: str,
+    entity_id: int,
+    member_id: Optional[int] = None,
+) -> None:
+    """Registra el borrado en la misma transacción que el DELETE."""
+    db.add(SyncTombstone(entity=entity, entity_id=entity_id, member_id=member_id))
+
+
+def sync_horizon(db: Session) -> datetime:
+    """
+    Instante antes del cual ya no puede confirmarse ninguna fila nueva.
+
+    updated_at / deleted_at valen now(), el inicio de la transacción: una
+    transacción que sigue abierta puede confirmar después filas con fecha
+    anterior a las ya entregadas. El horizonte es el inicio de la transacción
+    en curso más antigua (sin contar esta sesión) menos SYNC_SAFETY_LAG_SECONDS.
+    """
+    return db.execute(
+        text(
+            "SELECT least(now(), coalesce(min(xact_start), now())) - make_interval(secs => :lag) "
+            "FROM pg_stat_activity "
+            "WHERE datname = current_database() AND backend_type = 'client backend' "
+            "AND pid <> pg_backend_pid() AND xact_start IS NOT NULL"
+        ),
+        {"lag": settings.SYNC_SAFETY_LAG_SECONDS},
+    ).scalar()
+
+
+def _hold_back(safe: Optional[Position], last: Optional[Position], horizon: datetime) -> Optional[Position]:
+    """Avanza la marca de agua hasta `last`, pero no más allá del horizonte."""
+    if last is None:
+        return safe
+    bound = last if last[0] < horizon else (horizon, 0)
+    if safe is not None and safe >= bound:
+        return safe
+    return bound
+
+
+def fetch_changes(
+    db: Session,
+    model: Any,
+    entity: str,
+    cursor: SyncCursor,
+    limit: int,
+    rows_query: Optional[Query] = None,
+    member_id: Optional[int] = None,
+) -> dict:
+    """
+    Devuelve las filas cambiadas y los tombstones posteriores a la marca de agua.
+
+    Usa paginación keyset sobre (updated_at, id), apoyada en el índice
+    ix_<tabla>_updated_at_id, así que cada página cuesta lo mismo
+    sin importar cuánto se haya avanzado. Las filas más recientes que el
+    horizonte se entregan pero la marca de agua no las cubre: el cliente
+    las recibe otra vez (upsert idempotente) en la siguiente sincronización.
+    """
+    horizon = sync_horizon(db)
+
+    rows_from = cursor.page_rows or cursor.rows
+    query = rows_query if rows_query is not None else db.query(model)
+    if rows_from is not None:
+        query = query.filter(tuple_(model.updated_at, model.id) > tuple_(*rows_from))
+    rows = query.order_by(model.updated_at, model.id).limit(limit + 1).all()
+
+    tombstones_from = cursor.page_tombstones or cursor.tombstones
+    tombstones_q = db.query(SyncTombstone.id, SyncTombstone.entity_id, SyncTombstone.deleted_at).filter(
+        SyncTombstone.entity == entity,
+    )
+    if tombstones_from is not None:
+        tombstones_q = tombstones_q.filter(
+            tuple_(SyncTombstone.deleted_at, SyncTombstone.id) > tuple_(*tombstones_from)
+        )
+    if member_id is not None:
+        tombstones_q = tombstones_q.filter(SyncTombstone.member_id == member_id)
+    tombstones = tombstones_q.order_by(SyncTombstone.deleted_at, SyncTombstone.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit or len(tombstones) > limit
+    rows = rows[:limit]
+    tombstones = tombstones[:limit]
+
+    last_row = (rows[-1].updated_at, rows[-1].id) if rows else None
+    last_tombstone = (tombstones[-1].deleted_at, tombstones[-1].id) if tombstones else None
+    next_cursor = SyncCursor(
+        rows=_hold_back(cursor.rows, last_row, horizon),
+        tombstones=_hold_back(cursor.tombstones, last_tombstone, horizon),
+        page_rows=(last_row or rows_from) if has_more else None,
+        page_tombstones=(last_tombstone or tombstones_from) if has_more else None,
+    )
+
+    return {
+        "items": rows,
+        "deleted": [t.entity_id for t in tombstones],
+        "next_token": encode_token(next_cursor),
+        "has_more": has_more,
+    }
@@ -0,0 +1,90 @@
+"""
+Tiempos de las rutas calientes en memoria (no forman parte de pytest: los
+límites de tiempo dependen de la máquina).
+
+    python -m tests.benchmarks.bench_hot_paths [nombre ...]
+
+Sin argumentos corre todos. Cada uno imprime su medición y el objetivo.
+"""
+import asyncio
+import random
+import sys
+import threading
+import time
+
+from app.core.broadcast import BroadcastHub
+
+from app.services.popularity import PopularityIndex, SlidingWindowCounter
+from app.services.suggest_index import COMPACT_THRESHOLD, PrefixIndex, SuggestIndex
+
+
+def bench_popular_top() -> None:
+    """Top-N de /books/popular con el ranking ya calculado (objetivo: < 100 µs)."""
+    index = PopularityIndex()
+    index.counter = SlidingWindowCounter()
+    for book_id in range(1, 5001):
+        index.counter.add(book_id, branch_id=book_id % 20, count=book_id % 97 + 1)
+    index._books = {book_id: (f"Libro {book_id}", "Autor") for book_id in range(1, 5001)}
+    index._stale = False
+
+    index.top(None, "7d", 3)
+    calls = 10_000
+    start = time.perf_counter()
+    for _ in range(calls):
+        index.top(None, "7d", 3)
+    per_call_us = (time.perf_counter() - start) * 1e6 / calls
+    print(f"popular_top: {per_call_us:.1f} µs por consulta (objetivo < 100 µs)")
+
+
+def bench_suggest() -> None:
+    """p99 de /books/suggest con 100k libros y el overlay casi lleno (objetivo: < 2 ms)."""
+    rng = random.Random(37)
+    words = [f"{w}{i}" for i in range(400) for w in ("sol", "mar", "luz", "rio", "casa")]
+    books = [
+        (i, " ".join(rng.choices(words, k=4)), f"Autor {rng.choice(words)}")
+        for i in range(1, 100_001)
+    ]
+    index = SuggestIndex()
+    index._base = PrefixIndex(books)
+    index.ready.set()
+    for book_id in range(100_001, 100_000 + COMPACT_THRESHOLD):
+        index.put(book_id, " ".join(rng.choices(words, k=4)), f"Autor {rng.choice(words)}")
+
+    prefixes = [rng.choice(words)[:n] for n in (1, 2, 3, 4, 5) for _ in range(200)]
+    timings = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        index.suggest(None, prefix)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    p99_ms = timings[int(len(timings) * 0.99)] * 1000
+    print(f"suggest: p99 {p99_ms:.2f} ms (objetivo < 2 ms)")
+
+
+def bench_fan_out() -> None:
+    """Publicar desde otro hilo hasta que 10k suscriptores lo tienen en cola (objetivo: < 100 ms)."""
+    async def scenario() -> float:
+        hub = BroadcastHub(queue_size=4)
+        subscriptions = [hub.subscribe([1]) for _ in range(10_000)]
+        start = time.perf_counter()
+        publisher = threading.Thread(target=hub.publish, args=(1, {"available_copies": 3}))
+        publisher.start()
+        publisher.join()
+        while hub.delivered < len(subscriptions):
+            await asyncio.sleep(0)
+        return (time.perf_counter() - start) * 1000
+
+    elapsed_ms = asyncio.run(scenario())
+    print(f"fan_out: {elapsed_ms:.1f} ms para 10k suscriptores (objetivo < 100 ms)")
+
+
+BENCHMARKS = {
+    "popular_top": bench_popular_top,
+    "suggest": bench_suggest,
+    "fan_out": bench_fan_out,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or list(BENCHMARKS):
+        BENCHMARKS[name]()
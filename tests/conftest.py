@@ -1,6 +1,7 @@
 #configuracion de los test
 import os
 import sys
+import time
 import uuid
 
 from pathlib import Path
@@ -16,6 +17,9 @@ ROOT_DIR = Path(__file__).resolve().parents[1]  # .../library-management-api
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
+# El scheduler de mantenimiento no corre durante los tests (se prueba aparte)
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
 # ======================================================
 # Imports de la aplicación
 # ======================================================
@@ -195,7 +199,10 @@ def clear_member_loans():
     with SessionLocal() as db:
         member = db.query(User).filter(User.email == "member_test@example.com").first()
         if member:
-            db.query(Loan).filter(Loan.member_id == member.id).delete()
+            # Borrado vía ORM (no query.delete()): mantiene los contadores de stats
+            for loan in db.query(Loan).filter(Loan.member_id == member.id):
+                db.delete(loan)
+            member.active_loan_count = 0
             db.commit()
 
 
@@ -210,6 +217,23 @@ def clean_member_loans():
     # opcional: podrías limpiar otra vez al final si quieres
 
 
+@pytest.fixture
+def wait_for_job(client: TestClient, admin_headers):
+    """
+    Espera a que termine una tarea lanzada con 202 (polling de /admin/jobs/{id}).
+    Uso:
+        job = wait_for_job(resp.json()["id"])
+    """
+    def _wait(job_id: int, timeout: float = 10.0) -> dict:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = client.get(f"/admin/jobs/{job_id}", headers=admin_headers).json()
+            if job["status"] not in ("queued", "running") or time.monotonic() > deadline:
+                return job
+            time.sleep(0.05)
+    return _wait
+
+
 # ======================================================
 # GENERADORES DE DATOS ÚNICOS (ISBN, EMAIL, ETC.)
 # ======================================================
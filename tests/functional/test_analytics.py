@@ -0,0 +1,138 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, update
+
+from app.db.models import LoanStatus, LoanStatusHistory
+from app.db.session import SessionLocal
+from app.services.analytics_service import refresh_daily_rollups
+
+
+def _create_branch(client: TestClient, admin_headers: Dict) -> int:
+    resp = client.post(
+        "/api/v1/branches",
+        json={
+            "name": f"Branch Analytics {uuid.uuid4().hex[:6]}",
+            "address": "Calle Series 34",
+            "description": "Sucursal para analítica",
+            "phone_number": "555-034-0000",
+            "email": "branch_analytics@library.local",
+            "is_active": True,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _create_book(client: TestClient, admin_headers: Dict, branch_id: int) -> int:
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": "Libro Analytics",
+            "author": "Autor Analytics",
+            "isbn": f"ANA{uuid.uuid4().hex[:9]}",
+            "description": "Libro para analítica",
+            "genre": "Test",
+            "publication_year": 2024,
+            "total_copies": 2,
+            "branch_id": branch_id,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _loan_through(client, admin_headers, member_headers, book_id, branch_id, statuses) -> int:
+    resp = client.post(
+        "/api/v1/loans",
+        json={"book_id": book_id, "branch_id": branch_id},
+        headers=member_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    loan_id = resp.json()["id"]
+    for new_status in statuses:
+        resp = client.patch(
+            f"/api/v1/loans/{loan_id}/status",
+            json={"new_status": new_status},
+            headers=admin_headers,
+        )
+        assert resp.status_code == 200, resp.text
+    return loan_id
+
+
+def test_today_is_aggregated_live(client: TestClient, admin_headers, member_headers, clean_member_loans):
+    branch_id = _create_branch(client, admin_headers)
+    book_id = _create_book(client, admin_headers, branch_id)
+    _loan_through(client, admin_headers, member_headers, book_id, branch_id, ("APPROVED", "BORROWED", "RETURNED"))
+    _loan_through(client, admin_headers, member_headers, book_id, branch_id, ("APPROVED", "BORROWED"))
+
+    resp = client.get(f"/admin/analytics/timeseries?branch_id={branch_id}", headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+    buckets = resp.json()["buckets"]
+    today = datetime.now(timezone.utc).date().isoformat()
+    assert [b["period_start"] for b in buckets] == [today]
+    assert buckets[0]["borrowed"] == 2
+    assert buckets[0]["returned"] == 1
+    assert buckets[0]["mean_loan_days"] == 0.0
+
+    report = client.get("/admin/analytics/branches", headers=admin_headers).json()
+    branch = next(b for b in report["branches"] if b["branch_id"] == branch_id)
+    assert branch["total_copies"] == 2
+    assert branch["copies_on_loan"] == 1
+    assert branch["utilization"] == 0.5
+    assert branch["borrowed"] == 2
+
+
+def test_closed_days_come_from_rollups(client: TestClient, admin_headers, member_headers, clean_member_loans):
+    branch_id = _create_branch(client, admin_headers)
+    book_id = _create_book(client, admin_headers, branch_id)
+    loan_id = _loan_through(
+        client, admin_headers, member_headers, book_id, branch_id, ("APPROVED", "BORROWED", "RETURNED")
+    )
+
+    # Movemos el histórico a días ya cerrados: prestado el lunes, devuelto 3 días después
+    today = datetime.now(timezone.utc).date()
+    monday = today - timedelta(days=today.weekday() + 14)
+    borrowed_at = datetime.combine(monday, datetime.min.time(), tzinfo=timezone.utc) + timedelta(hours=9)
+    with SessionLocal() as db:
+        for new_status, changed_at in (
+            (LoanStatus.BORROWED, borrowed_at),
+            (LoanStatus.RETURNED, borrowed_at + timedelta(days=3)),
+        ):
+            db.execute(
+                update(LoanStatusHistory)
+                .where(LoanStatusHistory.loan_id == loan_id, LoanStatusHistory.new_status == new_status)
+                .values(changed_at=changed_at)
+            )
+        db.commit()
+        assert refresh_daily_rollups(db, since=monday) > 0
+
+        # A partir de aquí la consulta no depende del histórico de esos días
+        db.execute(delete(LoanStatusHistory).where(LoanStatusHistory.loan_id == loan_id))
+        db.commit()
+
+    url = f"/admin/analytics/timeseries?branch_id={branch_id}&start={monday}&end={monday + timedelta(days=6)}"
+    daily = client.get(url, headers=admin_headers).json()["buckets"]
+    assert [(b["period_start"], b["borrowed"], b["returned"]) for b in daily] == [
+        (monday.isoformat(), 1, 0),
+        ((monday + timedelta(days=3)).isoformat(), 0, 1),
+    ]
+    assert daily[1]["mean_loan_days"] == 3.0
+
+    weekly = client.get(url + "&granularity=week", headers=admin_headers).json()["buckets"]
+    assert len(weekly) == 1
+    assert weekly[0]["period_start"] == monday.isoformat()
+    assert (weekly[0]["borrowed"], weekly[0]["returned"]) == (1, 1)
+
+
+def test_analytics_validates_parameters(client: TestClient, admin_headers, member_headers):
+    resp = client.get("/admin/analytics/timeseries?granularity=month", headers=admin_headers)
+    assert resp.status_code == 400
+    resp = client.get("/admin/analytics/branches?start=2025-02-01&end=2025-01-01", headers=admin_headers)
+    assert resp.status_code == 400
+    resp = client.get("/admin/analytics/branches", headers=member_headers)
+    assert resp.status_code == 403
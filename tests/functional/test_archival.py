@@ -0,0 +1,99 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, text
+
+from app.db.models import Book, LibraryBranch, Loan, LoanArchive, LoanStatus, LoanStatusHistory, SyncTombstone, User, UserRole
+from app.db.session import SessionLocal
+from app.services.archival import archive_closed_loans, ensure_history_partitions
+from app.services.stats_service import reconcile_stats
+
+
+def _loans() -> dict[str, int]:
+    """Miembro nuevo con un préstamo cerrado antiguo, uno reciente y uno abierto antiguo."""
+    tag = uuid.uuid4().hex[:8]
+    long_ago = datetime.now(timezone.utc) - timedelta(days=400)
+    with SessionLocal() as db:
+        member = User(email=f"archive_{tag}@example.com", full_name="Member Archivo",
+                      hashed_password="x", role=UserRole.MEMBER)
+        branch = LibraryBranch(name=f"Branch Archive {tag}", address="Calle Legajo 9", is_active=True)
+        db.add_all([member, branch])
+        db.flush()
+        book = Book(title="Libro Archivado", author="Autor Archivo", isbn=f"ARC{tag}",
+                    total_copies=3, available_copies=2, branch_id=branch.id)
+        db.add(book)
+        db.flush()
+
+        def loan(status, updated_at):
+            return Loan(member_id=member.id, book_id=book.id, branch_id=branch.id, borrow_date=updated_at,
+                        due_date=updated_at + timedelta(days=14), status=status,
+                        created_at=updated_at, updated_at=updated_at)
+
+        loans = {
+            "old_returned": loan(LoanStatus.RETURNED, long_ago),
+            "recent_returned": loan(LoanStatus.RETURNED, datetime.now(timezone.utc)),
+            "old_borrowed": loan(LoanStatus.BORROWED, long_ago),
+        }
+        db.add_all(loans.values())
+        db.flush()
+        db.add(LoanStatusHistory(loan_id=loans["old_returned"].id, old_status=LoanStatus.BORROWED,
+                                 new_status=LoanStatus.RETURNED, changed_at=long_ago))
+        member.active_loan_count = 1
+        db.commit()
+        return {"member": member.id, **{name: row.id for name, row in loans.items()}}
+
+
+def test_closed_loans_are_archived_and_stay_queryable(client: TestClient, admin_headers):
+    ids = _loans()
+
+    with SessionLocal() as db:
+        result = archive_closed_loans(db)
+        assert result["archived"] >= 1
+        assert db.get(Loan, ids["old_returned"]) is None
+        assert db.get(LoanArchive, ids["old_returned"]) is not None
+        # Solo los cerrados fuera de la ventana
+        assert db.get(Loan, ids["recent_returned"]) is not None
+        assert db.get(Loan, ids["old_borrowed"]) is not None
+        # El historial se queda donde estaba
+        assert db.execute(
+            select(LoanStatusHistory.id).where(LoanStatusHistory.loan_id == ids["old_returned"])
+        ).first() is not None
+        # Los clientes sincronizados lo quitan de su copia local
+        assert db.execute(
+            select(SyncTombstone.member_id).where(SyncTombstone.entity == "loan",
+                                                  SyncTombstone.entity_id == ids["old_returned"])
+        ).scalar() == ids["member"]
+        # Archivar no cambia /admin/stats
+        drift = reconcile_stats(db, apply=False)["drift"]
+        assert not [item for item in drift if item["counter"].startswith("loans.")]
+
+    url = f"/api/v1/loans/{ids['old_returned']}"
+    assert client.get(url, headers=admin_headers).status_code == 404
+    archived = client.get(f"{url}?include_archived=true", headers=admin_headers)
+    assert archived.status_code == 200, archived.text
+    assert archived.json()["status"] == "RETURNED"
+    assert archived.json()["book_title"] == "Libro Archivado"
+    assert [h["new_status"] for h in archived.json()["status_history"]] == ["RETURNED"]
+
+    listed = client.get(f"/api/v1/loans?member_id={ids['member']}", headers=admin_headers).json()
+    assert {loan["id"] for loan in listed} == {ids["recent_returned"], ids["old_borrowed"]}
+    listed = client.get(f"/api/v1/loans?member_id={ids['member']}&include_archived=true", headers=admin_headers).json()
+    assert [loan["id"] for loan in listed] == sorted(ids[name] for name in ("old_returned", "recent_returned", "old_borrowed"))
+
+
+def test_history_partitions_are_created_ahead():
+    ids = _loans()
+    with SessionLocal() as db:
+        ensure_history_partitions(db)
+        assert ensure_history_partitions(db) == []
+
+        # Una transición de hoy cae en la partición del mes, no en la DEFAULT
+        row = LoanStatusHistory(loan_id=ids["recent_returned"], old_status=LoanStatus.BORROWED,
+                                new_status=LoanStatus.RETURNED)
+        db.add(row)
+        db.commit()
+        partition = db.execute(
+            text("SELECT tableoid::regclass::text FROM loan_status_history WHERE id = :id"), {"id": row.id}
+        ).scalar()
+        assert partition == f"loan_status_history_p{datetime.now(timezone.utc):%Y%m}"
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import threading
+import tracemalloc
+import uuid
+from typing import Dict
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.core.broadcast import BroadcastHub
+from app.db.models import Book, LibraryBranch
+from app.db.session import SessionLocal
+from app.main import app
+from app.services.availability_feed import AvailabilityFeed
+
+
+def test_hub_fans_out_to_10k_idle_subscribers():
+    async def scenario():
+        hub = BroadcastHub(queue_size=4)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        subscriptions = [hub.subscribe([1]) for _ in range(10_000)]
+        per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / len(subscriptions)
+        tracemalloc.stop()
+        assert per_subscriber < 2048, f"{per_subscriber:.0f} bytes por suscriptor"
+
+        # Un cliente lento con la cola llena no frena al resto
+        slow = hub.subscribe([1])
+        for _ in range(4):
+            slow.push("viejo")
+
+        fanned_out = []
+        publisher = threading.Thread(
+            target=lambda: fanned_out.append(hub.publish(1, {"available_copies": 3}))
+        )
+        publisher.start()
+        publisher.join()
+        # Un solo callback por event loop entrega a todos los suscriptores
+        while hub.delivered + hub.dropped < 10_001:
+            await asyncio.sleep(0)
+
+        assert fanned_out == [10_001]
+        assert (hub.published, hub.delivered, hub.dropped) == (1, 10_000, 1)
+        assert all(s.get_nowait() == {"available_copies": 3} for s in subscriptions)
+        assert slow.take_dropped() == 1
+        assert hub.subscriber_count() == 10_001
+
+        for subscription in subscriptions + [slow]:
+            hub.unsubscribe(subscription)
+        assert hub.keys() == []
+
+    asyncio.run(scenario())
+
+
+def test_events_resync_after_overflow():
+    async def scenario():
+        feed = AvailabilityFeed(BroadcastHub(queue_size=2))
+        subscription = feed.hub.subscribe([7])
+
+        async def resnapshot():
+            return [{"book_id": 7, "available_copies": 0, "delta": None}]
+
+        stream = feed.events(subscription, [{"book_id": 7, "available_copies": 2, "delta": None}], resnapshot)
+        assert (await stream.__anext__()).startswith("event: snapshot\n")
+
+        feed.hub._deliver([subscription], {"book_id": 7, "available_copies": 1, "delta": -1})
+        assert "event: availability" in await stream.__anext__()
+
+        for copies in (1, 0, 0):  # la tercera no entra en la cola
+            feed.hub._deliver([subscription], {"book_id": 7, "available_copies": copies, "delta": -1})
+        resync = await stream.__anext__()
+        assert resync.startswith("event: resync\n")
+        assert json.loads(resync.split("data: ")[1]) == [{"book_id": 7, "available_copies": 0, "delta": None}]
+
+        await stream.aclose()
+        assert feed.hub.keys() == []
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def stocked_book():
+    """Libro con 2 ejemplares; al terminar se restaura el stock para no dejar deriva de inventario."""
+    book_id = _stock_book(copies=2)
+    try:
+        yield book_id
+    finally:
+        _set_copies(book_id, 2)
+
+
+def _stock_book(copies: int) -> int:
+    tag = uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        branch = LibraryBranch(name=f"Branch Feed {tag}", address="Calle Orden 39", is_active=True)
+        db.add(branch)
+        db.flush()
+        book = Book(title="Libro Disputado", author="Autor SSE", isbn=f"FED{tag}",
+                    total_copies=copies, available_copies=copies, branch_id=branch.id)
+        db.add(book)
+        db.commit()
+        return book.id
+
+
+def _set_copies(book_id: int, copies: int) -> None:
+    with SessionLocal() as db:
+        db.execute(update(Book).where(Book.id == book_id).values(available_copies=copies))
+        db.commit()
+
+
+def _delay_first_read(feed: AvailabilityFeed) -> tuple[threading.Event, threading.Event]:
+    """La primera lectura de `feed` se queda parada (con su valor ya leído) hasta `release`."""
+    original, read, release = feed._read, threading.Event(), threading.Event()
+
+    def delayed(db, book_ids):
+        values = original(db, book_ids)
+        if not read.is_set():
+            read.set()
+            release.wait(5)
+        return values
+
+    feed._read = delayed
+    return read, release
+
+
+async def _messages(subscription, count: int) -> list[dict]:
+    while len(subscription) < count:
+        await asyncio.sleep(0.01)
+    return [subscription.get_nowait() for _ in range(count)]
+
+
+def test_late_read_of_a_duplicate_event_never_publishes_a_stale_value(stocked_book):
+    book_id = stocked_book
+
+    async def scenario():
+        feed = AvailabilityFeed(BroadcastHub())
+        with SessionLocal() as db:
+            subscription, _ = feed.subscribe(db, [book_id])
+        read, release = _delay_first_read(feed)
+
+        # El aviso llega dos veces (commit local + NOTIFY); la primera copia lee y se retrasa
+        _set_copies(book_id, 1)
+        late = threading.Thread(target=feed.on_book, args=(book_id,))
+        late.start()
+        assert read.wait(5)
+        _set_copies(book_id, 0)
+        fresh = threading.Thread(target=feed.on_book, args=(book_id,))
+        fresh.start()
+        fresh.join(0.3)  # sin orden entre lecturas, esta difundiría 0 y la retrasada 1 después
+        release.set()
+        late.join(5)
+        fresh.join(5)
+
+        assert await _messages(subscription, 2) == [
+            {"book_id": book_id, "available_copies": 1, "delta": -1},
+            {"book_id": book_id, "available_copies": 0, "delta": -1},
+        ]
+        feed.unsubscribe(subscription)
+
+    asyncio.run(scenario())
+
+
+def test_change_during_subscribe_reaches_the_new_subscriber(stocked_book):
+    book_id = stocked_book
+
+    async def scenario():
+        feed = AvailabilityFeed(BroadcastHub())
+        read, release = _delay_first_read(feed)
+        loop = asyncio.get_running_loop()
+
+        def subscribe():
+            with SessionLocal() as db:
+                return feed.subscribe(db, [book_id], loop)
+
+        opening = asyncio.ensure_future(asyncio.to_thread(subscribe))
+        assert await asyncio.to_thread(read.wait, 5)
+        # Cambio confirmado después de la lectura inicial, antes de sembrar _last
+        _set_copies(book_id, 1)
+        notified = threading.Thread(target=feed.on_book, args=(book_id,))
+        notified.start()
+        release.set()
+        subscription, initial = await opening
+        await asyncio.to_thread(notified.join, 5)
+
+        assert initial == [{"book_id": book_id, "available_copies": 2, "delta": None}]
+        assert await _messages(subscription, 1) == [{"book_id": book_id, "available_copies": 1, "delta": -1}]
+        feed.unsubscribe(subscription)
+        assert feed.hub.keys() == []
+
+    asyncio.run(scenario())
+
+
+async def _open_stream(path: str, headers: Dict, on_chunk):
+    """Llama a la app por ASGI y entrega cada chunk del cuerpo; desconecta al devolver True."""
+    disconnect = asyncio.Event()
+    status = {}
+
+    async def receive():
+        if not status.get("requested"):
+            status["requested"] = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if await on_chunk(message["body"].decode()):
+                disconnect.set()
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=10)
+    return status["code"]
+
+
+def test_availability_stream_pushes_loan_deltas(client: TestClient, admin_headers, member_headers):
+    resp = client.post(
+        "/api/v1/branches",
+        json={
+            "name": "Branch Stream",
+            "address": "Calle Eventos 39",
+            "description": "Sucursal para SSE",
+            "phone_number": "555-039-0000",
+            "email": "branch_stream@library.local",
+            "is_active": True,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": "Libro en Vivo",
+            "author": "Autor SSE",
+            "isbn": f"SSE{uuid.uuid4().hex[:9]}",
+            "description": "Disponibilidad en tiempo real",
+            "genre": "Test",
+            "publication_year": 2024,
+            "total_copies": 2,
+            "branch_id": resp.json()["id"],
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    book_id = resp.json()["id"]
+
+    events = []
+
+    async def on_chunk(chunk: str) -> bool:
+        events.append(chunk)
+        if chunk.startswith("event: snapshot"):
+            # Cambio de stock desde otro hilo (como otra petición del worker)
+            await asyncio.to_thread(
+                client.put, f"/api/v1/books/{book_id}", json={"available_copies": 1}, headers=admin_headers
+            )
+        return chunk.startswith("event: availability")
+
+    status_code = asyncio.run(
+        _open_stream(f"/api/v1/books/availability/stream?book_ids={book_id}", member_headers, on_chunk)
+    )
+    assert status_code == 200
+    payloads = [json.loads(e.split("data: ")[1]) for e in events]
+    assert payloads == [
+        [{"book_id": book_id, "available_copies": 2, "delta": None}],
+        {"book_id": book_id, "available_copies": 1, "delta": -1},
+    ]
+
+    unauthorized = client.get(f"/api/v1/books/availability/stream?book_ids={book_id}")
+    assert unauthorized.status_code == 401
+    invalid = client.get("/api/v1/books/availability/stream?book_ids=a,b", headers=member_headers)
+    assert invalid.status_code == 400
@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+
+from app.services.branch_registry import branch_registry
+
+
+def _branch_payload(name: str) -> dict:
+    return {
+        "name": name,
+        "address": "Calle Registro 29",
+        "description": "Sucursal para el registro en memoria",
+        "phone_number": "555-029-0000",
+        "email": "branch_registry@library.local",
+        "is_active": True,
+    }
+
+
+def test_branch_writes_refresh_registry(client: TestClient, admin_headers, db_session):
+    version_before = branch_registry.version
+
+    resp = client.post("/api/v1/branches", json=_branch_payload("Registro Inicial"), headers=admin_headers)
+    assert resp.status_code == 201, resp.text
+    branch_id = resp.json()["id"]
+    assert branch_registry.version > version_before
+
+    # El listado en memoria ya incluye la sucursal nueva
+    listing = client.get("/api/v1/branches", headers=admin_headers)
+    assert branch_id in {b["id"] for b in listing.json()}
+
+    resp_update = client.put(
+        f"/api/v1/branches/{branch_id}",
+        json={"name": "Registro Editado", "is_active": False},
+        headers=admin_headers,
+    )
+    assert resp_update.status_code == 200, resp_update.text
+
+    detail = client.get(f"/api/v1/branches/{branch_id}", headers=admin_headers)
+    assert detail.json()["name"] == "Registro Editado"
+    assert branch_registry.exists(db_session, branch_id)
+    assert not branch_registry.is_active(db_session, branch_id)
+
+    resp_delete = client.delete(f"/api/v1/branches/{branch_id}", headers=admin_headers)
+    assert resp_delete.status_code == 204, resp_delete.text
+    assert not branch_registry.exists(db_session, branch_id)
+
+    missing = client.get(f"/api/v1/branches/{branch_id}", headers=admin_headers)
+    assert missing.status_code == 404
+
+
+def test_create_book_with_unknown_branch_uses_registry(client: TestClient, admin_headers):
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": "Libro sin sucursal",
+            "author": "Autor Registro",
+            "isbn": "REG-NOBRANCH",
+            "total_copies": 1,
+            "branch_id": 99999999,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "Branch not found"
@@ -0,0 +1,120 @@
+import uuid
+from typing import Dict
+
+from fastapi.testclient import TestClient
+
+
+def _create_branch(client: TestClient, admin_headers: Dict) -> int:
+    resp = client.post(
+        "/api/v1/branches",
+        json={
+            "name": f"Branch ETag {uuid.uuid4().hex[:6]}",
+            "address": "Calle Cache 304",
+            "description": "Sucursal para GET condicional",
+            "phone_number": "555-304-0000",
+            "email": "branch_etag@library.local",
+            "is_active": True,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _create_book(client: TestClient, admin_headers: Dict, branch_id: int, title: str) -> int:
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": title,
+            "author": "Autor ETag",
+            "isbn": f"ETAG{uuid.uuid4().hex[:9]}",
+            "description": "Libro para GET condicional",
+            "genre": "Test",
+            "publication_year": 2022,
+            "total_copies": 2,
+            "branch_id": branch_id,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def test_get_book_returns_304_when_etag_matches(client: TestClient, admin_headers):
+    branch_id = _create_branch(client, admin_headers)
+    book_id = _create_book(client, admin_headers, branch_id, "Libro ETag")
+
+    first = client.get(f"/api/v1/books/{book_id}", headers=admin_headers)
+    assert first.status_code == 200, first.text
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert "Last-Modified" in first.headers
+
+    cached = client.get(
+        f"/api/v1/books/{book_id}",
+        headers={**admin_headers, "If-None-Match": etag},
+    )
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    # Tras una modificación el ETag cambia y se vuelve a enviar el cuerpo
+    resp_update = client.put(
+        f"/api/v1/books/{book_id}",
+        json={"title": "Libro ETag actualizado"},
+        headers=admin_headers,
+    )
+    assert resp_update.status_code == 200, resp_update.text
+
+    refreshed = client.get(
+        f"/api/v1/books/{book_id}",
+        headers={**admin_headers, "If-None-Match": etag},
+    )
+    assert refreshed.status_code == 200
+    assert refreshed.json()["title"] == "Libro ETag actualizado"
+    assert refreshed.headers["ETag"] != etag
+
+
+def test_list_books_etag_changes_when_page_changes(client: TestClient, admin_headers):
+    branch_id = _create_branch(client, admin_headers)
+    _create_book(client, admin_headers, branch_id, "Libro Lista ETag")
+    url = f"/api/v1/books?branch_id={branch_id}"
+
+    first = client.get(url, headers=admin_headers)
+    assert first.status_code == 200, first.text
+    etag = first.headers["ETag"]
+
+    cached = client.get(url, headers={**admin_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+
+    _create_book(client, admin_headers, branch_id, "Libro Lista ETag 2")
+
+    changed = client.get(url, headers={**admin_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert len(changed.json()) == 2
+
+
+def test_branch_conditional_get(client: TestClient, admin_headers):
+    branch_id = _create_branch(client, admin_headers)
+
+    first = client.get(f"/api/v1/branches/{branch_id}", headers=admin_headers)
+    assert first.status_code == 200, first.text
+
+    cached = client.get(
+        f"/api/v1/branches/{branch_id}",
+        headers={**admin_headers, "If-None-Match": first.headers["ETag"]},
+    )
+    assert cached.status_code == 304
+
+    listing = client.get("/api/v1/branches", headers=admin_headers)
+    assert listing.status_code == 200
+    cached_list = client.get(
+        "/api/v1/branches",
+        headers={**admin_headers, "If-None-Match": listing.headers["ETag"]},
+    )
+    assert cached_list.status_code == 304
+
+
+def test_get_book_not_found_still_404(client: TestClient, admin_headers):
+    resp = client.get("/api/v1/books/99999999", headers=admin_headers)
+    assert resp.status_code == 404
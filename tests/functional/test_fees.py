@@ -0,0 +1,77 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.db.models import Book, Loan, LoanStatus, User, UserRole
+from app.db.session import SessionLocal
+from app.services.fees import refresh_late_fees
+from app.services.loan_service import change_loan_status
+
+
+def _loans_in_branch(branch_id: int) -> dict[str, int]:
+    """Préstamos de un miembro nuevo: vencido hace 3 días, al día y devuelto con multa."""
+    now = datetime.now(timezone.utc)
+    tag = uuid.uuid4().hex[:10]
+    with SessionLocal() as db:
+        member = User(email=f"fees_{tag}@example.com", full_name="Member Multas", hashed_password="x",
+                      role=UserRole.MEMBER, active_loan_count=2)
+        db.add(member)
+        book = Book(title="Libro Con Multa", author="Autor Multas", isbn=f"FEE{tag}",
+                    total_copies=5, available_copies=3, branch_id=branch_id)
+        db.add(book)
+        db.flush()
+        loans = {
+            "late": Loan(member_id=member.id, book_id=book.id, branch_id=branch_id,
+                         due_date=now - timedelta(days=3), status=LoanStatus.OVERDUE, late_fee_amount=0),
+            "on_time": Loan(member_id=member.id, book_id=book.id, branch_id=branch_id,
+                            due_date=now + timedelta(days=3), status=LoanStatus.BORROWED),
+            "returned": Loan(member_id=member.id, book_id=book.id, branch_id=branch_id,
+                             due_date=now - timedelta(days=10), return_date=now - timedelta(days=8),
+                             status=LoanStatus.RETURNED, late_fee_amount=5),
+        }
+        db.add_all(loans.values())
+        db.commit()
+        return {"member": member.id, **{name: loan.id for name, loan in loans.items()}}
+
+
+def test_loan_fees_use_branch_rate(client: TestClient, admin_headers, member_headers):
+    resp = client.post(
+        "/api/v1/branches",
+        json={"name": f"Sucursal Multas {uuid.uuid4().hex[:6]}", "address": "Calle Mora 7", "late_fee_per_day": 2.5},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    branch_id = resp.json()["id"]
+    loan_ids = _loans_in_branch(branch_id)
+
+    resp = client.get(f"/api/v1/loans/fees?branch_id={branch_id}", headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+    report = resp.json()
+    by_id = {row["loan_id"]: row for row in report["loans"]}
+    # El préstamo al día no tiene multa; el devuelto conserva la suya
+    assert set(by_id) == {loan_ids["late"], loan_ids["returned"]}
+    assert by_id[loan_ids["late"]]["days_late"] == 3
+    assert by_id[loan_ids["late"]]["rate_per_day"] == 2.5
+    assert by_id[loan_ids["late"]]["late_fee"] == 7.5
+    assert by_id[loan_ids["returned"]]["days_late"] == 2
+    assert by_id[loan_ids["returned"]]["late_fee"] == 5
+    assert report["total"] == 12.5
+
+    # El member solo ve sus propias multas, aunque pida las de otro
+    resp = client.get(f"/api/v1/loans/fees?member_id={loan_ids['member']}", headers=member_headers)
+    assert resp.status_code == 200, resp.text
+    assert loan_ids["late"] not in {row["loan_id"] for row in resp.json()["loans"]}
+
+    # El personal tiene que acotar la consulta
+    assert client.get("/api/v1/loans/fees", headers=admin_headers).status_code == 400
+
+    # Tarea nocturna: la multa guardada se pone al día
+    with SessionLocal() as db:
+        assert refresh_late_fees(db) >= 1
+        assert float(db.get(Loan, loan_ids["late"]).late_fee_amount) == 7.5
+
+        # Al devolverlo la multa queda congelada con la tarifa de la sucursal
+        loan = change_loan_status(db, db.get(Loan, loan_ids["late"]), LoanStatus.RETURNED, db.get(User, loan_ids["member"]))
+        assert float(loan.late_fee_amount) == 7.5
+        assert loan.return_date is not None
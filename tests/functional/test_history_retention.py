@@ -0,0 +1,167 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select, text
+from sqlalchemy.exc import OperationalError
+
+from app.db.models import (
+    Book,
+    BranchDailyActivity,
+    LibraryBranch,
+    Loan,
+    LoanHistorySummary,
+    LoanStatus,
+    LoanStatusHistory,
+    RollupWatermark,
+    User,
+    UserRole,
+)
+from app.db.session import SessionLocal
+from app.core.config import settings
+from app.services.analytics_service import HISTORY_PURGE, refresh_daily_rollups
+from app.services import history_retention
+from app.services.history_retention import _drop_empty_partitions, purge_history
+
+
+def _old_loan() -> tuple[int, int, datetime]:
+    """Préstamo devuelto hace unos 30 meses, con su historial completo."""
+    tag = uuid.uuid4().hex[:8]
+    borrowed_at = datetime.now(timezone.utc).replace(hour=12) - timedelta(days=900)
+    with SessionLocal() as db:
+        member = User(email=f"retention_{tag}@example.com", full_name="Member Retención",
+                      hashed_password="x", role=UserRole.MEMBER)
+        branch = LibraryBranch(name=f"Branch Retention {tag}", address="Calle Olvido 1", is_active=True)
+        db.add_all([member, branch])
+        db.flush()
+        book = Book(title="Libro Antiguo", author="Autor Retención", isbn=f"RET{tag}",
+                    total_copies=1, available_copies=1, branch_id=branch.id)
+        db.add(book)
+        db.flush()
+        loan = Loan(member_id=member.id, book_id=book.id, branch_id=branch.id, borrow_date=borrowed_at,
+                    due_date=borrowed_at + timedelta(days=14), return_date=borrowed_at + timedelta(days=3),
+                    status=LoanStatus.RETURNED)
+        db.add(loan)
+        db.flush()
+        for old, new, at in (
+            (None, LoanStatus.REQUESTED, borrowed_at - timedelta(hours=2)),
+            (LoanStatus.REQUESTED, LoanStatus.BORROWED, borrowed_at),
+            (LoanStatus.BORROWED, LoanStatus.RETURNED, borrowed_at + timedelta(days=3)),
+        ):
+            db.add(LoanStatusHistory(loan_id=loan.id, old_status=old, new_status=new, changed_at=at))
+        db.commit()
+        return loan.id, branch.id, borrowed_at
+
+
+@pytest.fixture
+def old_loan():
+    """
+    _old_loan() sin watermark de purga previo (dejaría fuera su día al
+    recalcular rollups); al terminar se restaura y se borra el resumen.
+    """
+    with SessionLocal() as db:
+        previous = db.get(RollupWatermark, HISTORY_PURGE)
+        previous = previous.through_day if previous else None
+        db.execute(delete(RollupWatermark).where(RollupWatermark.name == HISTORY_PURGE))
+        db.commit()
+    loan_id, branch_id, borrowed_at = _old_loan()
+    try:
+        yield loan_id, branch_id, borrowed_at
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(LoanHistorySummary).where(LoanHistorySummary.loan_id == loan_id))
+            db.execute(delete(RollupWatermark).where(RollupWatermark.name == HISTORY_PURGE))
+            if previous is not None:
+                db.add(RollupWatermark(name=HISTORY_PURGE, through_day=previous))
+            db.commit()
+
+
+def _borrowed_on(db, branch_id: int, day) -> int:
+    return db.execute(
+        select(BranchDailyActivity.borrowed).where(
+            BranchDailyActivity.branch_id == branch_id, BranchDailyActivity.day == day
+        )
+    ).scalar()
+
+
+def test_history_is_compacted_into_a_summary(client: TestClient, admin_headers, old_loan):
+    loan_id, branch_id, borrowed_at = old_loan
+    with SessionLocal() as db:
+        refresh_daily_rollups(db, since=borrowed_at.date())
+        assert _borrowed_on(db, branch_id, borrowed_at.date()) == 1
+
+    estimate = client.get("/admin/history/retention?months=24", headers=admin_headers)
+    assert estimate.status_code == 200, estimate.text
+    assert estimate.json()["rows"] >= 3
+    assert estimate.json()["estimated_bytes"] > 0
+
+    with SessionLocal() as db:
+        # Dry-run: no tocó nada
+        assert len(db.execute(select(LoanStatusHistory.id).where(LoanStatusHistory.loan_id == loan_id)).all()) == 3
+
+        # Chunks de 2 filas: el resumen se acumula entre chunks
+        result = purge_history(db, months=24, chunk_size=2, pause_seconds=0)
+        assert result["purged"] >= 3
+        assert db.execute(select(LoanStatusHistory.id).where(LoanStatusHistory.loan_id == loan_id)).first() is None
+
+        summary = db.get(LoanHistorySummary, loan_id)
+        assert summary.transitions == 3
+        assert summary.last_status == LoanStatus.RETURNED
+        assert summary.borrowed_at == borrowed_at
+        assert summary.returned_at == borrowed_at + timedelta(days=3)
+
+        # Recalcular un día compactado no borra sus rollups
+        refresh_daily_rollups(db, since=borrowed_at.date())
+        assert _borrowed_on(db, branch_id, borrowed_at.date()) == 1
+
+
+def test_partition_drop_gives_up_on_a_busy_parent(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_DROP_LOCK_TIMEOUT_MS", 50)
+    cutoff = datetime(2001, 2, 1, tzinfo=timezone.utc)
+    with SessionLocal() as db:
+        db.execute(text(
+            "CREATE TABLE loan_status_history_p200101 PARTITION OF loan_status_history "
+            "FOR VALUES FROM ('2001-01-01') TO ('2001-02-01')"
+        ))
+        db.commit()
+
+    try:
+        reader = SessionLocal()
+        try:
+            # Una lectura larga sobre el historial: el DROP no hace cola detrás, la deja para otra vez
+            reader.execute(text("LOCK TABLE loan_status_history IN ACCESS SHARE MODE"))
+            with SessionLocal() as db:
+                assert _drop_empty_partitions(db, cutoff) == []
+        finally:
+            reader.rollback()
+            reader.close()
+
+        with SessionLocal() as db:
+            assert db.execute(text("SELECT to_regclass('loan_status_history_p200101')")).scalar() is not None
+            assert _drop_empty_partitions(db, cutoff) == ["loan_status_history_p200101"]
+            assert db.execute(text("SELECT to_regclass('loan_status_history_p200101')")).scalar() is None
+    finally:
+        # Si falló a medias, que la partición no impida repetir el test
+        with SessionLocal() as db:
+            db.execute(text("DROP TABLE IF EXISTS loan_status_history_p200101"))
+            db.commit()
+
+
+def test_partition_drop_reads_the_sqlstate_of_either_driver():
+    class Psycopg3Error(Exception):
+        sqlstate = history_retention.LOCK_NOT_AVAILABLE  # psycopg 3 no tiene pgcode
+
+    class BusySession:
+        executed = 0
+
+        def execute(self, *args, **kwargs):
+            self.executed += 1
+            raise OperationalError("DROP TABLE loan_status_history_p200101", {}, Psycopg3Error())
+
+        def rollback(self):
+            pass
+
+    session = BusySession()
+    assert history_retention._drop_partition(session, "loan_status_history_p200101", pause_seconds=0) is False
+    assert session.executed == history_retention.DROP_ATTEMPTS
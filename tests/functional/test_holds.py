@@ -0,0 +1,214 @@
+import uuid
+from typing import Dict
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.security import hash_password
+from app.db.models import User, UserRole
+from app.db.session import SessionLocal
+
+
+def _member_headers(client: TestClient, active_loans: int = 0) -> Dict:
+    email = f"hold-{uuid.uuid4().hex[:8]}@library.local"
+    with SessionLocal() as db:
+        db.add(
+            User(
+                email=email,
+                full_name="Hold Member",
+                hashed_password=hash_password("hold123"),
+                role=UserRole.MEMBER,
+                active_loan_count=active_loans,
+            )
+        )
+        db.commit()
+    resp = client.post("/api/v1/auth/login", data={"username": email, "password": "hold123"})
+    assert resp.status_code == 200, resp.text
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+def _set_status(client: TestClient, admin_headers: Dict, loan_id: int, new_status: str) -> Dict:
+    resp = client.patch(
+        f"/api/v1/loans/{loan_id}/status",
+        json={"new_status": new_status},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def _hold(client: TestClient, headers: Dict, book_id: int, branch_id: int) -> Dict:
+    resp = client.post("/api/v1/holds", json={"book_id": book_id, "branch_id": branch_id}, headers=headers)
+    assert resp.status_code == 201, resp.text
+    return resp.json()
+
+
+def _lent_out_book(client: TestClient, admin_headers: Dict, member_headers: Dict) -> tuple[int, int, int]:
+    """Libro de una sola copia prestada a member_headers: (book_id, branch_id, loan_id)."""
+    tag = uuid.uuid4().hex[:8]
+    resp = client.post(
+        "/api/v1/branches",
+        json={"name": f"Branch Holds {tag}", "address": "Calle Límite 38", "is_active": True},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    branch_id = resp.json()["id"]
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": "Libro Disputado",
+            "author": "Autor Reservas",
+            "isbn": f"HLD{tag}",
+            "total_copies": 1,
+            "branch_id": branch_id,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    book_id = resp.json()["id"]
+    resp = client.post("/api/v1/loans", json={"book_id": book_id, "branch_id": branch_id}, headers=member_headers)
+    assert resp.status_code == 201, resp.text
+    loan_id = resp.json()["id"]
+    _set_status(client, admin_headers, loan_id, "APPROVED")
+    _set_status(client, admin_headers, loan_id, "BORROWED")
+    return book_id, branch_id, loan_id
+
+
+def test_hold_queue_hands_returned_copy_to_next_member(
+    client: TestClient, admin_headers, member_headers, clean_member_loans
+):
+    resp = client.post(
+        "/api/v1/branches",
+        json={
+            "name": "Branch Holds",
+            "address": "Calle Espera 38",
+            "description": "Sucursal para reservas",
+            "phone_number": "555-038-0000",
+            "email": "branch_holds@library.local",
+            "is_active": True,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    branch_id = resp.json()["id"]
+
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": "Libro Único",
+            "author": "Autor Reservas",
+            "isbn": f"HLD{uuid.uuid4().hex[:9]}",
+            "description": "Una sola copia",
+            "genre": "Test",
+            "publication_year": 2024,
+            "total_copies": 1,
+            "branch_id": branch_id,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    book_id = resp.json()["id"]
+
+    # Con copias disponibles no se reserva: se pide el préstamo
+    early = client.post("/api/v1/holds", json={"book_id": book_id, "branch_id": branch_id}, headers=member_headers)
+    assert early.status_code == 400
+
+    resp = client.post("/api/v1/loans", json={"book_id": book_id, "branch_id": branch_id}, headers=member_headers)
+    assert resp.status_code == 201, resp.text
+    first_loan = resp.json()["id"]
+    _set_status(client, admin_headers, first_loan, "APPROVED")
+    _set_status(client, admin_headers, first_loan, "BORROWED")
+
+    second, third, fourth = (_member_headers(client) for _ in range(3))
+    hold_2 = _hold(client, second, book_id, branch_id)
+    hold_3 = _hold(client, third, book_id, branch_id)
+    hold_4 = _hold(client, fourth, book_id, branch_id)
+    assert [h["position"] for h in (hold_2, hold_3, hold_4)] == [1, 2, 3]
+
+    duplicate = client.post("/api/v1/holds", json={"book_id": book_id, "branch_id": branch_id}, headers=second)
+    assert duplicate.status_code == 409
+    assert client.get(f"/api/v1/holds/{hold_2['id']}", headers=third).status_code == 403
+
+    # Cancelar en medio de la cola: los de atrás avanzan
+    canceled = client.delete(f"/api/v1/holds/{hold_3['id']}", headers=third)
+    assert canceled.status_code == 200, canceled.text
+    assert canceled.json()["status"] == "CANCELED"
+    assert client.get(f"/api/v1/holds/{hold_4['id']}", headers=fourth).json()["position"] == 2
+
+    # La devolución asigna la copia a la primera reserva (préstamo APPROVED)
+    _set_status(client, admin_headers, first_loan, "RETURNED")
+    fulfilled = client.get(f"/api/v1/holds/{hold_2['id']}", headers=second).json()
+    assert fulfilled["status"] == "FULFILLED"
+    assert fulfilled["position"] is None
+    assert client.get(f"/api/v1/holds/{hold_4['id']}", headers=fourth).json()["position"] == 1
+
+    held_loan = client.get(f"/api/v1/loans/{fulfilled['loan_id']}", headers=second).json()
+    assert held_loan["status"] == "APPROVED"
+    assert client.get(f"/api/v1/books/{book_id}", headers=admin_headers).json()["available_copies"] == 0
+
+    # La copia apartada se presta sin pasar por available_copies
+    _set_status(client, admin_headers, fulfilled["loan_id"], "BORROWED")
+    _set_status(client, admin_headers, fulfilled["loan_id"], "RETURNED")
+
+    # Si el siguiente no la retira, la copia queda disponible (cola vacía)
+    last = client.get(f"/api/v1/holds/{hold_4['id']}", headers=fourth).json()
+    assert last["status"] == "FULFILLED"
+    _set_status(client, admin_headers, last["loan_id"], "CANCELED")
+    assert client.get(f"/api/v1/books/{book_id}", headers=admin_headers).json()["available_copies"] == 1
+
+    queue = client.get(f"/api/v1/holds?book_id={book_id}&status=FULFILLED", headers=admin_headers)
+    assert [h["id"] for h in queue.json()] == [hold_2["id"], hold_4["id"]]
+
+
+def test_member_at_loan_limit_cannot_place_a_hold(
+    client: TestClient, admin_headers, member_headers, clean_member_loans
+):
+    book_id, branch_id, _ = _lent_out_book(client, admin_headers, member_headers)
+
+    full = _member_headers(client, active_loans=settings.MAX_ACTIVE_LOANS)
+    resp = client.post("/api/v1/holds", json={"book_id": book_id, "branch_id": branch_id}, headers=full)
+    assert resp.status_code == 400
+    assert "maximum number of active loans" in resp.json()["detail"]
+
+    _hold(client, _member_headers(client, active_loans=settings.MAX_ACTIVE_LOANS - 1), book_id, branch_id)
+
+
+def test_returned_copy_skips_members_at_loan_limit(
+    client: TestClient, admin_headers, member_headers, clean_member_loans
+):
+    book_id, branch_id, loan_id = _lent_out_book(client, admin_headers, member_headers)
+    busy, free = _member_headers(client), _member_headers(client)
+    busy_hold = _hold(client, busy, book_id, branch_id)
+    free_hold = _hold(client, free, book_id, branch_id)
+
+    # El primero de la cola llega al límite mientras espera
+    with SessionLocal() as db:
+        db.execute(
+            update(User)
+            .where(User.id == busy_hold["member_id"])
+            .values(active_loan_count=settings.MAX_ACTIVE_LOANS)
+        )
+        db.commit()
+
+    _set_status(client, admin_headers, loan_id, "RETURNED")
+    skipped = client.get(f"/api/v1/holds/{busy_hold['id']}", headers=busy).json()
+    assert skipped["status"] == "WAITING"
+    assert skipped["position"] == 1
+    fulfilled = client.get(f"/api/v1/holds/{free_hold['id']}", headers=free).json()
+    assert fulfilled["status"] == "FULFILLED"
+
+    with SessionLocal() as db:
+        counts = dict(
+            db.execute(
+                select(User.id, User.active_loan_count).where(
+                    User.id.in_([busy_hold["member_id"], free_hold["member_id"]])
+                )
+            ).all()
+        )
+    assert counts == {busy_hold["member_id"]: settings.MAX_ACTIVE_LOANS, free_hold["member_id"]: 1}
+
+    # Sin nadie con hueco, la copia queda disponible y la reserva sigue esperando
+    _set_status(client, admin_headers, fulfilled["loan_id"], "CANCELED")
+    assert client.get(f"/api/v1/books/{book_id}", headers=admin_headers).json()["available_copies"] == 1
+    assert client.get(f"/api/v1/holds/{busy_hold['id']}", headers=busy).json()["status"] == "WAITING"
@@ -0,0 +1,98 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from app.core.invalidation import InvalidationListener, publish, register_handler
+from app.db.session import SessionLocal, engine
+
+
+def _unique_entity() -> str:
+    return f"test_{uuid.uuid4().hex[:8]}"
+
+
+def test_publish_applies_locally_only_after_commit():
+    entity = _unique_entity()
+    received = []
+    register_handler(entity, received.append)
+
+    with SessionLocal() as db:
+        publish(db, entity, 1)
+        db.rollback()
+    assert received == []
+
+    with SessionLocal() as db:
+        publish(db, entity, 2)
+        assert received == []
+        db.commit()
+    # Se aplica en el momento del commit (el listener del worker puede repetirlo)
+    assert received[0] == 2
+    assert 1 not in received
+
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="LISTEN/NOTIFY requiere PostgreSQL")
+def test_notifications_converge_across_workers():
+    """
+    Simula varios workers (un listener por worker) sobre la misma BD y
+    comprueba que todos reciben la invalidación poco después del commit.
+    """
+    entity = _unique_entity()
+    workers = 4
+    received = [[] for _ in range(workers)]
+    done = [threading.Event() for _ in range(workers)]
+
+    def collector(index: int):
+        def on_payload(payload: str) -> None:
+            if payload.startswith(entity):
+                received[index].append(payload)
+                done[index].set()
+        return on_payload
+
+    listeners = [
+        InvalidationListener(engine, on_payload=collector(i), poll_interval=0.2)
+        for i in range(workers)
+    ]
+    for listener in listeners:
+        listener.start()
+    try:
+        for listener in listeners:
+            assert listener.ready.wait(5)
+
+        with SessionLocal() as db:
+            publish(db, entity, 42)
+            db.commit()
+            committed_at = time.perf_counter()
+
+        for event in done:
+            assert event.wait(5)
+        elapsed_ms = (time.perf_counter() - committed_at) * 1000
+
+        assert received == [[f"{entity}:42"]] * workers
+        assert elapsed_ms < 1000, f"convergencia en {elapsed_ms:.1f} ms"
+    finally:
+        for listener in listeners:
+            listener.stop()
+
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="LISTEN/NOTIFY requiere PostgreSQL")
+def test_rolled_back_writes_are_not_broadcast():
+    entity = _unique_entity()
+    received = []
+    listener = InvalidationListener(engine, on_payload=received.append, poll_interval=0.1)
+    listener.start()
+    try:
+        assert listener.ready.wait(5)
+        with SessionLocal() as db:
+            publish(db, entity, 1)
+            db.rollback()
+        with SessionLocal() as db:
+            publish(db, entity, 2)
+            db.commit()
+
+        deadline = time.monotonic() + 5
+        while not any(p.startswith(entity) for p in received) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [p for p in received if p.startswith(entity)] == [f"{entity}:2"]
+    finally:
+        listener.stop()
@@ -0,0 +1,117 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, update
+
+from app.core.jobs import JobExecutor, check_canceled, reap_stale_jobs, register_job, report_progress
+from app.db.models import JobRun
+from app.db.session import SessionLocal
+
+started = threading.Event()
+
+
+def _slow_job(db):
+    started.set()
+    for step in range(200):
+        report_progress(step / 200)
+        check_canceled()
+        time.sleep(0.02)
+    return {"rows_affected": 200}
+
+
+register_job("test-slow", _slow_job)
+register_job("test-result", lambda db: {"rows_affected": 2, "checked": 5})
+
+
+def test_job_returns_202_and_is_polled(client: TestClient, admin_headers, wait_for_job):
+    resp = client.post("/admin/jobs/test-result", headers=admin_headers)
+    assert resp.status_code == 202, resp.text
+    queued = resp.json()
+    assert queued["status"] in ("queued", "running")
+    assert resp.headers["Location"] == f"/admin/jobs/{queued['id']}"
+
+    job = wait_for_job(queued["id"])
+    assert job["status"] == "succeeded"
+    assert job["rows_affected"] == 2
+    assert job["result"] == {"rows_affected": 2, "checked": 5}
+    assert job["progress"] == 1.0
+    assert job["started_at"] is not None
+
+    # Una tarea terminada ya no se puede cancelar
+    resp = client.post(f"/admin/jobs/{queued['id']}/cancel", headers=admin_headers)
+    assert resp.status_code == 409
+
+    listed = client.get("/admin/jobs?name=test-result&status=succeeded", headers=admin_headers).json()
+    assert listed[0]["id"] == queued["id"]
+
+
+def test_running_job_can_be_canceled(client: TestClient, admin_headers, wait_for_job):
+    started.clear()
+    job_id = client.post("/admin/jobs/test-slow", headers=admin_headers).json()["id"]
+    assert started.wait(5)
+
+    resp = client.post(f"/admin/jobs/{job_id}/cancel", headers=admin_headers)
+    assert resp.status_code == 202, resp.text
+    assert resp.json()["cancel_requested"] is True
+
+    job = wait_for_job(job_id)
+    assert job["status"] == "canceled"
+    assert job["progress"] < 1.0
+    assert job["finished_at"] is not None
+
+
+def test_job_endpoints_validation(client: TestClient, admin_headers, member_headers):
+    assert client.post("/admin/jobs/no-such-job", headers=admin_headers).status_code == 404
+    assert client.post("/admin/jobs/999999999/cancel", headers=admin_headers).status_code == 404
+    assert client.post("/admin/jobs/test-result", headers=member_headers).status_code == 403
+
+
+def test_reaper_closes_jobs_left_by_dead_workers(client: TestClient, admin_headers, wait_for_job):
+    stale = datetime.now(timezone.utc) - timedelta(hours=1)
+    with SessionLocal() as db:
+        dead = JobRun(job_name="test-result", status="running", worker="dead:1", started_at=stale, heartbeat_at=stale)
+        alive = JobRun(job_name="test-result", status="running", worker="busy:1", started_at=stale,
+                       heartbeat_at=func.now())
+        orphan = JobRun(job_name="test-result", status="queued", worker="dead:1", heartbeat_at=stale)
+        gone = JobRun(job_name="retired-job", status="queued", worker="dead:1", heartbeat_at=stale)
+        db.add_all([dead, alive, orphan, gone])
+        db.commit()
+
+        result = reap_stale_jobs(db)
+        assert dead.id in result["interrupted"]
+        assert alive.id not in result["interrupted"]
+        assert orphan.id in result["requeued"]
+        assert result["failed"] == [gone.id]
+
+    job = client.get(f"/admin/jobs/{dead.id}", headers=admin_headers).json()
+    assert job["status"] == "interrupted"
+    assert job["finished_at"] is not None
+    assert wait_for_job(orphan.id)["status"] == "succeeded"
+    assert client.get(f"/admin/jobs/{gone.id}", headers=admin_headers).json()["status"] == "failed"
+    assert client.get(f"/admin/jobs/{alive.id}", headers=admin_headers).json()["status"] == "running"
+
+    with SessionLocal() as db:
+        db.execute(update(JobRun).where(JobRun.id == alive.id).values(status="canceled"))
+        db.commit()
+
+
+def test_jobs_queued_at_shutdown_are_picked_up_again(client: TestClient, admin_headers, wait_for_job):
+    executor = JobExecutor(max_workers=1, max_pending=5)
+    started.clear()
+    with SessionLocal() as db:
+        busy_id = executor.submit(db, "test-slow").id
+        assert started.wait(5)
+        waiting_id = executor.submit(db, "test-result").id
+    executor.shutdown()
+    client.post(f"/admin/jobs/{busy_id}/cancel", headers=admin_headers)
+
+    # Queda en cola sin dueño: nadie la iba a ejecutar
+    job = client.get(f"/admin/jobs/{waiting_id}", headers=admin_headers).json()
+    assert (job["status"], job["worker"]) == ("queued", None)
+
+    with SessionLocal() as db:
+        assert waiting_id in reap_stale_jobs(db)["requeued"]
+    assert wait_for_job(waiting_id)["status"] == "succeeded"
+    assert wait_for_job(busy_id)["status"] == "canceled"
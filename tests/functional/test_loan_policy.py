@@ -0,0 +1,88 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.db.models import LoanStatus, UserRole
+from app.services.loan_policy import TRANSITIONS, role_may_transition, transition_allowed
+
+
+def test_precompiled_tables_match_declared_rules():
+    for old in LoanStatus:
+        for new in LoanStatus:
+            assert transition_allowed(old, new) == (new in TRANSITIONS[old])
+
+            # Reglas que antes estaban escritas a mano en update_loan_status
+            assert role_may_transition(UserRole.ADMIN, old, new)
+            assert role_may_transition(UserRole.LIBRARIAN, old, new) == (
+                new in {LoanStatus.APPROVED, LoanStatus.BORROWED, LoanStatus.RETURNED, LoanStatus.LOST}
+            )
+            assert role_may_transition(UserRole.MEMBER, old, new) == (
+                old == LoanStatus.REQUESTED and new == LoanStatus.CANCELED
+            )
+
+
+def test_branch_policy_sets_period_and_limit(
+    client: TestClient, admin_headers, member_headers, unique_isbn, clean_member_loans
+):
+    resp = client.post(
+        "/api/v1/branches",
+        json={"name": f"Sucursal Política {uuid.uuid4().hex[:6]}", "address": "Calle Norma 3",
+              "loan_days": 7, "max_active_loans": 1},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    branch_id = resp.json()["id"]
+    book = client.post(
+        "/api/v1/books",
+        json={"title": "Libro Con Política", "author": "Autor Normas", "isbn": unique_isbn("POL"),
+              "total_copies": 3, "available_copies": 3, "branch_id": branch_id},
+        headers=admin_headers,
+    )
+    assert book.status_code == 201, book.text
+    payload = {"book_id": book.json()["id"], "branch_id": branch_id}
+
+    first = client.post("/api/v1/loans", json=payload, headers=member_headers)
+    assert first.status_code == 201, first.text
+    due = datetime.fromisoformat(first.json()["due_date"])
+    assert abs(due - (datetime.now(timezone.utc) + timedelta(days=7))) < timedelta(minutes=1)
+
+    # Límite de la sucursal: 1 préstamo activo
+    second = client.post("/api/v1/loans", json=payload, headers=member_headers)
+    assert second.status_code == 400
+
+    # Al volver al default (NULL) rige settings.MAX_ACTIVE_LOANS
+    resp = client.put(f"/api/v1/branches/{branch_id}", json={"max_active_loans": None}, headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+    third = client.post("/api/v1/loans", json=payload, headers=member_headers)
+    assert third.status_code == 201, third.text
+
+
+def test_branch_limit_counts_loans_at_every_branch(
+    client: TestClient, admin_headers, member_headers, unique_isbn, clean_member_loans
+):
+    branch_ids, payloads = [], []
+    for limit in (None, 1):
+        resp = client.post(
+            "/api/v1/branches",
+            json={"name": f"Sucursal Tope {uuid.uuid4().hex[:6]}", "address": "Calle Norma 4",
+                  "max_active_loans": limit},
+            headers=admin_headers,
+        )
+        assert resp.status_code == 201, resp.text
+        branch_ids.append(resp.json()["id"])
+        book = client.post(
+            "/api/v1/books",
+            json={"title": "Libro Con Tope", "author": "Autor Normas", "isbn": unique_isbn("TOP"),
+                  "total_copies": 2, "available_copies": 2, "branch_id": branch_ids[-1]},
+            headers=admin_headers,
+        )
+        assert book.status_code == 201, book.text
+        payloads.append({"book_id": book.json()["id"], "branch_id": branch_ids[-1]})
+    default_branch, strict_branch = payloads
+
+    # Un préstamo en la sucursal general ya llena el tope de 1 de la estricta
+    assert client.post("/api/v1/loans", json=default_branch, headers=member_headers).status_code == 201
+    strict = client.post("/api/v1/loans", json=strict_branch, headers=member_headers)
+    assert strict.status_code == 400
+    assert client.post("/api/v1/loans", json=default_branch, headers=member_headers).status_code == 201
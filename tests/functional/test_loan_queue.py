@@ -0,0 +1,116 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+
+from app.core.security import hash_password
+from app.db.models import Book, LibraryBranch, Loan, LoanStatus, User, UserRole
+from app.db.session import SessionLocal
+from app.services.loan_queue import claim_loans
+
+
+def _requested_loans(count: int) -> tuple[int, list[int]]:
+    """Sucursal nueva con `count` préstamos REQUESTED (en orden de llegada)."""
+    tag = uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        branch = LibraryBranch(name=f"Branch Queue {tag}", address="Calle Mostrador 40", is_active=True)
+        member = User(
+            email=f"queue-{tag}@library.local",
+            full_name="Queue Member",
+            hashed_password=hash_password("x"),
+            role=UserRole.MEMBER,
+        )
+        db.add_all([branch, member])
+        db.flush()
+        book = Book(
+            title="Libro en Cola",
+            author="Autor Cola",
+            isbn=f"QUE{tag}",
+            total_copies=count,
+            available_copies=count,
+            branch_id=branch.id,
+        )
+        db.add(book)
+        db.flush()
+        now = datetime.now(timezone.utc)
+        loans = []
+        for i in range(count):
+            loan = Loan(
+                member_id=member.id,
+                book_id=book.id,
+                branch_id=branch.id,
+                due_date=now + timedelta(days=14),
+                status=LoanStatus.REQUESTED,
+                created_at=now + timedelta(seconds=i),
+            )
+            db.add(loan)
+            loans.append(loan)
+        db.commit()
+        return branch.id, [loan.id for loan in loans]
+
+
+def _claim(client: TestClient, headers: Dict, branch_id: int, n: int) -> Dict:
+    resp = client.post(f"/api/v1/loans/queue/claim?branch_id={branch_id}&n={n}", headers=headers)
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def test_claims_are_disjoint_and_expire(client: TestClient, admin_headers, librarian_headers):
+    branch_id, loan_ids = _requested_loans(5)
+
+    first = _claim(client, librarian_headers, branch_id, 2)
+    second = _claim(client, admin_headers, branch_id, 2)
+    assert [loan["id"] for loan in first["loans"]] == loan_ids[:2]
+    assert [loan["id"] for loan in second["loans"]] == loan_ids[2:4]
+
+    # Otro mostrador no puede resolver un préstamo reclamado
+    conflict = client.patch(
+        f"/api/v1/loans/{loan_ids[0]}/status",
+        json={"new_status": "APPROVED"},
+        headers=admin_headers,
+    )
+    assert conflict.status_code == 409
+
+    # Transición en bloque: solo los propios con lease vigente
+    resp = client.post(
+        "/api/v1/loans/queue/transition",
+        json={"loan_ids": loan_ids[:3], "new_status": "APPROVED"},
+        headers=librarian_headers,
+    )
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert [loan["id"] for loan in body["updated"]] == loan_ids[:2]
+    assert all(loan["status"] == "APPROVED" for loan in body["updated"])
+    assert body["skipped"] == [{"loan_id": loan_ids[2], "detail": "Loan is not claimed by you"}]
+
+    # El lease vencido devuelve los préstamos a la cola sin intervención
+    with SessionLocal() as db:
+        db.execute(
+            update(Loan)
+            .where(Loan.id.in_(loan_ids[2:4]))
+            .values(claim_expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        )
+        db.commit()
+    third = _claim(client, librarian_headers, branch_id, 5)
+    assert [loan["id"] for loan in third["loans"]] == loan_ids[2:]
+
+    released = client.post("/api/v1/loans/queue/release", json={"loan_ids": loan_ids}, headers=librarian_headers)
+    assert released.json() == {"released": 3}
+
+    anonymous = client.post(f"/api/v1/loans/queue/claim?branch_id={branch_id}")
+    assert anonymous.status_code == 401
+
+
+def test_claim_skips_rows_locked_by_another_desk(client: TestClient):
+    branch_id, loan_ids = _requested_loans(3)
+    with SessionLocal() as desk_a, SessionLocal() as desk_b:
+        librarian = desk_b.execute(select(User).where(User.role == UserRole.ADMIN).limit(1)).scalar()
+
+        # El mostrador A tiene la primera fila bloqueada (transacción abierta)
+        desk_a.execute(select(Loan).where(Loan.id == loan_ids[0]).with_for_update())
+
+        loans, _ = claim_loans(desk_b, librarian, n=2, branch_id=branch_id)
+        assert [loan.id for loan in loans] == loan_ids[1:]
+        desk_a.rollback()
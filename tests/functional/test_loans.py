@@ -1,9 +1,10 @@
 import uuid
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from datetime import datetime, timedelta, timezone
 
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, engine
 from app.db.models import Loan
 
 # Aplica clean_member_loans a todos los tests de este archivo
@@ -109,6 +110,7 @@ def test_run_overdue_job_marks_borrowed_loan_as_overdue(
     admin_headers,
     member_headers,
     unique_isbn,
+    wait_for_job,
 ):
     # 1) Asegurar sucursal y libro
     branch_id = ensure_test_branch(client, admin_headers)
@@ -154,9 +156,11 @@ def test_run_overdue_job_marks_borrowed_loan_as_overdue(
 
     # 6) Ejecutar el job de overdue
     resp = client.post("/api/v1/loans/run-overdue-job", headers=admin_headers)
-    assert resp.status_code == 200, resp.text
-    data = resp.json()
-    assert data["updated_overdue_loans"] >= 1
+    assert resp.status_code == 202, resp.text
+    assert resp.headers["Location"] == f"/admin/jobs/{resp.json()['id']}"
+    job = wait_for_job(resp.json()["id"])
+    assert job["status"] == "succeeded", job
+    assert job["rows_affected"] >= 1
 
     # 7) Verificar que el préstamo ahora está OVERDUE y con multa > 0
     resp = client.get(f"/api/v1/loans/{loan_id}", headers=member_headers)
@@ -379,6 +383,7 @@ def test_overdue_loan_returned_keeps_late_fee(
     admin_headers,
     member_headers,
     unique_isbn,
+    wait_for_job,
 ):
     """
     Préstamo BORROWED con due_date en el pasado:
@@ -447,7 +452,8 @@ def test_overdue_loan_returned_keeps_late_fee(
 
     # Ejecutar job de overdue
     resp_job = client.post("/api/v1/loans/run-overdue-job", headers=admin_headers)
-    assert resp_job.status_code == 200, resp_job.text
+    assert resp_job.status_code == 202, resp_job.text
+    assert wait_for_job(resp_job.json()["id"])["status"] == "succeeded"
 
     # Verificar OVERDUE con multa > 0
     resp = client.get(f"/api/v1/loans/{loan_id}", headers=member_headers)
@@ -623,6 +629,62 @@ def test_loan_history_records_changes(
     data = resp_detail.json()
     assert data["status"] == "BORROWED"
 
+#test funcional del detalle con historial, libro y sucursal en una sola consulta
+def test_loan_detail_includes_history_book_and_branch(
+    client: TestClient,
+    admin_headers,
+    member_headers,
+    unique_isbn,
+):
+    branch = client.post(
+        "/api/v1/branches",
+        json={"name": f"Branch Detalle {uuid.uuid4().hex[:6]}", "address": "Dir", "is_active": True},
+        headers=admin_headers,
+    )
+    assert branch.status_code == 201, branch.text
+    branch_id = branch.json()["id"]
+    book = client.post(
+        "/api/v1/books",
+        json={"title": "Libro Detalle", "author": "Autor", "isbn": unique_isbn("DET"),
+              "total_copies": 1, "branch_id": branch_id},
+        headers=admin_headers,
+    )
+    assert book.status_code == 201, book.text
+
+    loan = client.post(
+        "/api/v1/loans",
+        json={"book_id": book.json()["id"], "branch_id": branch_id},
+        headers=member_headers,
+    )
+    assert loan.status_code == 201, loan.text
+    loan_id = loan.json()["id"]
+    for new_status in ("APPROVED", "BORROWED"):
+        resp = client.patch(f"/api/v1/loans/{loan_id}/status", json={"new_status": new_status}, headers=admin_headers)
+        assert resp.status_code == 200, resp.text
+
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        resp = client.get(f"/api/v1/loans/{loan_id}", headers=member_headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+    assert data["book_title"] == "Libro Detalle"
+    assert data["branch_name"] == branch.json()["name"]
+    assert [(h["old_status"], h["new_status"]) for h in data["status_history"]] == [
+        ("REQUESTED", "APPROVED"),
+        ("APPROVED", "BORROWED"),
+    ]
+    # Préstamo, libro, sucursal e historial: un solo SELECT
+    tables = ("loans", "books", "library_branches", "loan_status_history")
+    assert len([s for s in statements if any(f"FROM {t}" in s or f"JOIN {t}" in s for t in tables)]) == 1
+
+
 #test funcional del historial de préstamos del miembro autenticado
 def test_my_history_returns_only_member_loans(
     client: TestClient,
@@ -1,8 +1,15 @@
+import threading
 import uuid
 from datetime import datetime, timedelta
 from typing import Dict
 
 from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.models import User, UserRole
+from app.db.session import SessionLocal
+from app.services.loan_service import reserve_active_loan_slot
 
 
 def _unique_isbn(prefix: str) -> str:
@@ -205,3 +212,72 @@ def test_admin_invalid_status_fails(
         headers=admin_headers,
     )
     assert resp_invalid.status_code == 422, resp_invalid.text
+
+
+def _active_loan_count(email: str = "member_test@example.com") -> int:
+    with SessionLocal() as db:
+        return db.execute(select(User.active_loan_count).where(User.email == email)).scalar()
+
+
+def test_active_loan_counter_follows_transitions(
+    client: TestClient,
+    admin_headers,
+    member_headers,
+    clean_member_loans,
+):
+    branch_id = _create_branch(client, admin_headers, "Branch Counter", "branch_counter@library.local")
+    book_id = _create_book_one_copy(client, admin_headers, branch_id, title="Libro Contador", isbn_prefix="EDGE-CNT")
+    assert _active_loan_count() == 0
+
+    loan = client.post("/api/v1/loans", json={"book_id": book_id, "branch_id": branch_id}, headers=member_headers)
+    assert loan.status_code == 201, loan.text
+    assert _active_loan_count() == 1
+
+    for new_status in ("APPROVED", "BORROWED"):
+        resp = client.patch(f"/api/v1/loans/{loan.json()['id']}/status", json={"new_status": new_status}, headers=admin_headers)
+        assert resp.status_code == 200, resp.text
+    assert _active_loan_count() == 1
+
+    # Solicitud rechazada después de reservar el cupo (sin copias): el rollback lo devuelve
+    rejected = client.post("/api/v1/loans", json={"book_id": book_id, "branch_id": branch_id}, headers=member_headers)
+    assert rejected.status_code == 400
+    assert _active_loan_count() == 1
+
+    resp = client.patch(f"/api/v1/loans/{loan.json()['id']}/status", json={"new_status": "RETURNED"}, headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+    assert _active_loan_count() == 0
+
+
+def test_concurrent_requests_cannot_exceed_limit():
+    email = f"race-{uuid.uuid4().hex[:8]}@library.local"
+    with SessionLocal() as db:
+        member = User(
+            email=email,
+            full_name="Race Member",
+            hashed_password="x",
+            role=UserRole.MEMBER,
+            active_loan_count=settings.MAX_ACTIVE_LOANS - 1,
+        )
+        db.add(member)
+        db.commit()
+        member_id = member.id
+
+    results = {}
+    with SessionLocal() as first:
+        # La primera solicitud toma el último cupo y aún no confirma
+        results["first"] = reserve_active_loan_slot(first, member_id, settings.MAX_ACTIVE_LOANS)
+
+        def second_request():
+            with SessionLocal() as second:
+                results["second"] = reserve_active_loan_slot(second, member_id, settings.MAX_ACTIVE_LOANS)
+                second.commit()
+
+        racer = threading.Thread(target=second_request)
+        racer.start()
+        racer.join(0.3)
+        assert racer.is_alive()  # espera el lock de la fila de users
+        first.commit()
+        racer.join(5)
+
+    assert results == {"first": True, "second": False}
+    assert _active_loan_count(email) == settings.MAX_ACTIVE_LOANS
@@ -0,0 +1,191 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, text
+
+from app.core.scheduler import record_run
+from app.core.security import hash_password
+from app.db.models import Book, JobChunk, LibraryBranch, Loan, LoanStatus, StatsCounter, User, UserRole
+from app.db.session import SessionLocal
+from app.services import overdue_job
+from app.services.overdue_job import process_overdue
+from app.services.stats_service import read_counters, status_counter
+
+
+def _borrowed_overdue(branches: int, per_branch: int) -> tuple[list[int], list[int]]:
+    tag = uuid.uuid4().hex[:8]
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as db:
+        member = User(
+            email=f"overdue-{tag}@library.local",
+            full_name="Overdue Member",
+            hashed_password=hash_password("x"),
+            role=UserRole.MEMBER,
+        )
+        db.add(member)
+        branch_ids, loans = [], []
+        for b in range(branches):
+            branch = LibraryBranch(name=f"Branch Overdue {tag}-{b}", address="Calle Vencida 42", is_active=True)
+            db.add(branch)
+            db.flush()
+            book = Book(
+                title="Libro Vencido",
+                author="Autor Overdue",
+                isbn=f"OVD{tag}{b}",
+                total_copies=per_branch,
+                available_copies=0,
+                branch_id=branch.id,
+            )
+            db.add(book)
+            db.flush()
+            branch_ids.append(branch.id)
+            for _ in range(per_branch):
+                loan = Loan(
+                    member_id=member.id,
+                    book_id=book.id,
+                    branch_id=branch.id,
+                    due_date=now - timedelta(days=3),
+                    status=LoanStatus.BORROWED,
+                )
+                db.add(loan)
+                loans.append(loan)
+        db.commit()
+        return branch_ids, [loan.id for loan in loans]
+
+
+def _statuses(loan_ids):
+    with SessionLocal() as db:
+        return {loan.id: loan.status for loan in db.query(Loan).filter(Loan.id.in_(loan_ids))}
+
+
+def test_overdue_job_resumes_from_checkpoints(client: TestClient, admin_headers, monkeypatch):
+    branch_ids, loan_ids = _borrowed_overdue(branches=2, per_branch=7)
+    original = overdue_job._transition_chunk
+    fail_branch = branch_ids[1]
+
+    def flaky(db, chunk, today):
+        # Segundo chunk de la segunda sucursal: préstamos loan_ids[10:13]
+        if chunk.branch_id == fail_branch and chunk.start_id == loan_ids[10]:
+            original(db, chunk, today)
+            raise RuntimeError("corte a mitad de la ejecución")
+        return original(db, chunk, today)
+
+    # 1) Primera ejecución: un chunk de la segunda sucursal falla
+    monkeypatch.setattr(overdue_job, "_transition_chunk", flaky)
+    failed_run = record_run("overdue", lambda db: process_overdue(db, workers=3, chunk_size=3))
+    assert failed_run.status == "failed"
+
+    progress = client.get(f"/admin/jobs/{failed_run.id}", headers=admin_headers).json()
+    mine = [b for b in progress["branches"] if b["branch_id"] in branch_ids]
+    # 7 préstamos por sucursal en chunks de 3 -> 3 chunks por sucursal
+    assert [b["chunks"] for b in mine] == [3, 3]
+    assert mine[0]["done"] == 3 and mine[0]["rows_affected"] == 7
+    assert mine[1]["failed"] == 1
+    assert progress["failed_chunks"] >= 1
+    assert progress["progress"] < 1.0
+
+    # El chunk fallido no dejó cambios a medias (su transacción se deshizo)
+    statuses = _statuses(loan_ids)
+    assert [i for i in loan_ids if statuses[i] == LoanStatus.BORROWED] == loan_ids[10:13]
+
+    # Entre ejecuciones vencen préstamos nuevos
+    new_branch_ids, new_loan_ids = _borrowed_overdue(branches=1, per_branch=2)
+
+    # 2) Segunda ejecución: adopta el chunk pendiente y planifica solo lo nuevo
+    monkeypatch.setattr(overdue_job, "_transition_chunk", original)
+    resumed = record_run("overdue", lambda db: process_overdue(db, workers=3, chunk_size=3))
+    assert resumed.status == "succeeded"
+    assert resumed.rows_affected == 5
+
+    with SessionLocal() as db:
+        chunks = db.query(JobChunk).filter(JobChunk.run_id == resumed.id).order_by(JobChunk.id).all()
+    assert [(c.branch_id, c.status, c.attempts, c.rows_affected) for c in chunks] == [
+        (fail_branch, "done", 2, 3),
+        (new_branch_ids[0], "done", 1, 2),
+    ]
+    assert all(status == LoanStatus.OVERDUE for status in _statuses(loan_ids + new_loan_ids).values())
+
+    detail = client.get(f"/admin/jobs/{resumed.id}", headers=admin_headers).json()
+    assert detail["progress"] == 1.0
+    assert detail["rows_processed"] == 5
+
+    missing = client.get("/admin/jobs/999999999", headers=admin_headers)
+    assert missing.status_code == 404
+
+
+def test_overdue_chunk_does_not_hold_counter_locks(monkeypatch):
+    _, loan_ids = _borrowed_overdue(branches=1, per_branch=5)
+    original = overdue_job._transition_chunk
+    lockable = []
+
+    def probe(db, chunk, today):
+        rows = original(db, chunk, today)
+        # Con las transiciones ya hechas, otra transacción toma los contadores sin esperar
+        with SessionLocal() as other:
+            other.execute(text("SET LOCAL lock_timeout = '100ms'"))
+            names = [status_counter(LoanStatus.BORROWED), status_counter(LoanStatus.OVERDUE)]
+            lockable.append(
+                other.execute(
+                    select(StatsCounter.name).where(StatsCounter.name.in_(names)).with_for_update()
+                ).all()
+            )
+            other.rollback()
+        return rows
+
+    with SessionLocal() as db:
+        before = read_counters(db)
+    monkeypatch.setattr(overdue_job, "_transition_chunk", probe)
+    run = record_run("overdue", lambda db: process_overdue(db, workers=1, chunk_size=500))
+    assert run.status == "succeeded", run.error
+    assert lockable
+
+    # Los deltas se aplicaron igual, una vez por chunk
+    with SessionLocal() as db:
+        after = read_counters(db)
+    overdue = status_counter(LoanStatus.OVERDUE)
+    borrowed = status_counter(LoanStatus.BORROWED)
+    assert after[overdue] - before.get(overdue, 0) == run.rows_affected >= len(loan_ids)
+    assert after[borrowed] - before[borrowed] == -run.rows_affected
+
+
+def test_overdue_run_is_skipped_while_another_holds_the_lock():
+    with SessionLocal() as db:
+        holder = db.connection()
+        assert holder.execute(select(func.pg_try_advisory_lock(overdue_job.OVERDUE_LOCK))).scalar()
+        try:
+            run = record_run("overdue", process_overdue)
+        finally:
+            holder.execute(select(func.pg_advisory_unlock(overdue_job.OVERDUE_LOCK)))
+
+    assert run.status == "skipped"
+    assert run.rows_affected is None
+    assert run.result == {"reason": "Another overdue run holds the lock"}
+
+
+def test_overdue_lock_connection_is_not_idle_in_transaction(monkeypatch):
+    _borrowed_overdue(branches=1, per_branch=1)
+    original = overdue_job._transition_chunk
+    holders = []
+
+    def probe(db, chunk, today):
+        # Quien tiene el lock no debe retener un snapshot (vacuum, horizonte de /sync)
+        with SessionLocal() as other:
+            holders.extend(
+                other.execute(
+                    text(
+                        "SELECT a.state, a.xact_start FROM pg_locks l "
+                        "JOIN pg_stat_activity a ON a.pid = l.pid "
+                        "WHERE l.locktype = 'advisory' AND l.granted AND l.objid = :key"
+                    ),
+                    {"key": overdue_job.OVERDUE_LOCK},
+                ).all()
+            )
+        return original(db, chunk, today)
+
+    monkeypatch.setattr(overdue_job, "_transition_chunk", probe)
+    run = record_run("overdue", lambda db: process_overdue(db, workers=1))
+    assert run.status == "succeeded", run.error
+
+    assert holders
+    assert all(state == "idle" and xact_start is None for state, xact_start in holders)
@@ -0,0 +1,167 @@
+import uuid
+from typing import Dict
+
+from fastapi.testclient import TestClient
+
+from app.db.session import SessionLocal
+from app.services.popularity import SlidingWindowCounter, popularity_index
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_sliding_window_expires_old_buckets():
+    clock = FakeClock(1_000 * 3600)
+    counter = SlidingWindowCounter(windows={"1h": 3600, "3h": 3 * 3600}, bucket_seconds=3600, clock=clock)
+
+    counter.add(book_id=1, branch_id=10)
+    counter.add(book_id=2, branch_id=20, count=3)
+    clock.now += 3600
+    counter.add(book_id=1, branch_id=10)
+
+    assert counter.top("1h") == [(1, 1)]
+    assert counter.top("3h") == [(2, 3), (1, 2)]
+    assert counter.top("3h", branch_id=10) == [(1, 2)]
+
+    clock.now += 2 * 3600  # el primer bucket sale de la ventana de 3h
+    assert counter.top("1h") == []
+    assert counter.top("3h") == [(1, 1)]
+
+    clock.now += 3600
+    assert counter.top("3h") == []
+
+
+def test_sliding_window_deduplicates_loans():
+    counter = SlidingWindowCounter()
+    assert counter.add(book_id=5, branch_id=1, loan_id=99) is True
+    assert counter.add(book_id=5, branch_id=1, loan_id=99) is False
+    assert counter.top("7d") == [(5, 1)]
+
+
+def _create_branch(client: TestClient, admin_headers: Dict) -> int:
+    resp = client.post(
+        "/api/v1/branches",
+        json={
+            "name": "Branch Popular",
+            "address": "Calle Ranking 35",
+            "description": "Sucursal para populares",
+            "phone_number": "555-035-0000",
+            "email": "branch_popular@library.local",
+            "is_active": True,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _create_book(client: TestClient, admin_headers: Dict, branch_id: int, title: str) -> int:
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": title,
+            "author": "Autor Popular",
+            "isbn": f"POP{uuid.uuid4().hex[:9]}",
+            "description": "Libro para populares",
+            "genre": "Test",
+            "publication_year": 2024,
+            "total_copies": 5,
+            "branch_id": branch_id,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _borrow(client, admin_headers, member_headers, book_id, branch_id) -> int:
+    resp = client.post(
+        "/api/v1/loans",
+        json={"book_id": book_id, "branch_id": branch_id},
+        headers=member_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    loan_id = resp.json()["id"]
+    for new_status in ("APPROVED", "BORROWED", "RETURNED"):
+        resp = client.patch(
+            f"/api/v1/loans/{loan_id}/status",
+            json={"new_status": new_status},
+            headers=admin_headers,
+        )
+        assert resp.status_code == 200, resp.text
+    return loan_id
+
+
+def test_popular_books_ranking(client: TestClient, admin_headers, member_headers, clean_member_loans):
+    branch_id = _create_branch(client, admin_headers)
+    hit = _create_book(client, admin_headers, branch_id, "Muy Popular")
+    other = _create_book(client, admin_headers, branch_id, "Algo Popular")
+    for _ in range(3):
+        _borrow(client, admin_headers, member_headers, hit, branch_id)
+    _borrow(client, admin_headers, member_headers, other, branch_id)
+
+    resp = client.get(f"/api/v1/books/popular?window=7d&branch_id={branch_id}", headers=member_headers)
+    assert resp.status_code == 200, resp.text
+    assert [(b["book_id"], b["title"], b["borrow_count"]) for b in resp.json()] == [
+        (hit, "Muy Popular", 3),
+        (other, "Algo Popular", 1),
+    ]
+
+    # El arranque reconstruye lo mismo desde loan_status_history
+    with SessionLocal() as db:
+        popularity_index.load(db)
+    rebuilt = client.get(f"/api/v1/books/popular?window=1d&branch_id={branch_id}", headers=member_headers)
+    assert rebuilt.json() == resp.json()
+
+    # Una lectura repetida sale del ranking cacheado (tiempos: tests/benchmarks)
+    with SessionLocal() as db:
+        first = popularity_index.top(db, "7d", branch_id)
+        version = popularity_index.counter._version
+        assert popularity_index.top(db, "7d", branch_id) == first
+        assert popularity_index.counter._top_cache[("7d", branch_id)][0] == version
+
+    invalid = client.get("/api/v1/books/popular?window=2h", headers=member_headers)
+    assert invalid.status_code == 400
+
+
+class _NotifyAfterQuery:
+    """Sesión que ejecuta `during` justo después de la consulta de load()."""
+
+    def __init__(self, db, during) -> None:
+        self._db = db
+        self._during = during
+
+    def execute(self, *args, **kwargs):
+        rows = self._db.execute(*args, **kwargs).all()
+        self._during()
+        return rows
+
+
+def test_reload_does_not_double_count_or_drop_borrows(
+    client: TestClient, admin_headers, member_headers, clean_member_loans
+):
+    branch_id = _create_branch(client, admin_headers)
+    book_id = _create_book(client, admin_headers, branch_id, "Popular Recargado")
+    loan_id = _borrow(client, admin_headers, member_headers, book_id, branch_id)
+
+    def counted() -> int:
+        return dict(popularity_index.counter.top("7d", branch_id)).get(book_id, 0)
+
+    with SessionLocal() as db:
+        popularity_index.load(db)
+    assert counted() == 1
+    # Aviso repetido (p. ej. tras reconectar el bus) de un préstamo ya cargado
+    popularity_index.record_borrow(loan_id)
+    assert counted() == 1
+
+    # Un préstamo confirmado mientras load() reconstruye no se pierde en el cambio
+    with SessionLocal() as db:
+        popularity_index.load(
+            _NotifyAfterQuery(db, lambda: _borrow(client, admin_headers, member_headers, book_id, branch_id))
+        )
+    assert counted() == 2
@@ -0,0 +1,168 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event, insert, select
+
+from app.core.security import hash_password
+from app.db.models import Loan, LoanArchive, LoanStatus, User, UserRole
+from app.db.session import SessionLocal, engine
+from app.services.related_books import build_related, compute_top_k
+
+
+def test_compute_top_k_cosine_ranking():
+    # miembros 1 y 2 tomaron los libros 10 y 20; el miembro 3 tomó 10 y 30
+    pairs = np.array([[1, 10], [1, 20], [2, 10], [2, 20], [3, 10], [3, 30]], dtype=np.int64)
+    support_ids, support_counts = np.unique(pairs[:, 1], return_counts=True)
+
+    books, ranks, related, scores = compute_top_k(pairs, support_ids, support_counts, top_k=5)
+    by_book = {}
+    for b, r, o, s in zip(books, ranks, related, scores):
+        by_book.setdefault(int(b), []).append((int(r), int(o), round(float(s), 4)))
+
+    # 10-20: 2 / sqrt(3 * 2); 10-30: 1 / sqrt(3 * 1)
+    assert by_book[10] == [(0, 20, 0.8165), (1, 30, 0.5774)]
+    assert by_book[20] == [(0, 10, 0.8165)]
+    assert by_book[30] == [(0, 10, 0.5774)]
+
+    only = compute_top_k(pairs, support_ids, support_counts, only_books=[30])
+    assert only[0].tolist() == [30]
+
+
+def _create_branch(client: TestClient, admin_headers: Dict) -> int:
+    resp = client.post(
+        "/api/v1/branches",
+        json={
+            "name": "Branch Related",
+            "address": "Calle Vecinos 36",
+            "description": "Sucursal para relacionados",
+            "phone_number": "555-036-0000",
+            "email": "branch_related@library.local",
+            "is_active": True,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _create_book(client: TestClient, admin_headers: Dict, branch_id: int, title: str) -> int:
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": title,
+            "author": "Autor Related",
+            "isbn": f"REL{uuid.uuid4().hex[:9]}",
+            "description": "Libro para relacionados",
+            "genre": "Test",
+            "publication_year": 2024,
+            "total_copies": 5,
+            "branch_id": branch_id,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _member_with_loans(db, branch_id: int, book_ids) -> int:
+    member = User(
+        email=f"related-{uuid.uuid4().hex[:8]}@library.local",
+        full_name="Related Member",
+        hashed_password=hash_password("x"),
+        role=UserRole.MEMBER,
+    )
+    db.add(member)
+    db.flush()
+    now = datetime.now(timezone.utc)
+    for book_id in book_ids:
+        db.add(
+            Loan(
+                member_id=member.id,
+                book_id=book_id,
+                branch_id=branch_id,
+                due_date=now + timedelta(days=14),
+                status=LoanStatus.RETURNED,
+            )
+        )
+    db.commit()
+    return member.id
+
+
+def _archive_member_loans(db, member_id: int) -> None:
+    loans = Loan.__table__
+    rows = db.execute(select(loans).where(loans.c.member_id == member_id)).mappings().all()
+    db.execute(insert(LoanArchive), [dict(row) for row in rows])
+    db.execute(delete(loans).where(loans.c.member_id == member_id))
+    db.commit()
+
+
+def test_related_books_served_from_index(client: TestClient, admin_headers, member_headers):
+    branch_id = _create_branch(client, admin_headers)
+    base, twin, other, late = (
+        _create_book(client, admin_headers, branch_id, title)
+        for title in ("Base", "Gemelo", "Otro", "Tardío")
+    )
+
+    with SessionLocal() as db:
+        _member_with_loans(db, branch_id, [base, twin])
+        _member_with_loans(db, branch_id, [base, twin, other])
+        build_related(db, full=True)
+
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        resp = client.get(f"/api/v1/books/{base}/related", headers=member_headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert resp.status_code == 200, resp.text
+    assert [b["book_id"] for b in resp.json()] == [twin, other]
+    assert resp.json()[0]["title"] == "Gemelo"
+    # La lectura online nunca consulta la tabla de préstamos
+    assert not any("FROM loans" in s or "JOIN loans" in s for s in statements)
+
+    # Un préstamo nuevo: el job incremental solo recalcula los libros afectados
+    with SessionLocal() as db:
+        _member_with_loans(db, branch_id, [late, other])
+        result = build_related(db)
+    assert result["mode"] == "incremental"
+
+    resp_other = client.get(f"/api/v1/books/{other}/related", headers=member_headers)
+    assert {b["book_id"] for b in resp_other.json()} == {base, twin, late}
+
+    missing = client.get("/api/v1/books/999999999/related", headers=member_headers)
+    assert missing.status_code == 404
+
+
+def test_related_books_count_archived_loans(client: TestClient, admin_headers, member_headers):
+    branch_id = _create_branch(client, admin_headers)
+    base, twin, other = (
+        _create_book(client, admin_headers, branch_id, title) for title in ("Archivo", "Par", "Suelto")
+    )
+
+    with SessionLocal() as db:
+        archived = _member_with_loans(db, branch_id, [base, twin])
+        _archive_member_loans(db, archived)
+        _member_with_loans(db, branch_id, [base, other])
+        build_related(db, full=True)
+
+    # El par del miembro archivado sigue contando en el cálculo completo
+    resp = client.get(f"/api/v1/books/{base}/related", headers=member_headers)
+    assert resp.status_code == 200, resp.text
+    assert {b["book_id"] for b in resp.json()} == {twin, other}
+
+    # ...y en el incremental: el soporte de `base` incluye al miembro archivado
+    with SessionLocal() as db:
+        _member_with_loans(db, branch_id, [twin])
+        result = build_related(db)
+    assert result["mode"] == "incremental"
+
+    resp_twin = client.get(f"/api/v1/books/{twin}/related", headers=member_headers)
+    assert [b["book_id"] for b in resp_twin.json()] == [base]
+    assert resp_twin.json()[0]["score"] == 0.5  # 1 miembro en común / sqrt(2 * 2)
@@ -0,0 +1,227 @@
+import threading
+import time
+import uuid
+from typing import Dict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import books as books_endpoint
+from app.core.cache import MemoryCacheBackend, RedisCacheBackend, ResponseCache, response_cache
+from app.core.invalidation import dispatch
+from app.services import catalog_cache
+
+
+def _create_branch(client: TestClient, admin_headers: Dict) -> int:
+    resp = client.post(
+        "/api/v1/branches",
+        json={
+            "name": "Branch Cache",
+            "address": "Calle Cache 31",
+            "description": "Sucursal para caché de respuestas",
+            "phone_number": "555-031-0000",
+            "email": "branch_cache@library.local",
+            "is_active": True,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _create_book(client: TestClient, admin_headers: Dict, branch_id: int) -> int:
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": "Libro Cache",
+            "author": "Autor Cache",
+            "isbn": f"CACHE{uuid.uuid4().hex[:8]}",
+            "description": "Libro para caché de respuestas",
+            "genre": "Test",
+            "publication_year": 2024,
+            "total_copies": 2,
+            "branch_id": branch_id,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _namespace_stats(client: TestClient, admin_headers: Dict, namespace: str) -> Dict:
+    resp = client.get("/admin/cache", headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+    for ns in resp.json()["namespaces"]:
+        if ns["namespace"] == namespace:
+            return ns
+    return {"hits": 0, "misses": 0}
+
+
+def test_memory_backend_lru_and_ttl():
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    assert backend.get("a") == 1      # "a" pasa a ser el más reciente
+    backend.set("c", 3, ttl=60)       # expulsa "b"
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.evictions == 1
+
+    backend.set("short", 4, ttl=0)
+    time.sleep(0.01)
+    assert backend.get("short") is None
+
+
+def test_invalidate_bumps_version_and_hides_old_entries():
+    cache = ResponseCache(MemoryCacheBackend(max_entries=10), ttl_seconds=60)
+
+    value, version = cache.lookup("book", 1, scope="book:1")
+    assert value is None
+    cache.store("book", 1, version, {"title": "v1"}, scope="book:1")
+    assert cache.lookup("book", 1, scope="book:1")[0] == {"title": "v1"}
+
+    cache.invalidate("book:1")
+    assert cache.lookup("book", 1, scope="book:1")[0] is None
+
+    # Un resultado calculado antes de la invalidación no se puede guardar como vigente
+    cache.store("book", 1, version, {"title": "viejo"}, scope="book:1")
+    assert cache.lookup("book", 1, scope="book:1")[0] is None
+
+    stats = {s["namespace"]: s for s in cache.stats()}["book"]
+    assert stats["hits"] == 1
+    assert stats["invalidations"] == 1
+
+
+def test_redis_backend_shares_versions():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    worker_a = ResponseCache(RedisCacheBackend("", client=fakeredis.FakeRedis(server=server)), 60)
+    worker_b = ResponseCache(RedisCacheBackend("", client=fakeredis.FakeRedis(server=server)), 60)
+
+    _, version = worker_a.lookup("books_list", "page-1")
+    worker_a.store("books_list", "page-1", version, {"items": [1, 2]})
+    assert worker_b.lookup("books_list", "page-1")[0] == {"items": [1, 2]}
+
+    worker_b.invalidate("books_list")
+    assert worker_a.lookup("books_list", "page-1")[0] is None
+
+
+def test_shared_backend_bumps_versions_once_per_write(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = ResponseCache(RedisCacheBackend("", client=fakeredis.FakeRedis()), 60)
+    monkeypatch.setattr(catalog_cache, "response_cache", cache)
+
+    # Commit del worker que escribe y luego el NOTIFY en él y en otros dos workers
+    dispatch("book:7", local=True)
+    for _ in range(3):
+        dispatch("book:7")
+    assert cache.backend.get_version("book:7") == 1
+    assert cache.backend.get_version("books_list") == 1
+
+
+def test_get_book_served_from_cache_and_invalidated_by_loans(
+    client: TestClient,
+    admin_headers,
+    member_headers,
+    clean_member_loans,
+):
+    branch_id = _create_branch(client, admin_headers)
+    book_id = _create_book(client, admin_headers, branch_id)
+
+    before = _namespace_stats(client, admin_headers, "book")
+    first = client.get(f"/api/v1/books/{book_id}", headers=admin_headers)
+    second = client.get(f"/api/v1/books/{book_id}", headers=admin_headers)
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert first.headers["ETag"] == second.headers["ETag"]
+    after = _namespace_stats(client, admin_headers, "book")
+    assert after["hits"] >= before["hits"] + 1
+
+    # change_loan_status cambia available_copies e invalida la entrada
+    resp_loan = client.post(
+        "/api/v1/loans",
+        json={"book_id": book_id, "branch_id": branch_id},
+        headers=member_headers,
+    )
+    assert resp_loan.status_code == 201, resp_loan.text
+    loan_id = resp_loan.json()["id"]
+    for new_status in ("APPROVED", "BORROWED"):
+        resp = client.patch(
+            f"/api/v1/loans/{loan_id}/status",
+            json={"new_status": new_status},
+            headers=admin_headers,
+        )
+        assert resp.status_code == 200, resp.text
+
+    refreshed = client.get(f"/api/v1/books/{book_id}", headers=admin_headers)
+    assert refreshed.json()["available_copies"] == 1
+
+    listing = client.get(f"/api/v1/books?branch_id={branch_id}", headers=admin_headers)
+    assert listing.json()[0]["available_copies"] == 1
+
+
+def test_conditional_get_works_with_cold_cache(client: TestClient, admin_headers):
+    branch_id = _create_branch(client, admin_headers)
+    _create_book(client, admin_headers, branch_id)
+    url = f"/api/v1/books?branch_id={branch_id}"
+
+    first = client.get(url, headers=admin_headers)
+    assert first.status_code == 200
+
+    # Con la caché vacía, el agregado SQL debe producir el mismo ETag
+    response_cache.clear()
+    cached = client.get(url, headers={**admin_headers, "If-None-Match": first.headers["ETag"]})
+    assert cached.status_code == 304
+
+
+def test_read_in_flight_during_a_write_is_not_cached_as_current(
+    client: TestClient,
+    admin_headers,
+    member_headers,
+    monkeypatch,
+):
+    """
+    Una lectura que empezó antes de una escritura no puede prestarle su
+    resultado a una petición posterior ni quedar guardada con la versión nueva.
+    """
+    branch_id = _create_branch(client, admin_headers)
+    book_id = _create_book(client, admin_headers, branch_id)
+    url = f"/api/v1/books/{book_id}"
+
+    loaded, release = threading.Event(), threading.Event()
+    original_do = books_endpoint.book_reads.do
+    blocked = []
+
+    def do(key, fn):
+        def slow():
+            result = fn()
+            if not blocked:
+                # Solo la primera lectura: ya leyó la fila y se queda en vuelo
+                blocked.append(key)
+                loaded.set()
+                release.wait(timeout=5)
+            return result
+        return original_do(key, slow)
+
+    monkeypatch.setattr(books_endpoint.book_reads, "do", do)
+    response_cache.clear()
+
+    responses = {}
+    before = threading.Thread(target=lambda: responses.setdefault("before", client.get(url, headers=member_headers)))
+    before.start()
+    assert loaded.wait(timeout=5)
+
+    resp = client.put(url, json={"title": "Libro Cache Editado"}, headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+
+    after = threading.Thread(target=lambda: responses.setdefault("after", client.get(url, headers=member_headers)))
+    after.start()
+    after.join(timeout=5)
+    # No se quedó esperando a la lectura anterior a la escritura
+    assert not after.is_alive()
+    release.set()
+    before.join(timeout=5)
+
+    assert responses["before"].json()["title"] == "Libro Cache"
+    assert responses["after"].json()["title"] == "Libro Cache Editado"
+    assert client.get(url, headers=member_headers).json()["title"] == "Libro Cache Editado"
@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.core.responses import FastJSONResponse, _stdlib_dumps
+from app.db.models import LoanStatus
+from app.schemas.loan import LoanRead
+
+
+def _sample_loan() -> LoanRead:
+    now = datetime(2025, 12, 1, 10, 30, 15, 123456, tzinfo=timezone.utc)
+    return LoanRead(
+        id=1,
+        member_id=2,
+        book_id=3,
+        branch_id=4,
+        borrow_date=now,
+        due_date=now,
+        return_date=None,
+        status=LoanStatus.OVERDUE,
+        late_fee_amount=Decimal("3.50"),
+        notes="Ñandú",
+        created_at=now,
+        updated_at=now,
+    )
+
+
+def test_fast_json_matches_default_encoding_for_models():
+    """
+    El encoder rápido debe producir exactamente los mismos bytes que
+    JSONResponse + jsonable_encoder (fechas, enums y multas Numeric).
+    """
+    loans = [_sample_loan(), _sample_loan()]
+
+    expected = JSONResponse(jsonable_encoder(loans)).body
+    assert FastJSONResponse(loans).body == expected
+    assert _stdlib_dumps(loans) == expected
+
+
+def test_fast_json_matches_default_encoding_for_plain_values():
+    now = datetime(2025, 12, 1, 10, 30, tzinfo=timezone.utc)
+    payload = {
+        "status": LoanStatus.BORROWED,
+        "fee": Decimal("2.00"),
+        "fee_cents": Decimal("1.25"),
+        "at": now,
+        "count": 7,
+    }
+
+    expected = JSONResponse(jsonable_encoder(payload)).body
+    assert FastJSONResponse(payload).body == expected
+    assert _stdlib_dumps(payload) == expected
+
+
+def test_api_returns_json_with_fast_encoder(client: TestClient, admin_headers):
+    resp = client.get("/api/v1/books", headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+    assert resp.headers["content-type"].startswith("application/json")
+    assert isinstance(resp.json(), list)
+
+    resp_root = client.get("/")
+    assert resp_root.status_code == 200
+    assert resp_root.json() == {"message": "Library API running"}
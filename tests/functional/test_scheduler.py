@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from app.core.scheduler import CronSchedule, Scheduler, record_run
+from app.db.session import engine
+
+
+def test_cron_schedule_fields():
+    every_15 = CronSchedule("*/15 * * * *")
+    assert every_15.matches(datetime(2026, 1, 5, 10, 30))
+    assert not every_15.matches(datetime(2026, 1, 5, 10, 31))
+
+    nightly = CronSchedule("30 3 * * 1-5")
+    assert nightly.matches(datetime(2026, 1, 5, 3, 30))       # lunes
+    assert not nightly.matches(datetime(2026, 1, 4, 3, 30))   # domingo
+
+    # Día del mes y día de la semana restringidos: basta con uno (como cron)
+    either = CronSchedule("0 0 1 * 0")
+    assert either.matches(datetime(2026, 1, 1, 0, 0))
+    assert either.matches(datetime(2026, 1, 4, 0, 0))
+    assert not either.matches(datetime(2026, 1, 5, 0, 0))
+
+
+def test_only_one_worker_leads():
+    first, second = Scheduler(engine), Scheduler(engine)
+    try:
+        assert first.try_acquire_leadership() is True
+        assert second.try_acquire_leadership() is False
+        assert first.try_acquire_leadership() is True  # renueva sin perderlo
+
+        first.stop()  # el líder se va: el lock se libera con su conexión
+        assert second.try_acquire_leadership() is True
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_leader_runs_due_jobs_and_records_them(client: TestClient, admin_headers):
+    calls = []
+
+    def job(db):
+        calls.append(db)
+        return 7
+
+    def broken(db):
+        raise RuntimeError("boom")
+
+    scheduler = Scheduler(engine)
+    scheduler.add_job("test-every-minute", "* * * * *", job)
+    scheduler.add_job("test-never", "0 0 31 2 *", job)
+    try:
+        asyncio.run(scheduler.tick(datetime.now(timezone.utc)))
+        assert scheduler.is_leader
+        scheduler._executor.shutdown(wait=True)
+    finally:
+        scheduler.stop()
+    assert len(calls) == 1
+
+    failed = record_run("test-broken", broken)
+    assert failed.status == "failed"
+    assert "boom" in failed.error
+
+    resp = client.get("/admin/jobs?name=test-every-minute", headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+    run = resp.json()[0]
+    assert run["status"] == "succeeded"
+    assert run["rows_affected"] == 7
+    assert run["duration_ms"] >= 0
+    assert run["finished_at"] is not None
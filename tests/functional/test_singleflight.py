@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.singleflight import SingleFlight, make_key
+
+
+def test_make_key_normalizes_params():
+    a = make_key("books.list", {"title": "x", "skip": 0, "author": None}, scope="member")
+    b = make_key("books.list", {"skip": 0, "title": "x"}, scope="member")
+    c = make_key("books.list", {"skip": 0, "title": "x"}, scope="admin")
+    assert a == b
+    assert a != c
+
+
+def test_concurrent_sync_calls_share_one_execution():
+    group = SingleFlight("test-sync")
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_query():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return ("resultado",)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(group.do("k", slow_query)))
+        for _ in range(8)
+    ]
+    threads[0].start()
+    started.wait(timeout=5)
+    for t in threads[1:]:
+        t.start()
+    # Dar tiempo a que los seguidores se queden esperando la llamada en vuelo
+    deadline = time.monotonic() + 5
+    while group.stats()["coalesced"] < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert len(calls) == 1
+    assert results == [("resultado",)] * 8
+    stats = group.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 7
+    assert stats["in_flight"] == 0
+
+    # Terminada la llamada, la siguiente vuelve a ejecutar
+    group.do("k", slow_query)
+    assert len(calls) == 2
+
+
+def test_sync_errors_are_shared_and_not_cached():
+    group = SingleFlight("test-errors")
+
+    def failing():
+        raise HTTPException(status_code=404, detail="Book not found")
+
+    with pytest.raises(HTTPException):
+        group.do("missing", failing)
+    assert group.do("missing", lambda: "ok") == "ok"
+
+
+def test_concurrent_async_calls_share_one_execution():
+    group = SingleFlight("test-async")
+    calls = []
+
+    async def slow_query():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def run():
+        return await asyncio.gather(*(group.do_async("k", slow_query) for _ in range(10)))
+
+    assert asyncio.run(run()) == [42] * 10
+    assert len(calls) == 1
+    assert group.stats()["coalesced"] == 9
+
+
+def test_admin_can_read_singleflight_counters(client: TestClient, admin_headers, member_headers):
+    resp = client.get("/api/v1/books", headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+
+    stats = client.get("/admin/singleflight", headers=admin_headers)
+    assert stats.status_code == 200, stats.text
+    books = next(s for s in stats.json() if s["name"] == "books")
+    assert books["executions"] >= 1
+
+    forbidden = client.get("/admin/singleflight", headers=member_headers)
+    assert forbidden.status_code == 403
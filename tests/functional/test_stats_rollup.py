@@ -0,0 +1,162 @@
+import uuid
+from typing import Dict
+
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.core.security import hash_password
+from app.db.models import StatsCounter, User, UserRole
+from app.db.session import SessionLocal
+from app.services.stats_service import compute_counters, read_counters, role_counter
+
+
+def _create_branch(client: TestClient, admin_headers: Dict) -> int:
+    resp = client.post(
+        "/api/v1/branches",
+        json={
+            "name": "Branch Stats",
+            "address": "Calle Contadores 33",
+            "description": "Sucursal para contadores de stats",
+            "phone_number": "555-033-0000",
+            "email": "branch_stats@library.local",
+            "is_active": True,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _create_book(client: TestClient, admin_headers: Dict, branch_id: int, copies: int) -> int:
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": "Libro Stats",
+            "author": "Autor Stats",
+            "isbn": f"STATS{uuid.uuid4().hex[:8]}",
+            "description": "Libro para contadores de stats",
+            "genre": "Test",
+            "publication_year": 2024,
+            "total_copies": copies,
+            "branch_id": branch_id,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _reconcile(client: TestClient, admin_headers: Dict, dry_run: bool) -> Dict:
+    resp = client.post(
+        f"/admin/stats/reconcile?dry_run={'true' if dry_run else 'false'}",
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def test_stats_counters_follow_writes(
+    client: TestClient,
+    admin_headers,
+    member_headers,
+    clean_member_loans,
+):
+    _reconcile(client, admin_headers, dry_run=False)
+
+    resp_user = client.post(
+        "/api/v1/auth/register",
+        json={
+            "email": f"stats-{uuid.uuid4().hex[:8]}@example.com",
+            "full_name": "Stats Member",
+            "password": "stats123",
+        },
+    )
+    assert resp_user.status_code == 201, resp_user.text
+    resp_role = client.put(
+        f"/api/v1/users/{resp_user.json()['id']}",
+        json={"role": "librarian"},
+        headers=admin_headers,
+    )
+    assert resp_role.status_code == 200, resp_role.text
+
+    branch_id = _create_branch(client, admin_headers)
+    book_id = _create_book(client, admin_headers, branch_id, copies=3)
+    resp_book = client.put(
+        f"/api/v1/books/{book_id}",
+        json={"total_copies": 5, "available_copies": 5},
+        headers=admin_headers,
+    )
+    assert resp_book.status_code == 200, resp_book.text
+
+    resp_loan = client.post(
+        "/api/v1/loans",
+        json={"book_id": book_id, "branch_id": branch_id},
+        headers=member_headers,
+    )
+    assert resp_loan.status_code == 201, resp_loan.text
+    loan_id = resp_loan.json()["id"]
+    for new_status in ("APPROVED", "BORROWED"):
+        resp = client.patch(
+            f"/api/v1/loans/{loan_id}/status",
+            json={"new_status": new_status},
+            headers=admin_headers,
+        )
+        assert resp.status_code == 200, resp.text
+
+    # Los contadores incrementales coinciden con un recálculo completo
+    assert _reconcile(client, admin_headers, dry_run=True)["drift"] == []
+
+    stats = client.get("/admin/stats", headers=admin_headers).json()
+    with SessionLocal() as db:
+        expected, _ = compute_counters(db)
+    assert stats["total_book_copies"] == expected["books.total_copies"]
+    assert stats["total_available_copies"] == expected["books.available_copies"]
+    assert stats["total_librarians"] == expected["users.role.LIBRARIAN"]
+    assert stats["active_loans"] >= 1
+    assert stats["loans_last_30_days"] >= 1
+
+
+def test_rolled_back_write_does_not_touch_counters(client: TestClient, admin_headers):
+    _reconcile(client, admin_headers, dry_run=False)
+    with SessionLocal() as db:
+        before = read_counters(db)[role_counter(UserRole.MEMBER)]
+
+    with SessionLocal() as db:
+        db.add(
+            User(
+                email=f"rollback-{uuid.uuid4().hex[:8]}@library.local",
+                full_name="Rollback",
+                hashed_password=hash_password("x"),
+                role=UserRole.MEMBER,
+            )
+        )
+        db.flush()
+        # Dentro de la transacción el contador ya se movió...
+        assert read_counters(db)[role_counter(UserRole.MEMBER)] == before + 1
+        db.rollback()
+
+    # ...pero el rollback lo deshace junto con la fila
+    with SessionLocal() as db:
+        assert read_counters(db)[role_counter(UserRole.MEMBER)] == before
+
+
+def test_reconcile_reports_and_repairs_drift(client: TestClient, admin_headers):
+    _reconcile(client, admin_headers, dry_run=False)
+
+    with SessionLocal() as db:
+        db.execute(
+            update(StatsCounter)
+            .where(StatsCounter.name == "books.total_copies")
+            .values(value=StatsCounter.value + 7)
+        )
+        db.commit()
+
+    report = _reconcile(client, admin_headers, dry_run=True)
+    assert [d["counter"] for d in report["drift"]] == ["books.total_copies"]
+    drift = report["drift"][0]
+    assert drift["stored"] - drift["actual"] == 7
+    assert report["applied"] is False
+
+    repaired = _reconcile(client, admin_headers, dry_run=False)
+    assert repaired["applied"] is True
+    assert _reconcile(client, admin_headers, dry_run=True)["drift"] == []
@@ -0,0 +1,165 @@
+import random
+import uuid
+from typing import Dict
+
+from fastapi.testclient import TestClient
+
+from app.db.session import SessionLocal
+from app.services.suggest_index import PrefixIndex, SuggestIndex, normalize, suggest_index
+
+
+def test_normalize_folds_case_accents_and_punctuation():
+    assert normalize("Cien Años de Soledad (Edición Ñandú)") == "cien anos de soledad edicion nandu"
+    assert normalize("  Straße:  El-Camino ") == "strasse el camino"
+    assert normalize(None) == ""
+
+
+def _names(results):
+    return [r["title"] for r in results]
+
+
+def test_prefix_index_ranks_title_start_first():
+    index = SuggestIndex()
+    index._base = PrefixIndex(
+        [
+            (1, "El Principito", "Antoine de Saint-Exupéry"),
+            (2, "Príncipe Caspian", "C. S. Lewis"),
+            (3, "Historia del Arte", "Pedro Príncipe"),
+            (4, "Cocina", None),
+        ]
+    )
+    index.ready.set()
+
+    # título desde el inicio > palabra del título > autor
+    assert _names(index.suggest(None, "PRIN")) == ["Príncipe Caspian", "El Principito", "Historia del Arte"]
+    assert _names(index.suggest(None, "saint ex")) == ["El Principito"]
+    assert index.suggest(None, "zzz") == []
+    assert index.suggest(None, " ¿? ") == []
+
+    # El overlay se consulta junto con la base: alta, cambio y borrado
+    index.put(5, "Primavera", "Autora Nueva")
+    index.put(2, "Caspian", "C. S. Lewis")
+    index.remove(1)
+    assert _names(index.suggest(None, "pri")) == ["Primavera", "Historia del Arte"]
+    assert _names(index.suggest(None, "pri", limit=1)) == ["Primavera"]
+
+
+def _brute_force(books, overlay, prefix: str, limit: int = 10) -> list[int]:
+    """Referencia: mejor (tier, texto) de cada libro recorriendo todo."""
+    current = {book_id: (title, author) for book_id, title, author in books}
+    for book_id, fields in overlay.items():
+        if fields is None:
+            current.pop(book_id, None)
+        else:
+            current[book_id] = fields
+    best = {}
+    for book_id, (title, author) in current.items():
+        for field, value in enumerate((title, author)):
+            words = normalize(value).split(" ")[:16]
+            for offset, _ in enumerate(words):
+                text = " ".join(words[offset:])
+                if text.startswith(prefix):
+                    key = (field * 2 + (0 if offset == 0 else 1), text.encode("utf-8"), book_id)
+                    best[book_id] = min(best.get(book_id, key), key)
+    return [key[2] for key in sorted(best.values())[:limit]]
+
+
+def test_suggest_matches_brute_force_on_large_index():
+    rng = random.Random(37)
+    words = [f"{w}{i}" for i in range(40) for w in ("sol", "mar", "luz", "rio", "casa")]
+    books = [
+        (i, " ".join(rng.choices(words, k=4)), f"Autor {rng.choice(words)}")
+        for i in range(1, 5_001)
+    ]
+    index = SuggestIndex()
+    index._base = PrefixIndex(books)
+    index.ready.set()
+    overlay = {}
+    for book_id in rng.sample(range(1, 6_001), 300):
+        if rng.random() < 0.2:
+            index.remove(book_id)
+            overlay[book_id] = None
+        else:
+            fields = (" ".join(rng.choices(words, k=3)), f"Autor {rng.choice(words)}")
+            index.put(book_id, *fields)
+            overlay[book_id] = fields
+    assert index.stats()["entries"] == 5_300
+
+    for prefix in [rng.choice(words)[:n] for n in (1, 2, 3, 4, 5) for _ in range(20)]:
+        got = [r["book_id"] for r in index.suggest(None, prefix)]
+        assert got == _brute_force(books, overlay, prefix), prefix
+
+
+def test_title_start_matches_beyond_many_word_matches():
+    """Cientos de coincidencias de tier bajo antes (alfabéticamente) no ocultan un título que empieza por el prefijo."""
+    books = [(i, f"El Primo {i:03d}", None) for i in range(1, 501)]
+    books.append((999, "Prize", None))
+    index = SuggestIndex()
+    index._base = PrefixIndex(books)
+    index.ready.set()
+    assert [r["book_id"] for r in index.suggest(None, "pri", limit=3)] == [999, 1, 2]
+
+    index.put(1000, "Primero", None)
+    assert [r["book_id"] for r in index.suggest(None, "pri", limit=3)] == [1000, 999, 1]
+
+
+def _create_book(client: TestClient, admin_headers: Dict, branch_id: int, title: str, author: str) -> int:
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": title,
+            "author": author,
+            "isbn": f"SUG{uuid.uuid4().hex[:9]}",
+            "description": "Libro para autocompletado",
+            "genre": "Test",
+            "publication_year": 2024,
+            "total_copies": 1,
+            "branch_id": branch_id,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def test_suggest_endpoint_follows_catalog_changes(client: TestClient, admin_headers, member_headers):
+    resp = client.post(
+        "/api/v1/branches",
+        json={
+            "name": "Branch Suggest",
+            "address": "Calle Prefijo 37",
+            "description": "Sucursal para autocompletado",
+            "phone_number": "555-037-0000",
+            "email": "branch_suggest@library.local",
+            "is_active": True,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    branch_id = resp.json()["id"]
+
+    tag = uuid.uuid4().hex[:6]
+    with SessionLocal() as db:
+        suggest_index.load(db)
+    book_id = _create_book(client, admin_headers, branch_id, f"Zafiro{tag} Ártico", "Úrsula Sugerida")
+
+    resp = client.get(f"/api/v1/books/suggest?q=zafiro{tag}", headers=member_headers)
+    assert resp.status_code == 200, resp.text
+    assert resp.json() == [{"book_id": book_id, "title": f"Zafiro{tag} Ártico", "author": "Úrsula Sugerida"}]
+
+    resp = client.put(f"/api/v1/books/{book_id}", json={"title": f"Rubí{tag}"}, headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+    assert client.get(f"/api/v1/books/suggest?q=zafiro{tag}", headers=member_headers).json() == []
+    renamed = client.get(f"/api/v1/books/suggest?q=rubi{tag}", headers=member_headers).json()
+    assert [b["book_id"] for b in renamed] == [book_id]
+
+    resp = client.delete(f"/api/v1/books/{book_id}", headers=admin_headers)
+    assert resp.status_code == 204
+    assert client.get(f"/api/v1/books/suggest?q=rubi{tag}", headers=member_headers).json() == []
+
+    too_many = client.get("/api/v1/books/suggest?q=a&limit=50", headers=member_headers)
+    assert too_many.status_code == 422
+
+    indexes = client.get("/admin/indexes", headers=admin_headers)
+    assert indexes.status_code == 200, indexes.text
+    assert {i["name"] for i in indexes.json()} == {"suggest", "related"}
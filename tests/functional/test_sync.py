@@ -0,0 +1,188 @@
+import uuid
+from typing import Dict
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.db.models import Book
+from app.db.session import SessionLocal
+
+
+@pytest.fixture
+def no_sync_lag(monkeypatch):
+    """Sin margen de seguridad: el horizonte es solo la transacción abierta más antigua."""
+    monkeypatch.setattr(settings, "SYNC_SAFETY_LAG_SECONDS", 0)
+
+
+def _create_branch(client: TestClient, admin_headers: Dict) -> int:
+    resp = client.post(
+        "/api/v1/branches",
+        json={
+            "name": "Branch Sync",
+            "address": "Calle Delta 1",
+            "description": "Sucursal para sincronización",
+            "phone_number": "555-000-1111",
+            "email": "branch_sync@library.local",
+            "is_active": True,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _create_book(client: TestClient, admin_headers: Dict, branch_id: int, title: str) -> int:
+    resp = client.post(
+        "/api/v1/books",
+        json={
+            "title": title,
+            "author": "Autor Sync",
+            "isbn": f"SYNC{uuid.uuid4().hex[:9]}",
+            "description": "Libro para sincronización",
+            "genre": "Test",
+            "publication_year": 2023,
+            "total_copies": 1,
+            "branch_id": branch_id,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+def _drain(client: TestClient, url: str, headers: Dict, since: str | None = None):
+    """Recorre todas las páginas y devuelve (items, deleted, token final)."""
+    items, deleted = [], []
+    while True:
+        params = {"limit": 50}
+        if since:
+            params["since"] = since
+        resp = client.get(url, params=params, headers=headers)
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        items.extend(body["items"])
+        deleted.extend(body["deleted"])
+        since = body["next_token"]
+        if not body["has_more"]:
+            return items, deleted, since
+
+
+def test_book_changes_returns_only_delta(client: TestClient, admin_headers, no_sync_lag):
+    branch_id = _create_branch(client, admin_headers)
+    kept_id = _create_book(client, admin_headers, branch_id, "Libro Sync Existente")
+    doomed_id = _create_book(client, admin_headers, branch_id, "Libro Sync Borrado")
+
+    _, _, token = _drain(client, "/api/v1/books/changes", admin_headers)
+
+    # Sin cambios: página vacía y el token no retrocede
+    empty = client.get("/api/v1/books/changes", params={"since": token}, headers=admin_headers)
+    assert empty.status_code == 200
+    assert empty.json()["items"] == []
+    assert empty.json()["deleted"] == []
+
+    new_id = _create_book(client, admin_headers, branch_id, "Libro Sync Nuevo")
+    resp_update = client.put(
+        f"/api/v1/books/{kept_id}",
+        json={"title": "Libro Sync Editado"},
+        headers=admin_headers,
+    )
+    assert resp_update.status_code == 200, resp_update.text
+    resp_delete = client.delete(f"/api/v1/books/{doomed_id}", headers=admin_headers)
+    assert resp_delete.status_code == 204, resp_delete.text
+
+    items, deleted, _ = _drain(client, "/api/v1/books/changes", admin_headers, since=token)
+    assert [b["id"] for b in items] == [new_id, kept_id]
+    assert deleted == [doomed_id]
+
+
+def test_book_changes_rejects_invalid_token(client: TestClient, admin_headers):
+    resp = client.get(
+        "/api/v1/books/changes",
+        params={"since": "not-a-token"},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 400
+
+
+def test_loan_changes_scoped_to_member(
+    client: TestClient,
+    admin_headers,
+    member_headers,
+    clean_member_loans,
+    no_sync_lag,
+):
+    branch_id = _create_branch(client, admin_headers)
+    book_id = _create_book(client, admin_headers, branch_id, "Libro Sync Loan")
+
+    _, _, token = _drain(client, "/api/v1/loans/changes", member_headers)
+
+    resp_loan = client.post(
+        "/api/v1/loans",
+        json={"book_id": book_id, "branch_id": branch_id},
+        headers=member_headers,
+    )
+    assert resp_loan.status_code == 201, resp_loan.text
+    loan_id = resp_loan.json()["id"]
+
+    items, _, token = _drain(client, "/api/v1/loans/changes", member_headers, since=token)
+    assert [loan["id"] for loan in items] == [loan_id]
+    member_id = items[0]["member_id"]
+
+    resp_approve = client.patch(
+        f"/api/v1/loans/{loan_id}/status",
+        json={"new_status": "APPROVED"},
+        headers=admin_headers,
+    )
+    assert resp_approve.status_code == 200, resp_approve.text
+
+    items, _, _ = _drain(client, "/api/v1/loans/changes", member_headers, since=token)
+    assert [(loan["id"], loan["status"]) for loan in items] == [(loan_id, "APPROVED")]
+
+    # Un member nunca recibe préstamos ajenos
+    all_items, _, _ = _drain(client, "/api/v1/loans/changes", member_headers)
+    assert {loan["member_id"] for loan in all_items} == {member_id}
+
+
+def test_book_changes_wait_for_overlapping_transactions(client: TestClient, admin_headers, no_sync_lag):
+    """
+    Una transacción que empezó antes pero confirma después que otra no puede
+    quedar por debajo de la marca de agua: updated_at es el inicio de la
+    transacción, no el commit.
+    """
+    branch_id = _create_branch(client, admin_headers)
+    slow_id = _create_book(client, admin_headers, branch_id, "Libro Sync Lento")
+    fast_id = _create_book(client, admin_headers, branch_id, "Libro Sync Rápido")
+    _, _, token = _drain(client, "/api/v1/books/changes", admin_headers)
+
+    with SessionLocal() as slow:
+        # Abre la transacción (updated_at = now() de este momento) y no confirma
+        slow.execute(update(Book).where(Book.id == slow_id).values(title="Libro Sync Lento Editado"))
+
+        resp = client.put(f"/api/v1/books/{fast_id}", json={"title": "Libro Sync Rápido Editado"},
+                          headers=admin_headers)
+        assert resp.status_code == 200, resp.text
+        items, _, token = _drain(client, "/api/v1/books/changes", admin_headers, since=token)
+        assert [b["id"] for b in items] == [fast_id]
+
+        slow.commit()
+
+    items, _, token = _drain(client, "/api/v1/books/changes", admin_headers, since=token)
+    assert [b["title"] for b in items if b["id"] == slow_id] == ["Libro Sync Lento Editado"]
+
+    # Con la transacción cerrada la marca de agua avanza: nada pendiente
+    items, _, _ = _drain(client, "/api/v1/books/changes", admin_headers, since=token)
+    assert items == []
+
+
+def test_book_changes_redeliver_rows_inside_safety_lag(client: TestClient, admin_headers):
+    branch_id = _create_branch(client, admin_headers)
+    book_id = _create_book(client, admin_headers, branch_id, "Libro Sync Reciente")
+
+    items, _, token = _drain(client, "/api/v1/books/changes", admin_headers)
+    assert book_id in [b["id"] for b in items]
+
+    # Dentro del margen: se reenvía, no se pierde
+    items, _, _ = _drain(client, "/api/v1/books/changes", admin_headers, since=token)
+    assert book_id in [b["id"] for b in items]